@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib import admin
-from .models import DimDate, DimDiscipline, DimMaterial, DimTool, FactInventoryTransactions
+from .models import DimDate, DimDiscipline, DimMaterial, DimTool, FactInventoryTransactions, MaterialStock, InventoryMonthlySummary, StockCheckpoint, ToolState, MaterialReorderPolicy, StockAlert, MaterialForecast, MaterialValuation
 
 # Register your models here.
 admin.site.register(DimDate)
@@ -8,3 +8,11 @@ admin.site.register(DimDiscipline)
 admin.site.register(DimMaterial)
 admin.site.register(DimTool)
 admin.site.register(FactInventoryTransactions)
+admin.site.register(MaterialStock)
+admin.site.register(InventoryMonthlySummary)
+admin.site.register(StockCheckpoint)
+admin.site.register(ToolState)
+admin.site.register(MaterialReorderPolicy)
+admin.site.register(StockAlert)
+admin.site.register(MaterialForecast)
+admin.site.register(MaterialValuation)
@@ -0,0 +1,122 @@
+# alerts.py
+#
+# Low-stock alerts. The materialstock triggers flag (alert_pending) every
+# material whose stock changed, so the evaluator only compares the flagged
+# materials with their reorder points, in one statement: it clears the flags,
+# flips MaterialReorderPolicy.is_below where the material crossed its reorder
+# point, and inserts a StockAlert for each crossing. Concurrent evaluators
+# serialize on the flagged ledger rows, so each crossing is reported once.
+#
+# Evaluation runs after every API write to the fact table commits; loads that
+# bypass the API are picked up by `manage.py evaluate_stock_alerts`.
+#
+# The alert stream has an async twin for ASGI, which polls with the async ORM
+# and waits with asyncio.sleep, so an open stream holds no thread.
+
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .models import StockAlert
+
+EVALUATE_SQL = """
+    WITH touched AS (
+        UPDATE materialstock AS s
+        SET alert_pending = false
+        WHERE s.alert_pending
+        RETURNING s.material_id, s.current_stock
+    ), crossed AS (
+        UPDATE materialreorderpolicy AS p
+        SET is_below = t.current_stock <= p.reorder_point
+        FROM touched AS t
+        WHERE p.material_id = t.material_id
+          AND p.is_below IS DISTINCT FROM (t.current_stock <= p.reorder_point)
+        RETURNING p.material_id, p.is_below, t.current_stock, p.reorder_point,
+                  p.reorder_quantity, p.lead_time_days
+    )
+    INSERT INTO stockalert (material_id, alert_type, current_stock, reorder_point,
+                            reorder_quantity, lead_time_days, created_at)
+    SELECT material_id, CASE WHEN is_below THEN %s ELSE %s END, current_stock, reorder_point,
+           reorder_quantity, lead_time_days, now()
+    FROM crossed
+    ORDER BY material_id
+    RETURNING alert_id
+"""
+
+
+def evaluate_stock_alerts():
+    """Checks the materials whose stock changed since the last run; returns the new alert ids."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(EVALUATE_SQL, [StockAlert.LOW_STOCK, StockAlert.RECOVERED])
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def evaluate_on_commit(using=None):
+    """Runs the evaluator once the current transaction commits, or straight away in autocommit mode."""
+    transaction.on_commit(evaluate_stock_alerts, using=using, robust=True)
+
+
+def format_event(alert):
+    data = json.dumps({
+        'alert_id': alert.alert_id,
+        'material_id': alert.material_id,
+        'material_name': alert.material.material_name,
+        'alert_type': alert.alert_type,
+        'current_stock': alert.current_stock,
+        'reorder_point': alert.reorder_point,
+        'reorder_quantity': alert.reorder_quantity,
+        'lead_time_days': alert.lead_time_days,
+        'created_at': alert.created_at,
+    }, cls=DjangoJSONEncoder)
+    return f'id: {alert.alert_id}\nevent: {alert.alert_type}\ndata: {data}\n\n'
+
+
+def _new_alerts(last_id):
+    return StockAlert.objects.select_related('material').filter(alert_id__gt=last_id).order_by('alert_id')[:100]
+
+
+def _stream_timing(poll_seconds, max_seconds):
+    poll_seconds = poll_seconds if poll_seconds is not None else settings.ALERT_STREAM_POLL_SECONDS
+    max_seconds = max_seconds if max_seconds is not None else settings.ALERT_STREAM_MAX_SECONDS
+    return poll_seconds, time.monotonic() + max_seconds
+
+
+def stream_alerts(last_id, poll_seconds=None, max_seconds=None):
+    """
+    Yields server-sent events for every alert after last_id as it is raised.
+    New alerts are found with a primary key range scan per poll. The stream
+    ends after max_seconds, and EventSource reconnects with Last-Event-ID.
+    """
+    poll_seconds, deadline = _stream_timing(poll_seconds, max_seconds)
+    yield f'retry: {int(poll_seconds * 1000)}\n\n'
+    while True:
+        alerts = list(_new_alerts(last_id))
+        for alert in alerts:
+            yield format_event(alert)
+            last_id = alert.alert_id
+        if time.monotonic() >= deadline:
+            return
+        if not alerts:
+            # Comment line: keeps proxies from closing an idle stream
+            yield ': keepalive\n\n'
+            time.sleep(poll_seconds)
+
+
+async def astream_alerts(last_id, poll_seconds=None, max_seconds=None):
+    """stream_alerts for ASGI responses."""
+    poll_seconds, deadline = _stream_timing(poll_seconds, max_seconds)
+    yield f'retry: {int(poll_seconds * 1000)}\n\n'
+    while True:
+        alerts = [alert async for alert in _new_alerts(last_id)]
+        for alert in alerts:
+            yield format_event(alert)
+            last_id = alert.alert_id
+        if time.monotonic() >= deadline:
+            return
+        if not alerts:
+            yield ': keepalive\n\n'
+            await asyncio.sleep(poll_seconds)
@@ -0,0 +1,155 @@
+# analytics.py
+
+from django.db import connection, transaction
+from django.db.models import F, IntegerField, Q, Sum
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import ValidationError
+
+from .models import InventoryMonthlySummary
+from .stock import archive_cutoff
+
+# Dimensions the analytics API can group by, mapped to summary table expressions
+GROUP_BY_FIELDS = {
+    'year': F('year'),
+    'quarter': F('quarter_number'),
+    'month': F('month_number'),
+    'discipline': Coalesce('material__discipline__discipline_name', 'tool__discipline__discipline_name'),
+    'material_type': F('material__material_type'),
+    'material': F('material__material_name'),
+    'tool': F('tool__tool_name'),
+    'transaction_type': F('transaction_type'),
+}
+
+# Equality filters accepted as query parameters, mapped to summary table lookups
+FILTER_FIELDS = {
+    'year': 'year',
+    'quarter': 'quarter_number',
+    'month': 'month_number',
+    'material_id': 'material_id',
+    'tool_id': 'tool_id',
+    'material_type': 'material__material_type',
+    'transaction_type': 'transaction_type',
+}
+
+# Filter parameters holding numbers, validated before they reach the query
+INTEGER_PARAMS = ('year', 'quarter', 'month', 'material_id', 'tool_id', 'discipline_id')
+
+# The same rollup computed straight from the fact table, for rebuilds and checks
+FACT_SUMMARY_SQL = """
+    SELECT date_id / 10000 AS year, (date_id / 100 % 100 - 1) / 3 + 1 AS quarter_number,
+           date_id / 100 % 100 AS month_number, material_id, tool_id, transaction_type,
+           SUM(quantity_change) AS quantity_change, SUM(COALESCE(total_cost, 0)) AS total_cost,
+           COUNT(*) AS transaction_count
+    FROM factinventorytransactions
+    GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+SUMMARY_COLUMNS = (
+    'year, quarter_number, month_number, material_id, tool_id, transaction_type, '
+    'quantity_change, total_cost, transaction_count'
+)
+
+
+def summarize(group_by, params):
+    """
+    Returns grouped sums of quantity_change and total_cost from the monthly
+    summary table. group_by is a list of GROUP_BY_FIELDS names; params holds
+    the request's filter query parameters.
+    """
+    unknown = [name for name in group_by if name not in GROUP_BY_FIELDS]
+    if unknown:
+        raise ValidationError({'group_by': f"Unknown dimension(s): {', '.join(unknown)}. "
+                                           f"Choose from: {', '.join(GROUP_BY_FIELDS)}."})
+
+    values = {param: params[param] for param in (*FILTER_FIELDS, 'discipline_id') if params.get(param)}
+    for param in INTEGER_PARAMS:
+        if param not in values:
+            continue
+        try:
+            values[param] = int(values[param])
+        except ValueError:
+            raise ValidationError({param: 'Expected an integer.'})
+
+    # Rows whose transactions were all deleted or moved stay behind with zero counts
+    queryset = InventoryMonthlySummary.objects.exclude(transaction_count=0)
+    for param, lookup in FILTER_FIELDS.items():
+        if param in values:
+            queryset = queryset.filter(**{lookup: values[param]})
+    if 'discipline_id' in values:
+        discipline_id = values['discipline_id']
+        queryset = queryset.filter(Q(material__discipline_id=discipline_id) | Q(tool__discipline_id=discipline_id))
+
+    # Inclusive month range given as YYYYMM
+    queryset = queryset.alias(period=F('year') * 100 + F('month_number'))
+    for param, lookup in (('from_month', 'gte'), ('to_month', 'lte')):
+        if not params.get(param):
+            continue
+        try:
+            period = int(params[param])
+        except ValueError:
+            raise ValidationError({param: 'Expected a month as YYYYMM.'})
+        queryset = queryset.filter(**{f'period__{lookup}': period})
+
+    aliases = {f'group_{name}': GROUP_BY_FIELDS[name] for name in group_by}
+    rows = (
+        queryset.values(**aliases)
+        .annotate(
+            quantity_change=Sum('quantity_change'),
+            total_cost=Sum('total_cost'),
+            transaction_count=Sum('transaction_count', output_field=IntegerField()),
+        )
+        .order_by(*aliases)
+    )
+    return [
+        {name.removeprefix('group_'): value for name, value in row.items()}
+        for row in rows
+    ]
+
+
+def rebuild_monthly_summary():
+    """
+    Recomputes inventorymonthlysummary from the fact table; returns the row
+    count. Rows for archived months are kept, as their transactions are gone.
+    """
+    first_month = (archive_cutoff() or 0) // 100
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('LOCK TABLE factinventorytransactions IN SHARE MODE')
+        cursor.execute('DELETE FROM inventorymonthlysummary WHERE year * 100 + month_number >= %s', [first_month])
+        cursor.execute(f"""
+            INSERT INTO inventorymonthlysummary ({SUMMARY_COLUMNS})
+            SELECT {SUMMARY_COLUMNS} FROM ({FACT_SUMMARY_SQL}) AS fact
+            WHERE year * 100 + month_number >= {first_month:d}
+        """)
+        return cursor.rowcount
+
+
+def find_monthly_summary_drift():
+    """
+    Returns (year, month, material_id, tool_id, transaction_type) keys whose
+    summary row disagrees with the fact table, archived months excepted.
+    """
+    first_month = (archive_cutoff() or 0) // 100
+    with connection.cursor() as cursor:
+        # NULL material/tool keys are matched through COALESCE so the join stays hashable
+        cursor.execute(f"""
+            SELECT COALESCE(summary.year, fact.year), COALESCE(summary.month_number, fact.month_number),
+                   COALESCE(summary.material_id, fact.material_id), COALESCE(summary.tool_id, fact.tool_id),
+                   COALESCE(summary.transaction_type, fact.transaction_type)
+            FROM (
+                SELECT * FROM inventorymonthlysummary
+                WHERE transaction_count <> 0 AND year * 100 + month_number >= {first_month:d}
+            ) AS summary
+            FULL OUTER JOIN (
+                SELECT * FROM ({FACT_SUMMARY_SQL}) AS fact WHERE year * 100 + month_number >= {first_month:d}
+            ) AS fact
+                ON summary.year = fact.year
+               AND summary.month_number = fact.month_number
+               AND COALESCE(summary.material_id, 0) = COALESCE(fact.material_id, 0)
+               AND COALESCE(summary.tool_id, 0) = COALESCE(fact.tool_id, 0)
+               AND summary.transaction_type = fact.transaction_type
+            WHERE summary.quantity_change IS DISTINCT FROM fact.quantity_change
+               OR summary.total_cost IS DISTINCT FROM fact.total_cost
+               OR summary.transaction_count IS DISTINCT FROM fact.transaction_count
+            ORDER BY 1, 2
+        """)
+        return cursor.fetchall()
@@ -0,0 +1,157 @@
+# async_views.py
+#
+# Async read path for the hot endpoints, mounted under /api/async/. Each view
+# reuses the authentication and permission classes, filters, keyset
+# pagination, serializers and response cache of its synchronous viewset, so
+# access rules, responses and ETags are identical to the /api/ ones.
+#
+# The page and detail queries run through the async ORM. The DRF checks, the
+# cache lookup and building the queryset (filter forms may validate against
+# the database, ?as_of= looks up a checkpoint) run in one sync_to_async call
+# before them, and serialization (which may load the date calendar) in one
+# after them.
+
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+
+from . import cache, replicas
+from .performance import timed
+from .views import (
+    DateViewSet, DisciplineViewSet, FactInventoryTransactionsViewSet, MaterialViewSet, ToolViewSet,
+    material_queryset,
+)
+
+
+def json_response(data, status=200):
+    with timed('render'):
+        content = JSONRenderer().render(data)
+    return HttpResponse(content, status=status, content_type='application/json')
+
+
+class AsyncReadView(View):
+    """Async list and detail reads for one of the synchronous viewsets."""
+    viewset = None
+
+    def get_queryset(self, request):
+        return self.viewset.queryset.all()
+
+    def cache_scopes(self):
+        """The viewset's cache scopes, or None when its responses are not cached."""
+        if not settings.API_CACHE_ENABLED or not issubclass(self.viewset, cache.CachedResponseMixin):
+            return None
+        return self.viewset.cache_scopes
+
+    def prepare(self, view, request, pk):
+        """
+        Runs the viewset's authentication, permission and throttle checks, then
+        looks the response up in the API cache. Returns (cache key, cached
+        (data, etag) or None, queryset to read, whether to read from the primary).
+        """
+        view.initial(request)
+        key, read_primary = None, False
+        scopes = self.cache_scopes()
+        if scopes is not None:
+            key = cache.response_cache_key(request, scopes)
+            cached = cache.get_cache().get(key)
+            if cached is not None:
+                return key, cached, None, False
+            # As CachedResponseMixin: never cache replica rows older than a write
+            read_primary = replicas.read_alias() is not None and cache.recently_written(scopes)
+
+        queryset = self.get_queryset(request)
+        if pk is not None:
+            return key, None, queryset.filter(pk=pk), read_primary
+        for backend in self.viewset.filter_backends:
+            queryset = backend().filter_queryset(request, queryset, self.viewset)
+        self.paginator = self.viewset.pagination_class() if self.viewset.pagination_class else None
+        if self.paginator is not None:
+            queryset = self.paginator.page_queryset(queryset, request)
+        return key, None, queryset, read_primary
+
+    async def fetch(self, queryset, pk):
+        if pk is None:
+            return [row async for row in queryset]
+        instance = await queryset.afirst()
+        if instance is None:
+            raise NotFound()
+        return instance
+
+    def serialize(self, rows, pk):
+        serializer_class = self.viewset.serializer_class
+        with timed('serialize'):
+            if pk is not None:
+                return serializer_class(rows).data
+            if self.paginator is None:
+                return serializer_class(rows, many=True).data
+            data = serializer_class(self.paginator.set_page(rows), many=True).data
+        return self.paginator.get_paginated_data(data)
+
+    def error_response(self, view, request, exc):
+        # As APIView.handle_exception: 401 with a challenge, else 403
+        response = json_response({'detail': exc.detail}, status=exc.status_code)
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            auth_header = view.get_authenticate_header(request)
+            if auth_header:
+                response['WWW-Authenticate'] = auth_header
+            else:
+                response.status_code = 403
+        return response
+
+    async def get(self, request, pk=None):
+        action_map = {'get': 'list' if pk is None else 'retrieve'}
+        view = self.viewset(action_map=action_map, args=(), kwargs={} if pk is None else {'pk': pk})
+        drf_request = view.initialize_request(request)
+        view.request = drf_request
+        try:
+            key, cached, queryset, read_primary = await sync_to_async(self.prepare)(view, drf_request, pk)
+            if cached is not None:
+                data, etag = cached
+            else:
+                with replicas.reading_from(None) if read_primary else nullcontext():
+                    rows = await self.fetch(queryset, pk)
+                data = await sync_to_async(self.serialize)(rows, pk)
+                etag = None
+                if key is not None:
+                    etag = cache.compute_etag(data)
+                    await cache.get_cache().aset(key, (data, etag))
+        except APIException as exc:
+            return self.error_response(view, drf_request, exc)
+
+        if etag is not None and cache.etag_matches(drf_request, etag):
+            return HttpResponse(status=304, headers={'ETag': etag})
+        response = json_response(data)
+        if etag is not None:
+            response['ETag'] = etag
+        return response
+
+
+# Async reads for DimMaterial with current stock
+class AsyncMaterialView(AsyncReadView):
+    viewset = MaterialViewSet
+
+    def get_queryset(self, request):
+        return material_queryset(request.query_params.get('as_of'), request.query_params.get('valuation_method'))
+
+
+# Async reads for FactInventoryTransactions
+class AsyncTransactionView(AsyncReadView):
+    viewset = FactInventoryTransactionsViewSet
+
+
+# Async reads for the dimension lookups
+class AsyncDisciplineView(AsyncReadView):
+    viewset = DisciplineViewSet
+
+
+class AsyncDateView(AsyncReadView):
+    viewset = DateViewSet
+
+
+class AsyncToolView(AsyncReadView):
+    viewset = ToolViewSet
@@ -0,0 +1,172 @@
+# authentication.py
+#
+# Token authentication without a database query per request. Resolved
+# token -> user lookups are kept in a bounded LRU cache with a TTL, local to
+# the process by default. With AUTH_TOKEN_CACHE_ALIAS set they are kept in
+# that Django cache instead (e.g. Redis), so every worker sees an invalidation
+# at once; otherwise other processes may keep serving a removed token until
+# its entry expires, at most AUTH_TOKEN_CACHE_TTL seconds.
+#
+# Entries are dropped when their token is deleted and whenever their user is
+# saved or deleted, which covers deactivation, and again once that write
+# commits, in case a concurrent request cached the old row in between. The
+# cache hands out copies without ModelBackend's permission caches, so
+# permissions are still looked up per request.
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+# Filled by ModelBackend on the user object, for the request that asked
+PERMISSION_CACHES = ('_perm_cache', '_user_perm_cache', '_group_perm_cache')
+
+
+def _detached(user):
+    """A copy of user without the permission caches of the requests it served."""
+    user = copy.copy(user)
+    for name in PERMISSION_CACHES:
+        user.__dict__.pop(name, None)
+    return user
+
+
+class TokenCache:
+    """Token key -> active user, with hit/miss counters for this process."""
+
+    def __init__(self):
+        self._entries = OrderedDict() # key -> (expires, user), least recently used first
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _shared(self):
+        alias = settings.AUTH_TOKEN_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def _shared_key(key):
+        return f'auth-token:{key}'
+
+    def get(self, key):
+        shared = self._shared()
+        if shared is not None:
+            user = shared.get(self._shared_key(key))
+        else:
+            with self._lock:
+                entry = self._entries.get(key)
+                user = None
+                if entry is not None:
+                    if entry[0] > time.monotonic():
+                        self._entries.move_to_end(key)
+                        user = entry[1]
+                    else:
+                        del self._entries[key]
+        with self._lock:
+            if user is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return _detached(user)
+
+    def set(self, key, user):
+        user = _detached(user)
+        shared = self._shared()
+        if shared is not None:
+            shared.set(self._shared_key(key), user, timeout=settings.AUTH_TOKEN_CACHE_TTL)
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        shared = self._shared()
+        if shared is not None:
+            shared.delete_many([self._shared_key(key) for key in keys])
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': settings.AUTH_TOKEN_CACHE_ALIAS or 'local',
+                'size': len(self._entries),
+                'max_size': settings.AUTH_TOKEN_CACHE_SIZE,
+                'ttl': settings.AUTH_TOKEN_CACHE_TTL,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that resolves known tokens from token_cache."""
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            # Unsaved, so request.auth costs no query either
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
+
+
+class QueryParamTokenAuthentication(CachedTokenAuthentication):
+    """
+    Token authentication from a ?token= query parameter, for clients that
+    cannot set an Authorization header, such as the browser EventSource used
+    by the alert stream. Only enable it on endpoints that need it, since URLs
+    end up in access logs.
+    """
+    query_param = 'token'
+
+    def authenticate(self, request):
+        key = request.query_params.get(self.query_param)
+        if not key:
+            return None
+        return self.authenticate_credentials(key)
+
+
+def invalidate_now_and_on_commit(keys, using=None):
+    token_cache.invalidate(*keys)
+    transaction.on_commit(lambda: token_cache.invalidate(*keys), using=using)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_now_and_on_commit([instance.key], using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+    if keys:
+        invalidate_now_and_on_commit(keys, using=kwargs.get('using'))
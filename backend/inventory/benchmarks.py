@@ -0,0 +1,350 @@
+# benchmarks.py
+#
+# Latency benchmark over every endpoint in inventory/urls.py. Requests go
+# through the full Django stack in-process (middleware, token authentication,
+# DRF rendering), without a web server in front, so the numbers isolate the
+# application and the database. wsgi_load and asgi_load drive the WSGI and
+# ASGI applications directly to compare throughput under concurrency.
+
+import asyncio
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import DimDate, DimDiscipline, DimMaterial, DimTool, FactInventoryTransactions
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Formatted with the ids from sample_ids(), e.g. '/api/materials/{material_id}/'
+    path: str
+    params: dict = field(default_factory=dict)
+    # Callable taking the iteration number and the sample ids, returning a JSON body
+    body: object = None
+    # Write scenarios run in a transaction that is rolled back
+    writes: bool = False
+    # GET scenarios follow the response's next link for up to this many pages, timed as one request
+    pages: int = 1
+
+
+def request_host():
+    """
+    A host the running settings accept: the first ALLOWED_HOSTS entry (which
+    includes 'testserver' under the test runner), else localhost, which
+    Django allows while DEBUG is on and ALLOWED_HOSTS is empty.
+    """
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host not in ('', '*')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def _material_body(n, ids):
+    return {'material_name': f'Benchmark material {n} {time.time_ns()}', 'unit_of_measure': 'each'}
+
+
+def _tool_body(n, ids):
+    return {'tool_name': f'Benchmark tool {n}', 'tool_type': 'Hand Tool'}
+
+
+def _transaction_rows(n, ids):
+    return [
+        {'date_id': ids['date_id'], 'material_id': ids['material_id'], 'quantity_change': '1.00',
+         'cost_per_unit': '2.50', 'transaction_type': 'Purchase'}
+        for _ in range(100)
+    ]
+
+
+def _write_mix_rows(n, ids):
+    """Purchases and usages of a material mixed with tool checkouts, each paired with its return."""
+    rows = []
+    for crew in range(20):
+        rows += [
+            {'date_id': ids['date_id'], 'material_id': ids['material_id'], 'quantity_change': '10.00',
+             'cost_per_unit': '2.50', 'transaction_type': 'Purchase'},
+            {'date_id': ids['date_id'], 'material_id': ids['material_id'], 'quantity_change': '-4.00',
+             'cost_per_unit': '2.50', 'transaction_type': 'Usage'},
+            {'date_id': ids['date_id'], 'material_id': ids['material_id'], 'quantity_change': '-3.00',
+             'cost_per_unit': '2.50', 'transaction_type': 'Usage'},
+            {'date_id': ids['date_id'], 'tool_id': ids['tool_id'], 'quantity_change': '-1',
+             'transaction_type': 'Checkout', 'notes': f'Crew {crew + 1}'},
+            {'date_id': ids['date_id'], 'tool_id': ids['tool_id'], 'quantity_change': '1',
+             'transaction_type': 'Return'},
+        ]
+    return rows
+
+
+SCENARIOS = [
+    Scenario('disciplines list', 'get', '/api/disciplines/'),
+    Scenario('disciplines detail', 'get', '/api/disciplines/{discipline_id}/'),
+    Scenario('dates list', 'get', '/api/dates/'),
+    Scenario('dates filter year', 'get', '/api/dates/', {'year': '{year}'}),
+    Scenario('dates detail', 'get', '/api/dates/{date_id}/'),
+    Scenario('materials list', 'get', '/api/materials/'),
+    Scenario('materials filter discipline', 'get', '/api/materials/', {'discipline__discipline_id': '{discipline_id}'}),
+    Scenario('materials search', 'get', '/api/materials/', {'search': 'pipe'}),
+    Scenario('materials ordering', 'get', '/api/materials/', {'ordering': '-material_name'}),
+    Scenario('materials as_of', 'get', '/api/materials/', {'as_of': '{full_date}'}),
+    Scenario('materials detail', 'get', '/api/materials/{material_id}/'),
+    Scenario('materials create', 'post', '/api/materials/', body=_material_body, writes=True),
+    Scenario('tools list', 'get', '/api/tools/'),
+    Scenario('tools filter discipline', 'get', '/api/tools/', {'discipline__discipline_id': '{discipline_id}'}),
+    Scenario('tools search', 'get', '/api/tools/', {'search': 'drill'}),
+    Scenario('tools ordering', 'get', '/api/tools/', {'ordering': 'tool_type'}),
+    Scenario('tools detail', 'get', '/api/tools/{tool_id}/'),
+    Scenario('tools create', 'post', '/api/tools/', body=_tool_body, writes=True),
+    Scenario('transactions list', 'get', '/api/transactions/'),
+    Scenario('transactions filter material', 'get', '/api/transactions/', {'material__material_id': '{material_id}'}),
+    Scenario('transactions filter date range', 'get', '/api/transactions/',
+             {'date__date_id__gte': '{date_id}', 'date__date_id__lte': '{date_id}'}),
+    Scenario('transactions ordering', 'get', '/api/transactions/', {'ordering': '-transaction_id'}),
+    Scenario('transactions paginated scan', 'get', '/api/transactions/', {'page_size': '500'}, pages=10),
+    Scenario('transactions detail', 'get', '/api/transactions/{transaction_id}/'),
+    Scenario('transactions bulk create', 'post', '/api/transactions/bulk/', body=_transaction_rows, writes=True),
+    Scenario('transactions bulk write mix', 'post', '/api/transactions/bulk/', body=_write_mix_rows, writes=True),
+    Scenario('transactions export', 'get', '/api/transactions/export/',
+             {'date__date_id__gte': '{date_id}', 'date__date_id__lte': '{date_id}'}),
+    Scenario('analytics by month', 'get', '/api/analytics/', {'group_by': 'year,month'}),
+    Scenario('analytics by discipline', 'get', '/api/analytics/', {'group_by': 'discipline,transaction_type'}),
+]
+
+
+def sample_ids():
+    """Picks an existing row of each kind to fill the scenario paths and filters."""
+    busiest = FactInventoryTransactions.objects.order_by('-date_id').values('date_id').first()
+    date = DimDate.objects.filter(date_id=busiest['date_id']).first() if busiest else DimDate.objects.first()
+    ids = {
+        'discipline_id': DimDiscipline.objects.values_list('pk', flat=True).first(),
+        'material_id': DimMaterial.objects.values_list('pk', flat=True).first(),
+        'tool_id': DimTool.objects.values_list('pk', flat=True).first(),
+        'transaction_id': FactInventoryTransactions.objects.values_list('pk', flat=True).last(),
+        'date_id': date.date_id if date else None,
+        'full_date': date.full_date.isoformat() if date else None,
+        'year': date.year if date else None,
+    }
+    missing = [name for name, value in ids.items() if value is None]
+    if missing:
+        raise ValueError(f"No sample rows for: {', '.join(missing)}. Load data first (generate_synthetic_data).")
+    return ids
+
+
+def benchmark_token(username):
+    """Returns the API token key for username, creating the user without a usable password if needed."""
+    user, created = get_user_model().objects.get_or_create(username=username)
+    if created:
+        user.set_unusable_password()
+        user.save()
+    return Token.objects.get_or_create(user=user)[0].key
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class QueryCounter:
+    """Counts the SQL statements a connection executes (installed with execute_wrapper)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class BenchmarkClient:
+    """One APIClient and query counter per thread, since each thread has its own connection."""
+
+    def __init__(self, token):
+        self.token = token
+        self.local = threading.local()
+
+    def get(self):
+        if not hasattr(self.local, 'client'):
+            client = APIClient(HTTP_HOST=request_host())
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+            self.local.client = client
+        return self.local.client
+
+    def request(self, scenario, ids, iteration):
+        path = scenario.path.format(**ids)
+        params = {key: value.format(**ids) for key, value in scenario.params.items()}
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            if scenario.writes:
+                with transaction.atomic():
+                    response = self.send(scenario, path, params, ids, iteration)
+                    transaction.set_rollback(True)
+            else:
+                response = self.send(scenario, path, params, ids, iteration)
+        elapsed = time.perf_counter() - started
+        return elapsed, counter.count, response.status_code
+
+    def send(self, scenario, path, params, ids, iteration):
+        client = self.get()
+        if scenario.method == 'get':
+            response = client.get(path, params)
+            for _ in range(scenario.pages - 1):
+                next_link = response.status_code == 200 and response.json().get('next')
+                if not next_link:
+                    break
+                response = client.get(next_link)
+        else:
+            body = scenario.body(iteration, ids) if scenario.body else {}
+            response = client.generic(scenario.method.upper(), path, json.dumps(body), 'application/json')
+        if response.streaming:
+            # Drain streamed responses so the whole export is timed
+            for _ in response.streaming_content:
+                pass
+        return response
+
+
+def run_scenario(client, scenario, ids, iterations, warmup=0, concurrency=1):
+    """Runs one scenario and returns its latency percentiles, query count and throughput."""
+    for iteration in range(warmup):
+        client.request(scenario, ids, iteration)
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(lambda n: client.request(scenario, ids, n), range(iterations)))
+    else:
+        samples = [client.request(scenario, ids, n) for n in range(iterations)]
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed for elapsed, _, _ in samples)
+    return {
+        'name': scenario.name,
+        'requests': iterations,
+        'errors': sum(1 for _, _, status in samples if status >= 400),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'queries': round(sum(queries for _, queries, _ in samples) / iterations, 1),
+        'throughput_rps': round(iterations / wall, 1) if wall else 0.0,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Returns the scenarios whose p95 regressed past baseline by more than max_regression (a fraction)."""
+    previous = {row['name']: row for row in baseline}
+    regressions = []
+    for row in results:
+        before = previous.get(row['name'])
+        if before and before['p95_ms'] and row['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+            regressions.append((row['name'], before['p95_ms'], row['p95_ms']))
+        if before and row['queries'] > before['queries']:
+            regressions.append((f"{row['name']} (queries)", before['queries'], row['queries']))
+    return regressions
+
+
+# Sync endpoints and their async counterparts, compared under the same load
+ASYNC_PATHS = [
+    ('/api/materials/', '/api/async/materials/'),
+    ('/api/transactions/', '/api/async/transactions/'),
+    ('/api/disciplines/', '/api/async/disciplines/'),
+    ('/api/dates/', '/api/async/dates/'),
+    ('/api/tools/', '/api/async/tools/'),
+]
+
+
+def summarize_load(name, samples, wall):
+    latencies = sorted(elapsed for elapsed, _ in samples)
+    return {
+        'name': name,
+        'requests': len(samples),
+        'errors': sum(1 for _, status in samples if status >= 400),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'throughput_rps': round(len(samples) / wall, 1) if wall else 0.0,
+    }
+
+
+def wsgi_load(application, paths, token, requests, concurrency):
+    """Calls a WSGI application from `concurrency` threads, like a threaded WSGI server."""
+    host = request_host()
+
+    def call(n):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': paths[n % len(paths)], 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+            'SERVER_NAME': host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': host, 'HTTP_AUTHORIZATION': f'Token {token}',
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(b''),
+            'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        status = []
+        started = time.perf_counter()
+        result = application(environ, lambda code, headers, exc_info=None: status.append(int(code.split()[0])))
+        try:
+            for _ in result:
+                pass
+        finally:
+            # Closing the response sends request_finished, which releases the connection
+            result.close()
+        return time.perf_counter() - started, status[0]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(call, range(requests)))
+    return samples, time.perf_counter() - started
+
+
+async def _asgi_call(application, path, token, host):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', host.encode()), (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': (host, 80),
+    }
+    body_sent = False
+    status = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; Django cancels this wait once it has responded
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    started = time.perf_counter()
+    await application(scope, receive, send)
+    return time.perf_counter() - started, status[0]
+
+
+def asgi_load(application, paths, token, requests, concurrency):
+    """Runs requests against an ASGI application with at most `concurrency` in flight on one event loop."""
+    host = request_host()
+
+    async def run():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def call(n):
+            async with limit:
+                return await _asgi_call(application, paths[n % len(paths)], token, host)
+
+        return await asyncio.gather(*(call(n) for n in range(requests)))
+
+    started = time.perf_counter()
+    samples = asyncio.run(run())
+    return samples, time.perf_counter() - started
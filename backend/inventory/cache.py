@@ -0,0 +1,135 @@
+# cache.py
+#
+# Read-through cache for serialized API responses. Each cached response is
+# keyed by its URL and by the current version of every "scope" (a group of
+# tables) it was built from. Saving or deleting a row bumps its scope's version,
+# which orphans exactly the responses that depended on it.
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import replicas
+
+# Scopes that views may declare in cache_scopes
+DATES = 'dates'
+DISCIPLINES = 'disciplines'
+MATERIALS = 'materials'
+TOOLS = 'tools'
+STOCK = 'stock'
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _version_key(scope):
+    return f'api:scope:{scope}'
+
+
+def scope_versions(scopes):
+    """Returns the current version of each scope, creating missing ones."""
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seeded from the clock so a version that was evicted never comes
+            # back with a value that old response keys still use
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _written_key(scope):
+    return f'api:scope-written:{scope}'
+
+
+def invalidate(*scopes):
+    """Bumps the version of each scope, orphaning every response built from it."""
+    cache = get_cache()
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.set(_version_key(scope), time.time_ns(), timeout=None)
+    if settings.DATABASE_REPLICAS:
+        # Replicas may not have the write yet (see recently_written)
+        cache.set_many({_written_key(scope): True for scope in scopes}, timeout=replicas.stale_window())
+
+
+def recently_written(scopes):
+    """
+    True when a scope was invalidated within the replica stale window. A
+    response built from a replica then could hold the old rows and would be
+    cached under the new version, so it is built from the primary instead.
+    """
+    return bool(get_cache().get_many([_written_key(scope) for scope in scopes]))
+
+
+def response_cache_key(request, scopes):
+    versions = ':'.join(str(version) for version in scope_versions(scopes))
+    query = sorted(request.query_params.lists())
+    digest = hashlib.sha1(
+        json.dumps([request.get_host(), request.path, query]).encode('utf-8')
+    ).hexdigest()
+    return f'api:response:{digest}:{versions}'
+
+
+def compute_etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode('utf-8')
+    return f'"{hashlib.sha1(payload).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [candidate.strip().removeprefix('W/') for candidate in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class CachedResponseMixin:
+    """
+    Serves list and retrieve responses from the API cache, with an ETag and
+    304 Not Modified for a matching If-None-Match header.
+    """
+    # Scopes whose changes must invalidate this view's responses
+    cache_scopes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not settings.API_CACHE_ENABLED:
+            return handler(request, *args, **kwargs)
+
+        key = response_cache_key(request, self.cache_scopes)
+        cached = get_cache().get(key)
+        if cached is None:
+            if replicas.read_alias() is not None and recently_written(self.cache_scopes):
+                with replicas.reading_from(None):
+                    response = handler(request, *args, **kwargs)
+            else:
+                response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            etag = compute_etag(response.data)
+            get_cache().set(key, (response.data, etag))
+        else:
+            data, etag = cached
+            response = Response(data)
+
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,279 @@
+# columnar.py
+#
+# Columnar exports of the star schema for BI tools: the fact table and each
+# dimension table as Parquet or Arrow IPC (stream format) files, with the
+# column types of the database rather than JSON strings. Rows are read through
+# a server-side cursor and converted to one Arrow record batch per row group,
+# so memory stays bounded by ROW_GROUP_SIZE rows whatever the table size.
+# Low-cardinality text columns (transaction_type, month_name, brand, ...) are
+# dictionary encoded.
+#
+# Directory exports keep a manifest.json. Dimensions are rewritten in full on
+# every run; with incremental=True the fact table only gets a new part file
+# with the rows inserted since the manifest's horizon. As in sync.py, a run
+# only takes rows whose inserting transaction (inserted_xid, see migration
+# 0018) is below the current snapshot's xmin, all of which have finished, and
+# records that xmin as the next run's horizon: a transaction still open
+# during a run is picked up by the next one, whatever its transaction_ids.
+# That is an append-only view: edits and deletes of already exported
+# transactions only show up in the next full export.
+#
+# PyArrow is an optional dependency (the columnar extra), only needed by this
+# module.
+
+import datetime
+import io
+import json
+import os
+from contextlib import closing
+from dataclasses import dataclass
+from itertools import islice
+
+from django.db import models, transaction
+from django.db.models.expressions import RawSQL
+
+from . import sync
+from .export import EXPORT_CHUNK_SIZE
+from .models import DimDate, DimDiscipline, DimMaterial, DimTool, FactInventoryTransactions
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # pragma: no cover
+    pa = pq = None
+
+ROW_GROUP_SIZE = 100_000
+MANIFEST_NAME = 'manifest.json'
+FACT_TABLE = 'factinventorytransactions'
+
+# Export format -> (file extension, content type)
+FORMATS = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ExportTable:
+    model: type
+    dictionary_columns: tuple = ()
+
+    @property
+    def fields(self):
+        return self.model._meta.concrete_fields
+
+    @property
+    def columns(self):
+        return [field.attname for field in self.fields]
+
+    def schema(self):
+        return pa.schema([
+            pa.field(field.attname, self.arrow_type(field), nullable=field.null) for field in self.fields
+        ])
+
+    def arrow_type(self, field):
+        if field.attname in self.dictionary_columns:
+            return pa.dictionary(pa.int32(), pa.string())
+        if isinstance(field, models.ForeignKey):
+            field = field.target_field
+        if isinstance(field, (models.AutoField, models.IntegerField)):
+            return pa.int32()
+        if isinstance(field, models.DecimalField):
+            return pa.decimal128(field.max_digits, field.decimal_places)
+        if isinstance(field, models.DateField):
+            return pa.date32()
+        if isinstance(field, models.BooleanField):
+            return pa.bool_()
+        return pa.string()
+
+
+TABLES = {
+    FACT_TABLE: ExportTable(FactInventoryTransactions, ('transaction_type',)),
+    'dimdate': ExportTable(DimDate, ('month_name', 'weekday_name', 'quarter_name')),
+    'dimmaterial': ExportTable(DimMaterial, ('material_type', 'unit_of_measure', 'brand', 'color', 'size')),
+    'dimtool': ExportTable(DimTool, ('tool_type', 'brand', 'current_location')),
+    'dimdiscipline': ExportTable(DimDiscipline),
+}
+
+
+def record_batches(table, since=None, horizon=None):
+    """
+    Yields the table's rows in primary key order as record batches of up to
+    ROW_GROUP_SIZE rows; for the fact table, only those inserted by
+    transactions from since up to (not including) horizon.
+    """
+    spec = TABLES[table]
+    queryset = spec.model.objects.order_by('pk')
+    if since is not None or horizon is not None:
+        queryset = queryset.alias(inserted_xid=RawSQL('inserted_xid', [], output_field=models.BigIntegerField()))
+    if since is not None:
+        queryset = queryset.filter(inserted_xid__gte=since)
+    if horizon is not None:
+        # Rows from before migration 0018 have no inserted_xid
+        queryset = queryset.filter(models.Q(inserted_xid__lt=horizon) | models.Q(inserted_xid__isnull=True))
+    schema = spec.schema()
+    # In a transaction, so the server-side cursor is not declared WITH HOLD (see export.py)
+    with transaction.atomic(using=queryset.db):
+        rows = queryset.values_list(*spec.columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        while chunk := list(islice(rows, ROW_GROUP_SIZE)):
+            arrays = []
+            for field, values in zip(schema, zip(*chunk)):
+                if pa.types.is_dictionary(field.type):
+                    arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+                else:
+                    arrays.append(pa.array(values, type=field.type))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def open_writer(sink, schema, export_format, dictionary_columns):
+    if export_format == 'parquet':
+        return pq.ParquetWriter(sink, schema, compression='zstd', use_dictionary=list(dictionary_columns) or False)
+    # The stream format, unlike the file format, allows a new dictionary per batch
+    return pa.ipc.new_stream(sink, schema)
+
+
+def write_batches(sink, table, export_format, since=None, horizon=None):
+    """Writes the table to a writable file object, yielding the rows written so far after each row group."""
+    spec = TABLES[table]
+    written = 0
+    writer = open_writer(sink, spec.schema(), export_format, spec.dictionary_columns)
+    batches = record_batches(table, since, horizon)
+    try:
+        for batch in batches:
+            if export_format == 'parquet':
+                writer.write_batch(batch, row_group_size=ROW_GROUP_SIZE)
+            else:
+                writer.write_batch(batch)
+            written += batch.num_rows
+            yield written
+    finally:
+        batches.close()
+        writer.close()
+
+
+def write_table(sink, table, export_format, since=None, horizon=None):
+    """Writes the table to a writable file object; returns the number of rows written."""
+    written = 0
+    for written in write_batches(sink, table, export_format, since, horizon):
+        pass
+    return written
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose written bytes are collected until drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_table(table, export_format, since=None, horizon=None):
+    """Yields the table as file bytes, one row group at a time."""
+    sink = _ChunkSink()
+    # Closing the stream early closes the batches too, ending their transaction
+    with closing(write_batches(sink, table, export_format, since, horizon)) as batches:
+        for _ in batches:
+            yield sink.drain()
+    # The footer, or the end-of-stream marker
+    yield sink.drain()
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _write_file(path, table, export_format, since=None, horizon=None):
+    # Written under a temporary name so readers never see a partial file
+    with open(path + '.tmp', 'wb') as output:
+        written = write_table(output, table, export_format, since, horizon)
+    os.replace(path + '.tmp', path)
+    return written
+
+
+def export_directory(directory, export_format='parquet', tables=None, incremental=False):
+    """
+    Exports tables (default: all) into directory and updates its manifest;
+    returns {table: rows written}.
+    """
+    tables = list(tables or TABLES)
+    extension = FORMATS[export_format][0]
+    manifest = read_manifest(directory)
+    if manifest is not None and manifest['format'] != export_format:
+        if incremental:
+            raise ExportError(f"{directory} holds a {manifest['format']} export; "
+                              f"run a full export to switch to {export_format}.")
+        manifest = None
+    manifest = manifest or {'format': export_format, 'tables': {}}
+    os.makedirs(directory, exist_ok=True)
+
+    written = {}
+    for table in tables:
+        if table != FACT_TABLE:
+            name = f'{table}.{extension}'
+            written[table] = _write_file(os.path.join(directory, name), table, export_format)
+            manifest['tables'][table] = {'files': [name], 'rows': written[table]}
+            continue
+
+        previous = manifest['tables'].get(FACT_TABLE) if incremental else None
+        if previous is not None and 'horizon' not in previous:
+            raise ExportError(f'{directory} was exported without a horizon; run a full export first.')
+        if previous is None:
+            previous = {'files': [], 'rows': 0, 'horizon': None}
+        # Captured up front: rows of transactions still open wait for the next run
+        horizon = sync.snapshot_horizon()
+        since = previous['horizon']
+        if since is not None and horizon <= since:
+            written[table] = 0
+            continue
+
+        os.makedirs(os.path.join(directory, FACT_TABLE), exist_ok=True)
+        if not incremental:
+            for stale in os.listdir(os.path.join(directory, FACT_TABLE)):
+                os.remove(os.path.join(directory, FACT_TABLE, stale))
+        name = os.path.join(FACT_TABLE, f'part-{len(previous["files"]):05d}.{extension}')
+        written[table] = _write_file(os.path.join(directory, name), table, export_format, since, horizon)
+        files = previous['files'] + [name]
+        if since is not None and not written[table]:
+            # Nothing new: the horizon still moves on, without an empty part file
+            os.remove(os.path.join(directory, name))
+            files = previous['files']
+        manifest['tables'][table] = {
+            'files': files,
+            'rows': previous['rows'] + written[table],
+            'horizon': horizon,
+        }
+
+    manifest['exported_at'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    write_manifest(directory, manifest)
+    return written
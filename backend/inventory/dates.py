@@ -0,0 +1,170 @@
+# dates.py
+#
+# In-process date dimension. Every DimDate attribute is a function of the
+# date itself, so CalendarDay computes them from a date or a YYYYMMDD date_id
+# without touching the database, the same way for generated rows, ingestion
+# and serialization.
+#
+# The date_ids already present in DimDate are loaded once per process into an
+# immutable Calendar snapshot. ensure_dates() inserts the days a write needs
+# that the snapshot does not have yet, and publishes a new snapshot with them
+# once the insert commits, so readers never see a day that was rolled back
+# and never take a lock. DimDate rows are never deleted, so a snapshot can
+# only be missing days, which ensure_dates() re-inserts idempotently.
+
+import calendar
+import datetime
+import functools
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from django.db import transaction
+
+from .models import DimDate
+
+POPULATE_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class CalendarDay:
+    date_id: int
+    full_date: datetime.date
+    year: int
+    month_number: int
+    month_name: str
+    day_of_month: int
+    weekday_number: int # 1 = Sunday ... 7 = Saturday
+    weekday_name: str
+    quarter_number: int
+    quarter_name: str
+
+    @classmethod
+    def from_date(cls, day):
+        quarter = (day.month - 1) // 3 + 1
+        return cls(
+            date_id=day.year * 10000 + day.month * 100 + day.day,
+            full_date=day,
+            year=day.year,
+            month_number=day.month,
+            month_name=calendar.month_name[day.month],
+            day_of_month=day.day,
+            weekday_number=day.isoweekday() % 7 + 1,
+            weekday_name=calendar.day_name[day.weekday()],
+            quarter_number=quarter,
+            quarter_name=f'Q{quarter}',
+        )
+
+    @classmethod
+    def from_id(cls, date_id):
+        """Raises ValueError if date_id is not a valid YYYYMMDD date."""
+        date_id = int(date_id)
+        return cls.from_date(datetime.date(date_id // 10000, date_id // 100 % 100, date_id % 100))
+
+    def as_model(self):
+        return DimDate(**{name: getattr(self, name) for name in self.__dataclass_fields__})
+
+
+def is_date_id(value):
+    try:
+        CalendarDay.from_id(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+class Calendar:
+    """Immutable snapshot of the days in DimDate."""
+
+    def __init__(self, days=()):
+        self._days = MappingProxyType({day.date_id: day for day in days})
+
+    def __contains__(self, date_id):
+        return date_id in self._days
+
+    def __len__(self):
+        return len(self._days)
+
+    def day(self, date_id):
+        """The day for date_id, computed when DimDate does not hold it."""
+        found = self._days.get(date_id)
+        return found if found is not None else CalendarDay.from_id(date_id)
+
+    def with_days(self, days):
+        return Calendar([*self._days.values(), *days])
+
+
+_calendar = None
+_lock = threading.Lock()
+
+
+def get_calendar():
+    """The process-wide Calendar, loaded from DimDate on first use."""
+    global _calendar
+    if _calendar is None:
+        with _lock:
+            if _calendar is None:
+                fields = list(CalendarDay.__dataclass_fields__)
+                _calendar = Calendar(CalendarDay(*row) for row in DimDate.objects.values_list(*fields).iterator())
+    return _calendar
+
+
+@functools.lru_cache(maxsize=64 * 1024)
+def _computed_day(date_id):
+    return CalendarDay.from_id(date_id)
+
+
+def lookup_day(date_id):
+    """
+    The day for date_id, from the snapshot when it is loaded; never queries
+    the database, so serializers can call it for every row.
+    """
+    current = _calendar
+    return current.day(date_id) if current is not None else _computed_day(date_id)
+
+
+def clear_calendar():
+    """Drops the snapshot; the next get_calendar() reloads it (for tests)."""
+    global _calendar
+    with _lock:
+        _calendar = None
+
+
+def _publish(days):
+    global _calendar
+    with _lock:
+        if _calendar is not None:
+            _calendar = _calendar.with_days(days)
+
+
+def ensure_dates(date_ids):
+    """
+    Makes sure DimDate holds every date_id (valid YYYYMMDD values), inserting
+    the missing ones in one statement. Returns the number of days that were
+    not in the snapshot, 0 when no database round trip was needed.
+    """
+    current = get_calendar()
+    missing = sorted({date_id for date_id in map(int, date_ids) if date_id not in current})
+    if not missing:
+        return 0
+    days = [CalendarDay.from_id(date_id) for date_id in missing]
+    DimDate.objects.bulk_create([day.as_model() for day in days], batch_size=POPULATE_BATCH_SIZE,
+                                ignore_conflicts=True)
+    transaction.on_commit(lambda: _publish(days))
+    return len(days)
+
+
+def date_range(start, end):
+    return [start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def populate_dates(start, end):
+    """Inserts every day from start to end (inclusive) that DimDate lacks; returns the rows inserted."""
+    days = [CalendarDay.from_date(day) for day in date_range(start, end)]
+    existing = set(DimDate.objects.filter(date_id__gte=days[0].date_id, date_id__lte=days[-1].date_id)
+                   .values_list('date_id', flat=True)) if days else set()
+    new_days = [day for day in days if day.date_id not in existing]
+    DimDate.objects.bulk_create([day.as_model() for day in new_days], batch_size=POPULATE_BATCH_SIZE,
+                                ignore_conflicts=True)
+    transaction.on_commit(lambda: _publish(new_days))
+    return len(new_days)
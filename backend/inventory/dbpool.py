@@ -0,0 +1,55 @@
+# dbpool.py
+#
+# Connection pool and persistent-connection metrics, served by
+# /api/metrics/db-pool/ for sizing DATABASE_POOL_* and DATABASE_CONN_MAX_AGE.
+
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# New database connections opened by this process, per alias
+_created = Counter()
+_lock = threading.Lock()
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    with _lock:
+        _created[connection.alias] += 1
+
+
+def pool_stats(alias='default'):
+    """
+    Returns checked out, waiting and created connection counts for alias.
+    With a psycopg pool the numbers come from the pool and cover every thread
+    of this process; without one, only connections opened are counted.
+    """
+    wrapper = connections[alias]
+    settings_dict = wrapper.settings_dict
+    pool = getattr(wrapper, 'pool', None)
+    if pool is None:
+        return {
+            'mode': 'persistent' if settings_dict['CONN_MAX_AGE'] else 'per_request',
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'created': _created[alias],
+        }
+
+    stats = pool.get_stats()
+    return {
+        'mode': 'pool',
+        'min_size': stats['pool_min'],
+        'max_size': stats['pool_max'],
+        'size': stats['pool_size'],
+        'available': stats['pool_available'],
+        'checked_out': stats['pool_size'] - stats['pool_available'],
+        'waiting': stats['requests_waiting'],
+        'created': stats.get('connections_num', 0),
+        'requests': stats.get('requests_num', 0),
+        'requests_queued': stats.get('requests_queued', 0),
+        'wait_ms': stats.get('requests_wait_ms', 0),
+        'timeouts': stats.get('requests_errors', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+    }
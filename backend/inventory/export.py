@@ -0,0 +1,117 @@
+# export.py
+#
+# Flat, denormalized exports of the fact table. Rows are read through a
+# server-side cursor and written out in small chunks, so memory stays flat and
+# the first bytes go out before the query has finished. The cursor lives in a
+# transaction held open for the whole stream: outside one, Django declares it
+# WITH HOLD, and PostgreSQL then runs the whole query before the first fetch.
+#
+# Under ASGI, Django reads a synchronous streaming iterator to the end before
+# sending any of it, so streaming_content() hands the chunks over as an async
+# iterator there instead (also used by the columnar exports).
+
+import csv
+import io
+from contextlib import closing
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = 2000
+# Approximate size of each chunk handed to the response
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = {
+    'transaction_id': F('transaction_id'),
+    'date_id': F('date_id'),
+    'full_date': F('date__full_date'),
+    'material_id': F('material_id'),
+    'material_name': F('material__material_name'),
+    'unit_of_measure': F('material__unit_of_measure'),
+    'tool_id': F('tool_id'),
+    'tool_name': F('tool__tool_name'),
+    'discipline_name': Coalesce('material__discipline__discipline_name', 'tool__discipline__discipline_name'),
+    'quantity_change': F('quantity_change'),
+    'cost_per_unit': F('cost_per_unit'),
+    'total_cost': F('total_cost'),
+    'transaction_type': F('transaction_type'),
+    'notes': F('notes'),
+}
+
+
+def export_rows(queryset):
+    """
+    Yields flat export rows (tuples in EXPORT_COLUMNS order) for a transactions
+    queryset, in a transaction that ends when the generator finishes or is closed.
+    """
+    # Prefixed so the aliases do not clash with the model's own field names
+    aliases = {f'export_{name}': expression for name, expression in EXPORT_COLUMNS.items()}
+    rows = queryset.annotate(**aliases).order_by('date_id', 'transaction_id').values_list(*aliases)
+    # Resolved at the first row, under the routing the stream is read with
+    with transaction.atomic(using=rows.db):
+        yield from rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    # Send the header right away, before the first rows arrive
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    # Closing the stream early closes rows too, ending its transaction
+    with closing(rows):
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= EXPORT_BUFFER_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    columns = list(EXPORT_COLUMNS)
+    encoder = DjangoJSONEncoder()
+    chunk = []
+    size = 0
+    with closing(rows):
+        for row in rows:
+            line = encoder.encode(dict(zip(columns, row))) + '\n'
+            chunk.append(line)
+            size += len(line)
+            if size >= EXPORT_BUFFER_SIZE:
+                yield ''.join(chunk)
+                chunk, size = [], 0
+    yield ''.join(chunk)
+
+
+def serving_asgi(request):
+    """Whether request (a Django or DRF request) came in through the ASGI handler."""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def _produced_in_thread(chunks):
+    # Thread sensitive: every chunk is produced in the request's thread, which
+    # holds its database connection and server-side cursor
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    chunks = iter(chunks)
+    done = object()
+    try:
+        while (chunk := await next_chunk(chunks, done)) is not done:
+            yield chunk
+    finally:
+        # An abandoned stream is closed in that thread too, ending its transaction
+        if hasattr(chunks, 'close'):
+            await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def streaming_content(request, chunks):
+    """chunks for a StreamingHttpResponse to request, as an async iterator under ASGI."""
+    return _produced_in_thread(chunks) if serving_asgi(request) else chunks
@@ -0,0 +1,207 @@
+# forecast.py
+#
+# Consumption-rate forecasting. For each discipline, one query pulls the daily
+# usage of every material (quantity consumed per material and DimDate day over
+# the history window) into NumPy arrays, and the rates and stock-out dates of
+# all its materials are then computed with array operations; there is no
+# per-material Python loop. Disciplines are forecast in parallel processes.
+#
+# The model: a material's recent daily usage (mean over the last window_days)
+# is deseasonalized with the discipline's monthly usage profile, then
+# projected forward day by day with that profile. The stock-out date is the
+# first day the projected cumulative usage reaches current stock, found with
+# one searchsorted per material against the shared cumulative profile.
+#
+# NumPy is an optional dependency (the forecast extra), only needed by this
+# module.
+
+import csv
+import datetime
+import io
+
+from django.db import connection, transaction
+
+from .ingest import copy_csv
+from .processes import map_in_processes
+
+try:
+    import numpy as np
+except ImportError: # pragma: no cover
+    np = None
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_HISTORY_DAYS = 3 * 365
+DEFAULT_HORIZON_DAYS = 365
+# Keeps a month with almost no history from producing an extreme projection
+SEASONAL_FACTOR_RANGE = (0.25, 4.0)
+
+MATERIALS_SQL = """
+    SELECT m.material_id, COALESCE(s.current_stock, 0), COALESCE(p.lead_time_days, 0)
+    FROM dimmaterial AS m
+    LEFT JOIN materialstock AS s ON s.material_id = m.material_id
+    LEFT JOIN materialreorderpolicy AS p ON p.material_id = m.material_id
+    WHERE m.discipline_id IS NOT DISTINCT FROM %(discipline_id)s
+    ORDER BY m.material_id
+"""
+
+# Usage is any negative material movement (Usage, Disposal). The date_id range
+# prunes the fact table to the partitions inside the history window.
+USAGE_SQL = """
+    SELECT f.material_id, d.full_date - %(as_of)s::date, d.month_number, -SUM(f.quantity_change)
+    FROM factinventorytransactions AS f
+    JOIN dimdate AS d ON d.date_id = f.date_id
+    JOIN dimmaterial AS m ON m.material_id = f.material_id
+    WHERE m.discipline_id IS NOT DISTINCT FROM %(discipline_id)s
+      AND f.quantity_change < 0
+      AND f.date_id BETWEEN %(first_date_id)s AND %(as_of_date_id)s
+    GROUP BY f.material_id, d.full_date, d.month_number
+"""
+
+FORECAST_COLUMNS = [
+    'material_id', 'as_of_date', 'current_stock', 'recent_daily_usage', 'seasonal_factor',
+    'projected_daily_usage', 'days_until_stockout', 'stockout_date', 'reorder_by_date', 'computed_at',
+]
+COPY_FORECAST_SQL = f"COPY materialforecast ({', '.join(FORECAST_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError('Forecasting needs NumPy: uv sync --extra forecast')
+
+
+def date_id(day):
+    return int(day.strftime('%Y%m%d'))
+
+
+def month_index(start, days):
+    """Calendar month (0-11) of each of `days` consecutive days from start."""
+    dates = np.datetime64(start, 'D') + np.arange(days)
+    return dates.astype('datetime64[M]').astype(np.int64) % 12
+
+
+def seasonal_factors(months, quantities, as_of, history_days):
+    """
+    Usage per day in each calendar month relative to the overall usage per day,
+    over the history window. Without any usage every factor is 1.
+    """
+    calendar_months = month_index(as_of - datetime.timedelta(days=history_days - 1), history_days)
+    days_per_month = np.bincount(calendar_months, minlength=12)
+    usage_per_month = np.bincount(months - 1, weights=quantities, minlength=12)
+    total = quantities.sum()
+    factors = np.ones(12)
+    if total <= 0:
+        return factors
+    overall = total / history_days
+    covered = days_per_month > 0
+    factors[covered] = usage_per_month[covered] / days_per_month[covered] / overall
+    return np.clip(factors, *SEASONAL_FACTOR_RANGE)
+
+
+def project(material_ids, stock, material_index, day_offsets, months, quantities, as_of,
+            window_days, history_days, horizon_days):
+    """Returns the forecast arrays for one discipline's materials."""
+    recent = day_offsets > -window_days
+    recent_usage = np.bincount(material_index[recent], weights=quantities[recent], minlength=len(material_ids))
+    recent_rate = recent_usage / window_days
+
+    factors = seasonal_factors(months, quantities, as_of, history_days)
+    window_start = as_of - datetime.timedelta(days=window_days - 1)
+    base_rate = recent_rate / factors[month_index(window_start, window_days)].mean()
+
+    future_factors = factors[month_index(as_of + datetime.timedelta(days=1), horizon_days)]
+    cumulative = np.cumsum(future_factors)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        needed = np.where(base_rate > 0, stock / base_rate, np.inf)
+    # Day 1 is the day after as_of; horizon_days + 1 means "not within the horizon"
+    days_until = np.searchsorted(cumulative, needed, side='left') + 1
+    days_until = np.where(stock <= 0, 0, days_until)
+    days_until = np.where((base_rate > 0) | (stock <= 0), days_until, horizon_days + 1)
+    return {
+        'recent_rate': recent_rate,
+        'seasonal_factor': np.full(len(material_ids), future_factors[0]),
+        'projected_rate': base_rate * future_factors[0],
+        'days_until': days_until,
+    }
+
+
+def forecast_discipline(discipline_id, as_of, window_days=DEFAULT_WINDOW_DAYS,
+                        history_days=DEFAULT_HISTORY_DAYS, horizon_days=DEFAULT_HORIZON_DAYS):
+    """
+    Forecasts every material of a discipline (None for materials without
+    one). Returns (material_ids, stock, lead_times, forecast arrays).
+    """
+    require_numpy()
+    params = {
+        'discipline_id': discipline_id,
+        'as_of': as_of,
+        'as_of_date_id': date_id(as_of),
+        'first_date_id': date_id(as_of - datetime.timedelta(days=history_days - 1)),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(MATERIALS_SQL, params)
+        materials = cursor.fetchall()
+        cursor.execute(USAGE_SQL, params)
+        usage = cursor.fetchall()
+
+    material_ids = np.array([row[0] for row in materials], dtype=np.int64)
+    stock = np.array([row[1] for row in materials], dtype=np.float64)
+    lead_times = np.array([row[2] for row in materials], dtype=np.int64)
+    usage = np.array(usage, dtype=np.float64).reshape(-1, 4)
+    # Position of each usage row's material in material_ids (both sorted by id)
+    material_index = np.searchsorted(material_ids, usage[:, 0].astype(np.int64))
+    forecast = project(
+        material_ids, stock, material_index, usage[:, 1].astype(np.int64), usage[:, 2].astype(np.int64),
+        usage[:, 3], as_of, window_days, history_days, horizon_days,
+    )
+    return material_ids, stock, lead_times, forecast
+
+
+def forecast_rows(results, as_of, horizon_days, computed_at):
+    for material_ids, stock, lead_times, forecast in results:
+        for index, material_id in enumerate(material_ids.tolist()):
+            days_until = int(forecast['days_until'][index])
+            stockout = reorder_by = None
+            if days_until <= horizon_days:
+                stockout = as_of + datetime.timedelta(days=days_until)
+                reorder_by = stockout - datetime.timedelta(days=int(lead_times[index]))
+            yield [
+                material_id, as_of, round(float(stock[index]), 2),
+                round(float(forecast['recent_rate'][index]), 4),
+                round(float(forecast['seasonal_factor'][index]), 4),
+                round(float(forecast['projected_rate'][index]), 4),
+                days_until if stockout else None, stockout, reorder_by, computed_at,
+            ]
+
+
+def write_forecasts(rows):
+    """Replaces the contents of materialforecast with rows; returns the row count."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+        count += 1
+    buffer.seek(0)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('DELETE FROM materialforecast')
+        if not copy_csv(cursor, COPY_FORECAST_SQL, buffer):
+            raise RuntimeError('The database driver does not support COPY.')
+    return count
+
+
+def run_forecast(as_of=None, window_days=DEFAULT_WINDOW_DAYS, history_days=DEFAULT_HISTORY_DAYS,
+                 horizon_days=DEFAULT_HORIZON_DAYS, workers=None):
+    """
+    Recomputes the forecast of every material. With workers=0 everything runs
+    in this process and on its connection. Returns the number of forecasts.
+    """
+    require_numpy()
+    as_of = as_of or datetime.date.today()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT DISTINCT discipline_id FROM dimmaterial')
+        disciplines = [row[0] for row in cursor.fetchall()]
+    jobs = [(discipline_id, as_of, window_days, history_days, horizon_days) for discipline_id in disciplines]
+
+    results = map_in_processes(forecast_discipline, jobs, workers)
+    computed_at = datetime.datetime.now(datetime.timezone.utc)
+    return write_forecasts(forecast_rows(results, as_of, horizon_days, computed_at))
@@ -0,0 +1,302 @@
+# ingest.py
+#
+# Streaming bulk loader for FactInventoryTransactions. Uploads are parsed
+# incrementally, validated and written in fixed-size batches, so memory use
+# depends on the batch size rather than on the size of the upload. COPY and
+# bulk_create bypass the post_save signal, so ingest_transactions runs its
+# hooks itself once rows were loaded, for the API and load_transactions alike.
+
+import codecs
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.db import DatabaseError, connection, transaction
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+
+from . import cache, valuation
+from .alerts import evaluate_on_commit
+from .dates import ensure_dates, is_date_id
+from .models import DimMaterial, DimTool, FactInventoryTransactions
+from .serializers import TransactionRowSerializer
+
+BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+# Per-row errors beyond this many are counted but not returned
+MAX_REPORTED_ERRORS = 1000
+
+# Column order used for COPY and for building model instances
+FACT_COLUMNS = [
+    'date_id', 'material_id', 'tool_id', 'quantity_change',
+    'cost_per_unit', 'total_cost', 'transaction_type', 'notes',
+]
+COPY_FACT_SQL = f"COPY factinventorytransactions ({', '.join(FACT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+JSON_CONTENT_TYPES = {'application/json'}
+NDJSON_CONTENT_TYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines'}
+CSV_CONTENT_TYPES = {'text/csv', 'application/csv'}
+
+
+@dataclass
+class IngestResult:
+    received: int = 0
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+    # Set when the upload itself could not be parsed past some point
+    parse_error: str = None
+
+    def add_error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'received': self.received,
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'parse_error': self.parse_error,
+        }
+
+
+def _iter_text(stream, chunk_size=READ_CHUNK_SIZE):
+    """Yields decoded text chunks from a binary (or text) file-like object."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk if isinstance(chunk, str) else decoder.decode(chunk)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_lines(stream):
+    """Yields lines from a file-like object without reading it all at once."""
+    pending = ''
+    for text in _iter_text(stream):
+        pending += text
+        *lines, pending = pending.split('\n')
+        yield from (line + '\n' for line in lines)
+    if pending:
+        yield pending
+
+
+def iter_json_array(stream):
+    """Yields the elements of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    chunks = _iter_text(stream)
+    buffer, pos, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buffer, pos = buffer[pos:] + chunk, 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return ''
+            read_more()
+
+    if peek() != '[':
+        raise ParseError('Expected a JSON array of transactions.')
+    pos += 1
+    if peek() == ']':
+        return
+    while True:
+        peek()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ParseError('Malformed JSON array.')
+                read_more()
+                continue
+            # A value ending exactly at the buffer edge may be truncated (e.g. a number)
+            if end == len(buffer) and not eof:
+                read_more()
+                continue
+            break
+        pos = end
+        yield item
+        token = peek()
+        if token == ',':
+            pos += 1
+        elif token == ']':
+            return
+        else:
+            raise ParseError('Malformed JSON array.')
+
+
+def iter_ndjson(stream):
+    for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Keep going; the row is reported as invalid by the validator
+            yield None
+
+
+def iter_csv(stream):
+    for record in csv.DictReader(iter_lines(stream)):
+        # Empty CSV cells mean "not supplied"
+        yield {key: value for key, value in record.items() if key and value not in ('', None)}
+
+
+def iter_records(stream, content_type):
+    """Picks a record parser for the upload's media type."""
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in JSON_CONTENT_TYPES:
+        return iter_json_array(stream)
+    if media_type in NDJSON_CONTENT_TYPES:
+        return iter_ndjson(stream)
+    if media_type in CSV_CONTENT_TYPES:
+        return iter_csv(stream)
+    raise UnsupportedMediaType(media_type)
+
+
+def _existing_keys(model, key, values):
+    if not values:
+        return set()
+    return set(model.objects.filter(**{f'{key}__in': values}).values_list(key, flat=True))
+
+
+def _resolve_keys(rows, result):
+    """
+    Drops rows that reference a missing DimMaterial/DimTool, using one lookup
+    per dimension for the whole batch. Days missing from DimDate are created.
+    """
+    date_ids = {row['date_id'] for _, row in rows if is_date_id(row['date_id'])}
+    ensure_dates(date_ids)
+    material_ids = _existing_keys(DimMaterial, 'material_id', {row['material_id'] for _, row in rows if row.get('material_id')})
+    tool_ids = _existing_keys(DimTool, 'tool_id', {row['tool_id'] for _, row in rows if row.get('tool_id')})
+
+    resolved = []
+    for index, row in rows:
+        errors = {}
+        if row['date_id'] not in date_ids:
+            errors['date_id'] = [f"{row['date_id']} is not a valid YYYYMMDD date."]
+        if row.get('material_id') is not None and row['material_id'] not in material_ids:
+            errors['material_id'] = [f"DimMaterial {row['material_id']} does not exist."]
+        if row.get('tool_id') is not None and row['tool_id'] not in tool_ids:
+            errors['tool_id'] = [f"DimTool {row['tool_id']} does not exist."]
+        if errors:
+            result.add_error(index, errors)
+        else:
+            resolved.append((index, row))
+    return resolved
+
+
+def _copy_rows(rows):
+    """Writes rows with PostgreSQL COPY; returns False if COPY is unavailable."""
+    if connection.vendor != 'postgresql':
+        return False
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for _, row in rows:
+        writer.writerow(['' if row.get(column) is None else row[column] for column in FACT_COLUMNS])
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        return copy_csv(cursor, COPY_FACT_SQL, buffer)
+
+
+def copy_csv(cursor, sql, buffer):
+    """
+    Runs a COPY ... FROM STDIN statement with CSV text from buffer, through
+    psycopg2's copy_expert or psycopg 3's cursor.copy. Returns False if the
+    driver supports neither.
+    """
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        raw.copy_expert(sql, buffer)
+    elif hasattr(raw, 'copy'):
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+    else:
+        return False
+    return True
+
+
+def _write_rows(rows, use_copy):
+    if not (use_copy and _copy_rows(rows)):
+        FactInventoryTransactions.objects.bulk_create(
+            [FactInventoryTransactions(**{column: row.get(column) for column in FACT_COLUMNS}) for _, row in rows],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def _flush(batch, result, use_copy):
+    valid = []
+    for index, record in batch:
+        if not isinstance(record, dict):
+            result.add_error(index, {'non_field_errors': ['Expected an object.']})
+            continue
+        serializer = TransactionRowSerializer(data=record)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            result.add_error(index, serializer.errors)
+
+    rows = _resolve_keys(valid, result)
+    if not rows:
+        return
+    try:
+        with transaction.atomic():
+            _write_rows(rows, use_copy)
+    except DatabaseError as exc:
+        for index, _ in rows:
+            result.add_error(index, {'non_field_errors': [f'Batch rejected by the database: {exc}']})
+        return
+    result.created += len(rows)
+
+
+def ingest_transactions(records, batch_size=BATCH_SIZE, use_copy=True):
+    """
+    Validates and inserts an iterable of transaction records in batches.
+
+    Each batch is committed on its own, so a bad batch does not roll back rows
+    that were already accepted. Returns an IngestResult with per-row errors
+    keyed by the record's position in the upload. Once rows were created, the
+    stock caches are dropped and alerts and valuations brought up to date.
+    """
+    result = IngestResult()
+    batch = []
+    try:
+        for index, record in enumerate(records):
+            result.received += 1
+            batch.append((index, record))
+            if len(batch) >= batch_size:
+                _flush(batch, result, use_copy)
+                batch = []
+    except ParseError as exc:
+        # Rows parsed before the syntax error are still loaded
+        result.parse_error = str(exc.detail)
+    if batch:
+        _flush(batch, result, use_copy)
+    if result.created:
+        _after_load()
+    return result
+
+
+def _after_load():
+    # What signals.py does for a single write
+    cache.invalidate(cache.STOCK)
+    evaluate_on_commit()
+    valuation.update_on_commit()
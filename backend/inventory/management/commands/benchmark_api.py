@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.benchmarks import SCENARIOS, BenchmarkClient, benchmark_token, compare, run_scenario, sample_ids
+
+
+class Command(BaseCommand):
+    help = 'Measures p50/p95/p99 latency, queries per request and throughput for every API endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads per scenario.')
+        parser.add_argument('--only', default='', help='Run only scenarios whose name contains this text.')
+        parser.add_argument('--user', default='benchmark', help='User the requests authenticate as.')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file.')
+        parser.add_argument('--baseline', help='Results file from an earlier run to compare against.')
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help='Allowed p95 slowdown against the baseline, as a fraction.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        try:
+            ids = sample_ids()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        client = BenchmarkClient(benchmark_token(options['user']))
+
+        scenarios = [scenario for scenario in SCENARIOS if options['only'] in scenario.name]
+        self.stdout.write(f"{'scenario':<32} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'req/s':>8} {'errors':>7}")
+        results = []
+        for scenario in scenarios:
+            row = run_scenario(client, scenario, ids, options['iterations'], options['warmup'], options['concurrency'])
+            results.append(row)
+            self.stdout.write(
+                f"{row['name']:<32} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+                f"{row['queries']:>8} {row['throughput_rps']:>8} {row['errors']:>7}"
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+        failed = [row['name'] for row in results if row['errors']]
+        if failed:
+            raise CommandError(f"Requests failed in: {', '.join(failed)}")
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = compare(results, json.load(baseline), options['max_regression'])
+            for name, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'{name}: {before} -> {after}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}.')
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} scenarios completed.'))
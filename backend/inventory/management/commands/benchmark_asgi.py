@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.benchmarks import ASYNC_PATHS, asgi_load, benchmark_token, summarize_load, wsgi_load
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares throughput of the WSGI application on the sync endpoints with the ASGI '
+        'application on the async ones (/api/async/) at the same concurrency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per run.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once.')
+        parser.add_argument('--user', default='benchmark', help='User the requests authenticate as.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1.')
+        # Imported here so the applications are only built when the benchmark runs
+        from inventory_backend.asgi import application as asgi_application
+        from inventory_backend.wsgi import application as wsgi_application
+
+        token = benchmark_token(options['user'])
+        sync_paths = [sync for sync, _ in ASYNC_PATHS]
+        async_paths = [async_path for _, async_path in ASYNC_PATHS]
+        runs = [
+            ('wsgi, sync views', wsgi_load, wsgi_application, sync_paths),
+            ('asgi, async views', asgi_load, asgi_application, async_paths),
+            ('asgi, sync views', asgi_load, asgi_application, sync_paths),
+        ]
+
+        self.stdout.write(
+            f"{options['requests']} requests over {len(ASYNC_PATHS)} endpoints, {options['concurrency']} concurrent"
+        )
+        self.stdout.write(f"{'run':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7}")
+        for name, load, application, paths in runs:
+            samples, wall = load(application, paths, token, options['requests'], options['concurrency'])
+            row = summarize_load(name, samples, wall)
+            self.stdout.write(
+                f"{row['name']:<20} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+                f"{row['throughput_rps']:>8} {row['errors']:>7}"
+            )
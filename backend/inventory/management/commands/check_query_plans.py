@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from inventory.views import FactInventoryTransactionsViewSet, MaterialViewSet, ToolViewSet
+
+# (description, viewset, query parameters, indexes any one of which the plan must use)
+SCENARIOS = [
+    ('transactions by date range', FactInventoryTransactionsViewSet,
+     {'date__date_id__gte': 20250101, 'date__date_id__lte': 20250131}, ['fact_date_transaction_idx']),
+    ('transactions by material', FactInventoryTransactionsViewSet,
+     {'material__material_id': 1}, ['fact_material_date_idx']),
+    ('transactions by tool', FactInventoryTransactionsViewSet,
+     {'tool__tool_id': 1}, ['fact_tool_date_idx']),
+    ('transactions by type', FactInventoryTransactionsViewSet,
+     {'transaction_type': 'Purchase'}, ['fact_type_date_idx']),
+    ('materials by discipline', MaterialViewSet,
+     {'discipline__discipline_id': 1}, ['dimmaterial_discipline_name_idx']),
+    ('materials by type', MaterialViewSet,
+     {'material_type': 'Lumber'}, ['dimmaterial_type_name_idx']),
+    ('materials by brand', MaterialViewSet,
+     {'brand': 'Acme'}, ['dimmaterial_brand_name_idx']),
+    ('materials search', MaterialViewSet,
+     {'search': 'plywood'}, ['dimmaterial_name_trgm_idx']),
+    ('tools by discipline', ToolViewSet,
+     {'discipline__discipline_id': 1}, ['dimtool_discipline_idx']),
+    ('tools search', ToolViewSet,
+     {'search': 'drill'}, ['dimtool_name_trgm_idx']),
+]
+
+
+def partition_indexes(indexes):
+    """Maps each partition's copy of an index back to the index on the partitioned table."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname, parent.relname
+            FROM pg_inherits AS i
+            JOIN pg_class AS child ON child.oid = i.inhrelid
+            JOIN pg_class AS parent ON parent.oid = i.inhparent
+            WHERE parent.relname = ANY(%s)
+        """, [list(indexes)])
+        return dict(cursor.fetchall())
+
+
+def list_queryset(viewset, params):
+    """Builds the queryset a viewset's list action would page through for these parameters."""
+    view = viewset()
+    view.action = 'list'
+    view.format_kwarg = None
+    view.kwargs = {}
+    view.request = Request(APIRequestFactory().get('/', params))
+    queryset = view.filter_queryset(view.get_queryset())
+    if view.pagination_class is not None:
+        queryset = view.pagination_class().page_queryset(queryset, view.request)
+    return queryset
+
+
+class Command(BaseCommand):
+    help = 'EXPLAINs the query behind each API filter and checks that it is served by an index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show-plans', action='store_true', help='Print every query plan.')
+
+    def handle(self, *args, **options):
+        failures = []
+        children = partition_indexes({index for _, _, _, indexes in SCENARIOS for index in indexes})
+        for description, viewset, params, indexes in SCENARIOS:
+            with transaction.atomic():
+                # Development tables are small enough that the planner would
+                # always pick a sequential scan; this asks whether an index
+                # can serve the query at all.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = list_queryset(viewset, params).explain()
+
+            # Partitioned indexes appear in plans under each partition's index name
+            used = [index for index in indexes if index in plan]
+            used += [parent for child, parent in children.items() if parent in indexes and child in plan]
+            if used:
+                self.stdout.write(f'ok    {description}: {used[0]}')
+            else:
+                failures.append(description)
+                self.stdout.write(f'FAIL  {description}: expected one of {", ".join(indexes)}')
+            if options['show_plans'] or not used:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{len(failures)} API filter(s) are not served by an index.')
+        self.stdout.write(self.style.SUCCESS('Every API filter is served by an index.'))
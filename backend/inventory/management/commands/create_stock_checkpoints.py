@@ -0,0 +1,52 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from inventory.models import FactInventoryTransactions, StockCheckpoint
+from inventory.stock import archive_cutoff, create_checkpoint, date_id_for, month_ends
+
+
+def parse_date_id(date_id):
+    return datetime.datetime.strptime(str(date_id), '%Y%m%d').date()
+
+
+class Command(BaseCommand):
+    help = 'Creates month-end stock checkpoints used by point-in-time ("as_of") stock queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--through', type=datetime.date.fromisoformat,
+            help='Create month-end checkpoints up to this date (default: end of last month).',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Delete existing checkpoints and recreate them from the full history.',
+        )
+
+    def handle(self, *args, **options):
+        through = options['through'] or datetime.date.today().replace(day=1) - datetime.timedelta(days=1)
+
+        if options['rebuild']:
+            if archive_cutoff():
+                raise CommandError('Checkpoints cannot be rebuilt once transactions have been archived.')
+            StockCheckpoint.objects.all().delete()
+
+        latest = StockCheckpoint.objects.aggregate(latest=Max('date_id'))['latest']
+        if latest:
+            start = parse_date_id(latest) + datetime.timedelta(days=1)
+        else:
+            first = FactInventoryTransactions.objects.aggregate(first=Min('date_id'))['first']
+            if first is None:
+                raise CommandError('There are no transactions to checkpoint.')
+            start = parse_date_id(first)
+
+        created = 0
+        for month_end in month_ends(start, through):
+            try:
+                rows = create_checkpoint(date_id_for(month_end))
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(f'Checkpoint {month_end}: {rows} balances.')
+            created += 1
+        self.stdout.write(self.style.SUCCESS(f'Created {created} checkpoints.'))
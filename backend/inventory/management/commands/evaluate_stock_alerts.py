@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.alerts import evaluate_stock_alerts
+
+
+class Command(BaseCommand):
+    help = 'Raises low-stock alerts for the materials whose stock changed since the last evaluation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch', type=float, metavar='SECONDS',
+            help='Keep evaluating every SECONDS, for loads that bypass the API.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            alert_ids = evaluate_stock_alerts()
+            if alert_ids or not options['watch']:
+                self.stdout.write(f'Raised {len(alert_ids)} stock alerts.')
+            if not options['watch']:
+                return
+            time.sleep(options['watch'])
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import columnar
+
+
+class Command(BaseCommand):
+    help = 'Exports the fact table and the dimension tables to Parquet or Arrow IPC files for BI tools.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Output directory; a manifest.json is kept next to the files.')
+        parser.add_argument('--format', dest='export_format', choices=list(columnar.FORMATS), default='parquet')
+        parser.add_argument('--tables', nargs='+', choices=list(columnar.TABLES), default=None,
+                            help='Tables to export (default: all).')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only append transactions added since the last export to the directory.')
+
+    def handle(self, *args, **options):
+        if columnar.pa is None:
+            raise CommandError('Columnar export needs PyArrow: uv sync --extra columnar')
+
+        started = time.perf_counter()
+        try:
+            written = columnar.export_directory(
+                options['directory'], export_format=options['export_format'],
+                tables=options['tables'], incremental=options['incremental'],
+            )
+        except columnar.ExportError as exc:
+            raise CommandError(str(exc))
+        for table, rows in written.items():
+            self.stdout.write(f'{table}: {rows} rows')
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(written)} tables to {options['directory']} in {time.perf_counter() - started:.1f}s."
+        ))
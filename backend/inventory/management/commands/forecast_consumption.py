@@ -0,0 +1,39 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import forecast
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the consumption-rate forecast and projected stock-out date of every material.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', type=datetime.date.fromisoformat, default=None,
+                            help='Forecast from the end of this day (default: today).')
+        parser.add_argument('--window', type=int, default=forecast.DEFAULT_WINDOW_DAYS,
+                            help='Days of recent usage the daily rate is averaged over.')
+        parser.add_argument('--history', type=int, default=forecast.DEFAULT_HISTORY_DAYS,
+                            help='Days of history the seasonal profile is built from.')
+        parser.add_argument('--horizon', type=int, default=forecast.DEFAULT_HORIZON_DAYS,
+                            help='Days ahead to project stock-outs.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: one per CPU; 0 runs in this process).')
+
+    def handle(self, *args, **options):
+        if forecast.np is None:
+            raise CommandError('Forecasting needs NumPy: uv sync --extra forecast')
+        if min(options['window'], options['history'], options['horizon']) < 1:
+            raise CommandError('--window, --history and --horizon must be positive.')
+        if options['window'] > options['history']:
+            raise CommandError('--window must not be longer than --history.')
+
+        started = time.perf_counter()
+        count = forecast.run_forecast(
+            as_of=options['as_of'], window_days=options['window'], history_days=options['history'],
+            horizon_days=options['horizon'], workers=options['workers'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Forecast {count} materials in {time.perf_counter() - started:.1f}s.'
+        ))
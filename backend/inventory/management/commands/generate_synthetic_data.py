@@ -0,0 +1,48 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from inventory import synthetic
+
+
+class Command(BaseCommand):
+    help = 'Fills the star schema with synthetic dates, materials, tools and transactions for load testing.'
+
+    def add_arguments(self, parser):
+        today = datetime.date.today()
+        parser.add_argument('--start-date', type=datetime.date.fromisoformat,
+                            default=datetime.date(today.year - 3, 1, 1))
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat, default=today)
+        parser.add_argument('--materials', type=int, default=5000)
+        parser.add_argument('--tools', type=int, default=2000)
+        parser.add_argument('--transactions', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=synthetic.COPY_BATCH_SIZE,
+                            help='Fact rows per COPY statement.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The synthetic data loader uses COPY and needs PostgreSQL.')
+        if options['start_date'] > options['end_date']:
+            raise CommandError('--start-date must not be after --end-date.')
+        rng = random.Random(options['seed'])
+
+        days = synthetic.create_dates(options['start_date'], options['end_date'])
+        self.stdout.write(f'DimDate covers {len(days)} days.')
+        disciplines = synthetic.create_disciplines()
+        material_ids = synthetic.create_materials(rng, disciplines, options['materials'])
+        tool_ids = synthetic.create_tools(rng, disciplines, options['tools'])
+        self.stdout.write(f'{len(material_ids)} materials and {len(tool_ids)} tools in {len(disciplines)} disciplines.')
+        if not material_ids:
+            raise CommandError('At least one material is needed to generate transactions.')
+
+        started = time.perf_counter()
+        rows = synthetic.generate_fact_rows(rng, days, material_ids, tool_ids, options['transactions'])
+        written = synthetic.copy_fact_rows(rows, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {written} transactions in {elapsed:.1f}s ({written / max(elapsed, 1e-9):,.0f} rows/s).'
+        ))
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.ingest import BATCH_SIZE, ingest_transactions, iter_csv, iter_json_array, iter_ndjson
+
+PARSERS = {
+    'csv': iter_csv,
+    'json': iter_json_array,
+    'ndjson': iter_ndjson,
+}
+
+
+class Command(BaseCommand):
+    help = 'Bulk loads FactInventoryTransactions from a CSV, NDJSON or JSON array file using COPY.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to load.')
+        parser.add_argument(
+            '--format', choices=sorted(PARSERS),
+            help='Input format; inferred from the file extension when omitted.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Insert with bulk_create instead of COPY.',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or {'.jsonl': 'ndjson'}.get(path.suffix, path.suffix.lstrip('.'))
+        if file_format not in PARSERS:
+            raise CommandError(f'Cannot infer the input format of {path}; pass --format.')
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+
+        with path.open('rb') as stream:
+            result = ingest_transactions(
+                PARSERS[file_format](stream),
+                batch_size=options['batch_size'],
+                use_copy=not options['no_copy'],
+            )
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if result.parse_error:
+            self.stderr.write(f'Stopped reading input: {result.parse_error}')
+        self.stdout.write(
+            f'Received {result.received} rows: {result.created} created, {result.failed} rejected.'
+        )
+        if result.failed or result.parse_error:
+            raise CommandError('Some rows were not loaded.')
@@ -0,0 +1,56 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import partitions
+
+
+def parse_month(value):
+    return datetime.datetime.strptime(value, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = 'Creates upcoming monthly partitions of the transaction table and archives old ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=12,
+                            help='Make sure partitions exist for this many months past the current one.')
+        parser.add_argument('--archive-before', type=parse_month, metavar='YYYY-MM',
+                            help='Detach every partition for months before this one.')
+        parser.add_argument('--archive-schema', default='archive',
+                            help='Schema detached partitions are moved into.')
+        parser.add_argument('--drop', action='store_true', help='Drop detached partitions instead of keeping them.')
+        parser.add_argument('--split-default', action='store_true',
+                            help='Move rows out of the default partition into partitions for their months.')
+        parser.add_argument('--list', action='store_true', help='List the attached partitions.')
+
+    def handle(self, *args, **options):
+        for name in partitions.ensure_partitions(options['ahead']):
+            self.stdout.write(f'Created {name}.')
+
+        if options['split_default']:
+            for name in partitions.split_default_partition():
+                self.stdout.write(f'Split {name} out of the default partition.')
+
+        if options['archive_before']:
+            try:
+                archived = partitions.archive_partitions(
+                    options['archive_before'], schema=options['archive_schema'], drop=options['drop'],
+                )
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            action = 'Dropped' if options['drop'] else f"Moved to {options['archive_schema']}:"
+            for name in archived:
+                self.stdout.write(f'{action} {name}.')
+
+        if options['list']:
+            for name, lower, upper in partitions.list_partitions():
+                self.stdout.write(f'{name}  [{lower}, {upper})')
+
+        stray = partitions.default_partition_rows()
+        if stray:
+            self.stdout.write(self.style.WARNING(
+                f'{stray} transactions are in {partitions.DEFAULT_PARTITION}; '
+                'run with --split-default so date filters can prune them.'
+            ))
+        self.stdout.write(self.style.SUCCESS('Partitions are up to date.'))
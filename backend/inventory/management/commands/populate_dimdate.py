@@ -0,0 +1,24 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.dates import populate_dates
+
+
+class Command(BaseCommand):
+    help = 'Inserts the DimDate rows for every day in a date range that does not have one yet.'
+
+    def add_arguments(self, parser):
+        today = datetime.date.today()
+        parser.add_argument('--start-date', type=datetime.date.fromisoformat,
+                            default=datetime.date(today.year, 1, 1))
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat,
+                            default=datetime.date(today.year + 1, 12, 31))
+
+    def handle(self, *args, **options):
+        if options['start_date'] > options['end_date']:
+            raise CommandError('--start-date must not be after --end-date.')
+        created = populate_dates(options['start_date'], options['end_date'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {created} days to DimDate for {options['start_date']} to {options['end_date']}."
+        ))
@@ -0,0 +1,24 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory import sync
+
+
+class Command(BaseCommand):
+    help = 'Deletes delta sync changes older than the retention period and compacts the rest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHANGELOG_RETENTION_DAYS,
+                            help='Keep the changes of this many days (default: CHANGELOG_RETENTION_DAYS).')
+        parser.add_argument('--no-compact', action='store_true',
+                            help='Keep changes superseded by a later change of the same row.')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        pruned, compacted = sync.prune_changelog(before, compact=not options['no_compact'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {pruned} changes made before {before:%Y-%m-%d %H:%M} and compacted {compacted}.'
+        ))
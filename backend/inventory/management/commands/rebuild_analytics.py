@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.analytics import find_monthly_summary_drift, rebuild_monthly_summary
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly analytics summary from FactInventoryTransactions and verifies it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Only compare the summary against the fact table; do not rebuild.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            rows = rebuild_monthly_summary()
+            self.stdout.write(f'Rebuilt {rows} monthly summary rows.')
+
+        drift = find_monthly_summary_drift()
+        for year, month, material_id, tool_id, transaction_type in drift:
+            self.stderr.write(
+                f'{year}-{month:02d} material={material_id} tool={tool_id} {transaction_type}: summary differs'
+            )
+        if drift:
+            raise CommandError(f'Monthly summary differs from the fact table in {len(drift)} rows.')
+        self.stdout.write(self.style.SUCCESS('Monthly summary matches the fact table.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.stock import find_material_stock_drift, rebuild_material_stock
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-material stock ledger from FactInventoryTransactions and verifies it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Only compare the ledger against the fact table; do not rebuild.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            rows = rebuild_material_stock()
+            self.stdout.write(f'Rebuilt stock ledger for {rows} materials.')
+
+        drift = find_material_stock_drift()
+        for material_id, ledger_stock, fact_stock, ledger_count, fact_count in drift:
+            self.stderr.write(
+                f'Material {material_id}: ledger stock={ledger_stock} ({ledger_count} txns), '
+                f'fact table stock={fact_stock} ({fact_count} txns)'
+            )
+        if drift:
+            raise CommandError(f'Stock ledger differs from the fact table for {len(drift)} materials.')
+        self.stdout.write(self.style.SUCCESS('Stock ledger matches the fact table.'))
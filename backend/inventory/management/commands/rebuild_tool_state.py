@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.toolstate import find_tool_state_drift, rebuild_tool_state
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the tool checkout state table from FactInventoryTransactions and verifies it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Only compare the tool state against the fact table; do not rebuild.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            rows = rebuild_tool_state()
+            self.stdout.write(f'Rebuilt state for {rows} tools.')
+
+        drift = find_tool_state_drift()
+        if drift:
+            self.stderr.write(f"Stale tool state: {', '.join(str(tool_id) for tool_id in drift[:50])}")
+            raise CommandError(f'Tool state differs from the fact table for {len(drift)} tools.')
+        self.stdout.write(self.style.SUCCESS('Tool state matches the fact table.'))
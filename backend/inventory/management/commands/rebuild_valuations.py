@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory import valuation
+
+
+class Command(BaseCommand):
+    help = 'Revalues every material (weighted-average and FIFO) from FactInventoryTransactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: one per CPU; 0 runs in this process).')
+        parser.add_argument('--pending-only', action='store_true',
+                            help='Only value materials with new transactions, e.g. after a load that bypassed the API.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['pending_only']:
+            count = valuation.update_valuations()
+        else:
+            count = valuation.rebuild_valuations(workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Valued {count} materials in {time.perf_counter() - started:.1f}s.'
+        ))
@@ -0,0 +1,139 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Statement-level triggers aggregate each INSERT/UPDATE/DELETE (including COPY
+# and multi-row statements) into one upsert per touched material.
+MATERIAL_STOCK_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION materialstock_apply_delta() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO materialstock AS s (material_id, current_stock, transaction_count, updated_at)
+        SELECT material_id, SUM(quantity_change), COUNT(*), now()
+        FROM new_rows
+        WHERE material_id IS NOT NULL
+        GROUP BY material_id
+        ORDER BY material_id
+        ON CONFLICT (material_id) DO UPDATE
+        SET current_stock = s.current_stock + EXCLUDED.current_stock,
+            transaction_count = s.transaction_count + EXCLUDED.transaction_count,
+            updated_at = EXCLUDED.updated_at;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO materialstock AS s (material_id, current_stock, transaction_count, updated_at)
+        SELECT material_id, SUM(quantity_change), SUM(row_count), now()
+        FROM (
+            SELECT material_id, quantity_change, 1 AS row_count FROM new_rows
+            UNION ALL
+            SELECT material_id, -quantity_change, -1 FROM old_rows
+        ) AS delta
+        WHERE material_id IS NOT NULL
+        GROUP BY material_id
+        HAVING SUM(quantity_change) <> 0 OR SUM(row_count) <> 0
+        ORDER BY material_id
+        ON CONFLICT (material_id) DO UPDATE
+        SET current_stock = s.current_stock + EXCLUDED.current_stock,
+            transaction_count = s.transaction_count + EXCLUDED.transaction_count,
+            updated_at = EXCLUDED.updated_at;
+    ELSE
+        INSERT INTO materialstock AS s (material_id, current_stock, transaction_count, updated_at)
+        SELECT material_id, -SUM(quantity_change), -COUNT(*), now()
+        FROM old_rows
+        WHERE material_id IS NOT NULL
+        GROUP BY material_id
+        ORDER BY material_id
+        ON CONFLICT (material_id) DO UPDATE
+        SET current_stock = s.current_stock + EXCLUDED.current_stock,
+            transaction_count = s.transaction_count + EXCLUDED.transaction_count,
+            updated_at = EXCLUDED.updated_at;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER materialstock_on_insert
+    AFTER INSERT ON factinventorytransactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION materialstock_apply_delta();
+
+CREATE TRIGGER materialstock_on_update
+    AFTER UPDATE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION materialstock_apply_delta();
+
+CREATE TRIGGER materialstock_on_delete
+    AFTER DELETE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION materialstock_apply_delta();
+
+INSERT INTO materialstock (material_id, current_stock, transaction_count, updated_at)
+SELECT material_id, SUM(quantity_change), COUNT(*), now()
+FROM factinventorytransactions
+WHERE material_id IS NOT NULL
+GROUP BY material_id;
+"""
+
+DROP_MATERIAL_STOCK_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS materialstock_on_insert ON factinventorytransactions;
+DROP TRIGGER IF EXISTS materialstock_on_update ON factinventorytransactions;
+DROP TRIGGER IF EXISTS materialstock_on_delete ON factinventorytransactions;
+DROP FUNCTION IF EXISTS materialstock_apply_delta();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        # Bring the migration state in line with the unmanaged models; these
+        # operations do not touch the database.
+        migrations.AlterField(
+            model_name='dimmaterial',
+            name='material_name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddField(
+            model_name='dimmaterial',
+            name='discipline',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.dimdiscipline'),
+        ),
+        migrations.AddField(
+            model_name='dimtool',
+            name='discipline',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.dimdiscipline'),
+        ),
+        migrations.AddField(
+            model_name='factinventorytransactions',
+            name='date',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.dimdate'),
+        ),
+        migrations.AddField(
+            model_name='factinventorytransactions',
+            name='material',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.dimmaterial'),
+        ),
+        migrations.AddField(
+            model_name='factinventorytransactions',
+            name='tool',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.dimtool'),
+        ),
+        migrations.CreateModel(
+            name='MaterialStock',
+            fields=[
+                ('material', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock', serialize=False, to='inventory.dimmaterial')),
+                ('current_stock', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Material Stock',
+                'db_table': 'materialstock',
+            },
+        ),
+        migrations.RunSQL(MATERIAL_STOCK_TRIGGERS_SQL, DROP_MATERIAL_STOCK_TRIGGERS_SQL),
+    ]
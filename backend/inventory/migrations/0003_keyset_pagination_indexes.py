@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 10:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0002_materialstock'),
+    ]
+
+    operations = [
+        # Keyset pagination order for /api/transactions/ and /api/materials/
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS fact_date_transaction_idx '
+            'ON factinventorytransactions (date_id, transaction_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS fact_date_transaction_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS dimmaterial_name_id_idx '
+            'ON dimmaterial (material_name, material_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS dimmaterial_name_id_idx;',
+        ),
+    ]
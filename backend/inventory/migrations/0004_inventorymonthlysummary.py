@@ -0,0 +1,110 @@
+# Generated by Django 5.2.4 on 2026-10-17 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Calendar attributes are derived from the YYYYMMDD date_id, so the triggers
+# never need to join dimdate.
+SUMMARY_UPSERT_SQL = """
+        INSERT INTO inventorymonthlysummary AS s (
+            year, quarter_number, month_number, material_id, tool_id, transaction_type,
+            quantity_change, total_cost, transaction_count
+        )
+        SELECT date_id / 10000, (date_id / 100 % 100 - 1) / 3 + 1, date_id / 100 % 100,
+               material_id, tool_id, transaction_type,
+               SUM(quantity_change), SUM(COALESCE(total_cost, 0)), SUM(row_count)
+        FROM ({source}) AS delta
+        GROUP BY 1, 2, 3, 4, 5, 6
+        HAVING SUM(quantity_change) <> 0 OR SUM(COALESCE(total_cost, 0)) <> 0 OR SUM(row_count) <> 0
+        ORDER BY 1, 3, 4, 5, 6
+        ON CONFLICT (year, month_number, material_id, tool_id, transaction_type) DO UPDATE
+        SET quantity_change = s.quantity_change + EXCLUDED.quantity_change,
+            total_cost = s.total_cost + EXCLUDED.total_cost,
+            transaction_count = s.transaction_count + EXCLUDED.transaction_count;
+"""
+
+NEW_ROWS = 'SELECT date_id, material_id, tool_id, transaction_type, quantity_change, total_cost, 1 AS row_count FROM new_rows'
+OLD_ROWS = (
+    'SELECT date_id, material_id, tool_id, transaction_type, '
+    '-quantity_change AS quantity_change, -total_cost AS total_cost, -1 AS row_count FROM old_rows'
+)
+
+SUMMARY_TRIGGERS_SQL = f"""
+CREATE OR REPLACE FUNCTION inventorymonthlysummary_apply_delta() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+{SUMMARY_UPSERT_SQL.format(source=NEW_ROWS)}
+    ELSIF TG_OP = 'UPDATE' THEN
+{SUMMARY_UPSERT_SQL.format(source=f'{NEW_ROWS} UNION ALL {OLD_ROWS}')}
+    ELSE
+{SUMMARY_UPSERT_SQL.format(source=OLD_ROWS)}
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER inventorymonthlysummary_on_insert
+    AFTER INSERT ON factinventorytransactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventorymonthlysummary_apply_delta();
+
+CREATE TRIGGER inventorymonthlysummary_on_update
+    AFTER UPDATE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventorymonthlysummary_apply_delta();
+
+CREATE TRIGGER inventorymonthlysummary_on_delete
+    AFTER DELETE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventorymonthlysummary_apply_delta();
+
+INSERT INTO inventorymonthlysummary (
+    year, quarter_number, month_number, material_id, tool_id, transaction_type,
+    quantity_change, total_cost, transaction_count
+)
+SELECT date_id / 10000, (date_id / 100 % 100 - 1) / 3 + 1, date_id / 100 % 100,
+       material_id, tool_id, transaction_type,
+       SUM(quantity_change), SUM(COALESCE(total_cost, 0)), COUNT(*)
+FROM factinventorytransactions
+GROUP BY 1, 2, 3, 4, 5, 6;
+"""
+
+DROP_SUMMARY_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS inventorymonthlysummary_on_insert ON factinventorytransactions;
+DROP TRIGGER IF EXISTS inventorymonthlysummary_on_update ON factinventorytransactions;
+DROP TRIGGER IF EXISTS inventorymonthlysummary_on_delete ON factinventorytransactions;
+DROP FUNCTION IF EXISTS inventorymonthlysummary_apply_delta();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('quarter_number', models.IntegerField()),
+                ('month_number', models.IntegerField()),
+                ('transaction_type', models.CharField(max_length=50)),
+                ('quantity_change', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('material', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.dimmaterial')),
+                ('tool', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.dimtool')),
+            ],
+            options={
+                'verbose_name_plural': 'Inventory Monthly Summaries',
+                'db_table': 'inventorymonthlysummary',
+                'constraints': [models.UniqueConstraint(fields=('year', 'month_number', 'material', 'tool', 'transaction_type'), name='inventorymonthlysummary_key', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunSQL(SUMMARY_TRIGGERS_SQL, DROP_SUMMARY_TRIGGERS_SQL),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.4 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# A backdated write (date_id on or before an existing checkpoint) is folded into
+# every checkpoint at or after its date, so snapshots never go stale. Writes
+# after the latest checkpoint join no checkpoint rows and cost nothing extra.
+CHECKPOINT_UPSERT_SQL = """
+        INSERT INTO stockcheckpointbalance AS b (checkpoint_id, material_id, tool_id, quantity)
+        SELECT c.date_id, delta.material_id, delta.tool_id, SUM(delta.quantity_change)
+        FROM ({source}) AS delta
+        JOIN stockcheckpoint AS c ON c.date_id >= delta.date_id
+        GROUP BY 1, 2, 3
+        HAVING SUM(delta.quantity_change) <> 0
+        ORDER BY 1, 2, 3
+        ON CONFLICT (checkpoint_id, material_id, tool_id) DO UPDATE
+        SET quantity = b.quantity + EXCLUDED.quantity;
+"""
+
+NEW_ROWS = 'SELECT date_id, material_id, tool_id, quantity_change FROM new_rows'
+OLD_ROWS = 'SELECT date_id, material_id, tool_id, -quantity_change AS quantity_change FROM old_rows'
+
+CHECKPOINT_TRIGGERS_SQL = f"""
+CREATE OR REPLACE FUNCTION stockcheckpoint_apply_delta() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+{CHECKPOINT_UPSERT_SQL.format(source=NEW_ROWS)}
+    ELSIF TG_OP = 'UPDATE' THEN
+{CHECKPOINT_UPSERT_SQL.format(source=f'{NEW_ROWS} UNION ALL {OLD_ROWS}')}
+    ELSE
+{CHECKPOINT_UPSERT_SQL.format(source=OLD_ROWS)}
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER stockcheckpoint_on_insert
+    AFTER INSERT ON factinventorytransactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stockcheckpoint_apply_delta();
+
+CREATE TRIGGER stockcheckpoint_on_update
+    AFTER UPDATE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stockcheckpoint_apply_delta();
+
+CREATE TRIGGER stockcheckpoint_on_delete
+    AFTER DELETE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stockcheckpoint_apply_delta();
+"""
+
+DROP_CHECKPOINT_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS stockcheckpoint_on_insert ON factinventorytransactions;
+DROP TRIGGER IF EXISTS stockcheckpoint_on_update ON factinventorytransactions;
+DROP TRIGGER IF EXISTS stockcheckpoint_on_delete ON factinventorytransactions;
+DROP FUNCTION IF EXISTS stockcheckpoint_apply_delta();
+"""
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0004_inventorymonthlysummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('date_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Checkpoints',
+                'db_table': 'stockcheckpoint',
+            },
+        ),
+        migrations.CreateModel(
+            name='StockCheckpointBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='inventory.stockcheckpoint')),
+                ('material', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.dimmaterial')),
+                ('tool', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.dimtool')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Checkpoint Balances',
+                'db_table': 'stockcheckpointbalance',
+                'constraints': [models.UniqueConstraint(fields=('checkpoint', 'material', 'tool'), name='stockcheckpointbalance_key', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunSQL(CHECKPOINT_TRIGGERS_SQL, DROP_CHECKPOINT_TRIGGERS_SQL),
+        # Bounds the "transactions since the checkpoint" scan per material
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS fact_material_date_idx '
+            'ON factinventorytransactions (material_id, date_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS fact_material_date_idx;',
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-17 13:00
+
+from django.db import migrations
+
+# (name, table, definition). Composite keys end in the keyset pagination order
+# so an equality filter can be served and paged from the same index. The
+# trigram indexes are on UPPER(col::text), which is exactly the expression
+# Django generates for the icontains lookups behind DRF's SearchFilter.
+INDEXES = [
+    ('fact_tool_date_idx', 'factinventorytransactions', '(tool_id, date_id, transaction_id)'),
+    ('fact_type_date_idx', 'factinventorytransactions', '(transaction_type, date_id, transaction_id)'),
+    ('dimmaterial_discipline_name_idx', 'dimmaterial', '(discipline_id, material_name, material_id)'),
+    ('dimmaterial_type_name_idx', 'dimmaterial', '(material_type, material_name, material_id)'),
+    ('dimmaterial_brand_name_idx', 'dimmaterial', '(brand, material_name, material_id)'),
+    ('dimmaterial_name_trgm_idx', 'dimmaterial', 'USING gin (UPPER(material_name::text) gin_trgm_ops)'),
+    ('dimmaterial_type_trgm_idx', 'dimmaterial', 'USING gin (UPPER(material_type::text) gin_trgm_ops)'),
+    ('dimmaterial_brand_trgm_idx', 'dimmaterial', 'USING gin (UPPER(brand::text) gin_trgm_ops)'),
+    ('dimtool_discipline_idx', 'dimtool', '(discipline_id)'),
+    ('dimtool_type_idx', 'dimtool', '(tool_type)'),
+    ('dimtool_brand_idx', 'dimtool', '(brand)'),
+    ('dimtool_name_trgm_idx', 'dimtool', 'USING gin (UPPER(tool_name::text) gin_trgm_ops)'),
+    ('dimtool_type_trgm_idx', 'dimtool', 'USING gin (UPPER(tool_type::text) gin_trgm_ops)'),
+    ('dimtool_brand_trgm_idx', 'dimtool', 'USING gin (UPPER(brand::text) gin_trgm_ops)'),
+]
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0005_stockcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+            migrations.RunSQL.noop,
+        ),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition};',
+            f'DROP INDEX CONCURRENTLY IF EXISTS {name};',
+        )
+        for name, table, definition in INDEXES
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:00
+
+from django.db import migrations
+
+FACT_COLUMNS = 'transaction_id, date_id, material_id, tool_id, quantity_change, cost_per_unit, total_cost, transaction_type, notes'
+
+FACT_TABLE_SQL = """
+CREATE TABLE factinventorytransactions (
+    transaction_id INT NOT NULL DEFAULT nextval('factinventorytransactions_transaction_id_seq'),
+    date_id INT NOT NULL,
+    material_id INT,
+    tool_id INT,
+    quantity_change NUMERIC(10, 2) NOT NULL,
+    cost_per_unit NUMERIC(10, 2),
+    total_cost NUMERIC(10, 2),
+    transaction_type VARCHAR(50) NOT NULL,
+    notes TEXT,
+    CONSTRAINT {pkey} PRIMARY KEY ({primary_key}),
+    CONSTRAINT fk_date FOREIGN KEY (date_id) REFERENCES dimdate (date_id),
+    CONSTRAINT fk_material FOREIGN KEY (material_id) REFERENCES dimmaterial (material_id),
+    CONSTRAINT fk_tool FOREIGN KEY (tool_id) REFERENCES dimtool (tool_id),
+    CONSTRAINT chk_material_or_tool CHECK (
+        (material_id IS NOT NULL AND tool_id IS NULL) OR
+        (material_id IS NULL AND tool_id IS NOT NULL)
+    )
+){partitioning};
+"""
+
+FACT_INDEXES_SQL = """
+CREATE INDEX fact_date_transaction_idx ON factinventorytransactions (date_id, transaction_id);
+CREATE INDEX fact_material_date_idx ON factinventorytransactions (material_id, date_id);
+CREATE INDEX fact_tool_date_idx ON factinventorytransactions (tool_id, date_id, transaction_id);
+CREATE INDEX fact_type_date_idx ON factinventorytransactions (transaction_type, date_id, transaction_id);
+"""
+
+# The functions already exist; the triggers go away with the table they are on
+FACT_TRIGGERS_SQL = '\n'.join(
+    f"""
+CREATE TRIGGER {prefix}_on_insert
+    AFTER INSERT ON factinventorytransactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION {prefix}_apply_delta();
+CREATE TRIGGER {prefix}_on_update
+    AFTER UPDATE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION {prefix}_apply_delta();
+CREATE TRIGGER {prefix}_on_delete
+    AFTER DELETE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION {prefix}_apply_delta();
+"""
+    for prefix in ('materialstock', 'inventorymonthlysummary', 'stockcheckpoint')
+)
+
+# The primary key of a partitioned table must include the partition key, so it
+# becomes (transaction_id, date_id); transaction_id stays unique through its
+# sequence. Monthly partitions are created from the earliest transaction (or
+# two years back) to twelve months ahead, and a default partition catches
+# anything outside that range until manage_partitions gives it a partition.
+# The copy runs in the migration's transaction, with the old table locked.
+PARTITION_SQL = f"""
+LOCK TABLE factinventorytransactions IN ACCESS EXCLUSIVE MODE;
+ALTER TABLE factinventorytransactions RENAME TO factinventorytransactions_unpartitioned;
+ALTER INDEX factinventorytransactions_pkey RENAME TO factinventorytransactions_unpartitioned_pkey;
+DROP INDEX IF EXISTS fact_date_transaction_idx, fact_material_date_idx, fact_tool_date_idx, fact_type_date_idx;
+
+{FACT_TABLE_SQL.format(pkey='factinventorytransactions_pkey', primary_key='transaction_id, date_id', partitioning=' PARTITION BY RANGE (date_id)')}
+
+DO $$
+DECLARE
+    bound date;
+    last_month date := date_trunc('month', current_date) + interval '12 months';
+BEGIN
+    SELECT date_trunc('month', LEAST(
+        to_date(MIN(date_id)::text, 'YYYYMMDD'),
+        date_trunc('year', current_date) - interval '2 years'
+    )) INTO bound FROM factinventorytransactions_unpartitioned;
+    WHILE bound <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF factinventorytransactions FOR VALUES FROM (%s) TO (%s)',
+            'factinventorytransactions_' || to_char(bound, '"y"YYYY"m"MM'),
+            to_char(bound, 'YYYYMMDD'),
+            to_char(bound + interval '1 month', 'YYYYMMDD')
+        );
+        bound := bound + interval '1 month';
+    END LOOP;
+END;
+$$;
+CREATE TABLE factinventorytransactions_default PARTITION OF factinventorytransactions DEFAULT;
+
+INSERT INTO factinventorytransactions ({FACT_COLUMNS})
+SELECT {FACT_COLUMNS} FROM factinventorytransactions_unpartitioned;
+ALTER SEQUENCE factinventorytransactions_transaction_id_seq OWNED BY factinventorytransactions.transaction_id;
+DROP TABLE factinventorytransactions_unpartitioned;
+
+{FACT_INDEXES_SQL}
+{FACT_TRIGGERS_SQL}
+ANALYZE factinventorytransactions;
+"""
+
+UNPARTITION_SQL = f"""
+LOCK TABLE factinventorytransactions IN ACCESS EXCLUSIVE MODE;
+ALTER TABLE factinventorytransactions RENAME TO factinventorytransactions_partitioned;
+ALTER INDEX factinventorytransactions_pkey RENAME TO factinventorytransactions_partitioned_pkey;
+DROP INDEX fact_date_transaction_idx, fact_material_date_idx, fact_tool_date_idx, fact_type_date_idx;
+
+{FACT_TABLE_SQL.format(pkey='factinventorytransactions_pkey', primary_key='transaction_id', partitioning='')}
+
+INSERT INTO factinventorytransactions ({FACT_COLUMNS})
+SELECT {FACT_COLUMNS} FROM factinventorytransactions_partitioned;
+ALTER SEQUENCE factinventorytransactions_transaction_id_seq OWNED BY factinventorytransactions.transaction_id;
+DROP TABLE factinventorytransactions_partitioned;
+
+{FACT_INDEXES_SQL}
+{FACT_TRIGGERS_SQL}
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_filter_and_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_SQL, UNPARTITION_SQL),
+    ]
@@ -0,0 +1,166 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# A tool's state depends on the order of its movements (the latest one decides
+# whether it is out, and usage days span checkout-to-next-movement), so each
+# statement recomputes the state of the tools it touched from their history,
+# an index range scan on fact_tool_date_idx. A negative quantity_change is a
+# checkout, and its notes name the holder.
+#
+# toolstate_refresh takes a transaction-level advisory lock per tool before
+# reading, so two transactions moving the same tool refresh it one after the
+# other and the second one sees the first one's rows.
+TOOL_STATE_SQL = """
+CREATE OR REPLACE FUNCTION toolstate_compute(tool_ids int[])
+RETURNS TABLE (
+    tool_id int, is_checked_out boolean, holder text, checked_out_since date,
+    last_movement_date date, last_transaction_id int, usage_days int, transaction_count int
+)
+LANGUAGE sql STABLE AS $$
+    WITH moves AS (
+        SELECT f.tool_id, f.transaction_id, to_date(f.date_id::text, 'YYYYMMDD') AS moved_on,
+               f.quantity_change, f.notes,
+               to_date(LEAD(f.date_id) OVER (PARTITION BY f.tool_id ORDER BY f.date_id, f.transaction_id)::text,
+                       'YYYYMMDD') AS next_moved_on,
+               ROW_NUMBER() OVER (PARTITION BY f.tool_id ORDER BY f.date_id DESC, f.transaction_id DESC) AS recency
+        FROM factinventorytransactions AS f
+        WHERE f.tool_id = ANY(tool_ids)
+    )
+    SELECT m.tool_id,
+           bool_or(m.recency = 1 AND m.quantity_change < 0),
+           MAX(LEFT(m.notes, 100)) FILTER (WHERE m.recency = 1 AND m.quantity_change < 0),
+           MAX(m.moved_on) FILTER (WHERE m.recency = 1 AND m.quantity_change < 0),
+           MAX(m.moved_on) FILTER (WHERE m.recency = 1),
+           MAX(m.transaction_id) FILTER (WHERE m.recency = 1),
+           COALESCE(SUM(m.next_moved_on - m.moved_on) FILTER (WHERE m.quantity_change < 0), 0)::int,
+           COUNT(*)::int
+    FROM moves AS m
+    GROUP BY m.tool_id
+$$;
+
+CREATE OR REPLACE FUNCTION toolstate_refresh(tool_ids int[]) RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('toolstate'), id) FROM unnest(tool_ids) AS t(id) ORDER BY id;
+
+    INSERT INTO toolstate AS s (
+        tool_id, is_checked_out, holder, checked_out_since, last_movement_date,
+        last_transaction_id, usage_days, transaction_count, updated_at
+    )
+    SELECT c.tool_id, c.is_checked_out, c.holder, c.checked_out_since, c.last_movement_date,
+           c.last_transaction_id, c.usage_days, c.transaction_count, now()
+    FROM toolstate_compute(tool_ids) AS c
+    ORDER BY c.tool_id
+    ON CONFLICT (tool_id) DO UPDATE
+    SET is_checked_out = EXCLUDED.is_checked_out,
+        holder = EXCLUDED.holder,
+        checked_out_since = EXCLUDED.checked_out_since,
+        last_movement_date = EXCLUDED.last_movement_date,
+        last_transaction_id = EXCLUDED.last_transaction_id,
+        usage_days = EXCLUDED.usage_days,
+        transaction_count = EXCLUDED.transaction_count,
+        updated_at = EXCLUDED.updated_at;
+
+    -- Tools whose last movement was deleted
+    DELETE FROM toolstate AS s
+    WHERE s.tool_id = ANY(tool_ids)
+      AND NOT EXISTS (SELECT 1 FROM factinventorytransactions AS f WHERE f.tool_id = s.tool_id);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION toolstate_refresh_touched() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    tool_ids int[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids FROM new_rows WHERE tool_id IS NOT NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids
+        FROM (SELECT tool_id FROM new_rows UNION ALL SELECT tool_id FROM old_rows) AS touched
+        WHERE tool_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids FROM old_rows WHERE tool_id IS NOT NULL;
+    END IF;
+    IF tool_ids IS NOT NULL THEN
+        PERFORM toolstate_refresh(tool_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER toolstate_on_insert
+    AFTER INSERT ON factinventorytransactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION toolstate_refresh_touched();
+
+CREATE TRIGGER toolstate_on_update
+    AFTER UPDATE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION toolstate_refresh_touched();
+
+CREATE TRIGGER toolstate_on_delete
+    AFTER DELETE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION toolstate_refresh_touched();
+
+SELECT toolstate_refresh(array_agg(DISTINCT tool_id))
+FROM factinventorytransactions
+WHERE tool_id IS NOT NULL;
+"""
+
+DROP_TOOL_STATE_SQL = """
+DROP TRIGGER IF EXISTS toolstate_on_insert ON factinventorytransactions;
+DROP TRIGGER IF EXISTS toolstate_on_update ON factinventorytransactions;
+DROP TRIGGER IF EXISTS toolstate_on_delete ON factinventorytransactions;
+DROP FUNCTION IF EXISTS toolstate_refresh_touched();
+DROP FUNCTION IF EXISTS toolstate_refresh(int[]);
+DROP FUNCTION IF EXISTS toolstate_compute(int[]);
+"""
+
+# dimtool is a small dimension table, so these are built inside the migration
+# transaction. The maintenance query ORs the two, which PostgreSQL answers
+# with a BitmapOr of both indexes.
+DIMTOOL_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS dimtool_last_maintenance_idx ON dimtool (last_maintenance_date);
+CREATE INDEX IF NOT EXISTS dimtool_uncalibrated_idx ON dimtool (tool_id) WHERE NOT is_calibrated;
+"""
+
+DROP_DIMTOOL_INDEXES_SQL = """
+DROP INDEX IF EXISTS dimtool_last_maintenance_idx;
+DROP INDEX IF EXISTS dimtool_uncalibrated_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_partition_fact_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ToolState',
+            fields=[
+                ('tool', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='inventory.dimtool')),
+                ('is_checked_out', models.BooleanField(default=False)),
+                ('holder', models.CharField(blank=True, max_length=100, null=True)),
+                ('checked_out_since', models.DateField(blank=True, null=True)),
+                ('last_movement_date', models.DateField(blank=True, null=True)),
+                ('last_transaction_id', models.IntegerField(blank=True, null=True)),
+                ('usage_days', models.IntegerField(default=0)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Tool States',
+                'db_table': 'toolstate',
+                'indexes': [models.Index(condition=models.Q(('is_checked_out', True)), fields=['tool'], name='toolstate_checked_out_idx')],
+            },
+        ),
+        migrations.RunSQL(TOOL_STATE_SQL, DROP_TOOL_STATE_SQL),
+        migrations.RunSQL(DIMTOOL_INDEXES_SQL, DROP_DIMTOOL_INDEXES_SQL),
+    ]
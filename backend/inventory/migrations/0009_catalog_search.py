@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:00
+
+from django.db import migrations
+
+
+# Search columns for the material and tool catalogs (see inventory/search.py).
+# search_vector is a stored generated column, so PostgreSQL keeps it current on
+# every insert and update without a trigger. The 'simple' configuration skips
+# stemming, which keeps prefix matches on brand names and sizes predictable.
+# The typo-tolerant match (<%, word similarity) for queries like 'plywod' uses
+# the UPPER(name) trigram indexes from 0006.
+SEARCH_SQL = """
+ALTER TABLE dimmaterial ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(material_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(material_type, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(brand, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce(size, '') || ' ' || coalesce(color, '')), 'D')
+) STORED;
+CREATE INDEX dimmaterial_search_idx ON dimmaterial USING gin (search_vector);
+
+ALTER TABLE dimtool ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(tool_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(tool_type, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(brand, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce(model, '')), 'D')
+) STORED;
+CREATE INDEX dimtool_search_idx ON dimtool USING gin (search_vector);
+
+ANALYZE dimmaterial;
+ANALYZE dimtool;
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS dimmaterial_search_idx;
+ALTER TABLE dimmaterial DROP COLUMN IF EXISTS search_vector;
+DROP INDEX IF EXISTS dimtool_search_idx;
+ALTER TABLE dimtool DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_toolstate'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SEARCH_SQL, DROP_SEARCH_SQL),
+    ]
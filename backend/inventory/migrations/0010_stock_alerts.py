@@ -0,0 +1,108 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Row triggers on the (small, one row per material) materialstock ledger flag
+# every material whose stock the fact table triggers just changed, and every
+# material whose reorder policy was created or edited. The alert evaluator
+# then only reads the flagged rows, through materialstock_alert_pend_idx.
+ALERT_PENDING_SQL = """
+CREATE OR REPLACE FUNCTION materialstock_flag_alert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.alert_pending := true;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER materialstock_alert_on_insert
+    BEFORE INSERT ON materialstock
+    FOR EACH ROW EXECUTE FUNCTION materialstock_flag_alert();
+
+CREATE TRIGGER materialstock_alert_on_update
+    BEFORE UPDATE OF current_stock ON materialstock
+    FOR EACH ROW WHEN (OLD.current_stock IS DISTINCT FROM NEW.current_stock)
+    EXECUTE FUNCTION materialstock_flag_alert();
+
+CREATE OR REPLACE FUNCTION materialreorderpolicy_flag_alert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- A material without transactions has no ledger row yet; its stock is 0
+    INSERT INTO materialstock (material_id, current_stock, transaction_count, updated_at, alert_pending)
+    VALUES (NEW.material_id, 0, 0, now(), true)
+    ON CONFLICT (material_id) DO UPDATE SET alert_pending = true;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER materialreorderpolicy_on_change
+    AFTER INSERT OR UPDATE OF reorder_point ON materialreorderpolicy
+    FOR EACH ROW EXECUTE FUNCTION materialreorderpolicy_flag_alert();
+"""
+
+DROP_ALERT_PENDING_SQL = """
+DROP TRIGGER IF EXISTS materialreorderpolicy_on_change ON materialreorderpolicy;
+DROP FUNCTION IF EXISTS materialreorderpolicy_flag_alert();
+DROP TRIGGER IF EXISTS materialstock_alert_on_insert ON materialstock;
+DROP TRIGGER IF EXISTS materialstock_alert_on_update ON materialstock;
+DROP FUNCTION IF EXISTS materialstock_flag_alert();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_catalog_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materialstock',
+            name='alert_pending',
+            field=models.BooleanField(db_default=False),
+        ),
+        migrations.AddIndex(
+            model_name='materialstock',
+            index=models.Index(condition=models.Q(('alert_pending', True)), fields=['material'], name='materialstock_alert_pend_idx'),
+        ),
+        migrations.CreateModel(
+            name='MaterialReorderPolicy',
+            fields=[
+                ('material', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reorder_policy', serialize=False, to='inventory.dimmaterial')),
+                ('reorder_point', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('reorder_quantity', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('lead_time_days', models.IntegerField(default=0)),
+                ('is_below', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Material Reorder Policies',
+                'db_table': 'materialreorderpolicy',
+            },
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('alert_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('alert_type', models.CharField(choices=[('low_stock', 'Low stock'), ('recovered', 'Recovered')], max_length=20)),
+                ('current_stock', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('reorder_point', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('reorder_quantity', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('lead_time_days', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('acknowledged_at', models.DateTimeField(blank=True, null=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='inventory.dimmaterial')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Alerts',
+                'db_table': 'stockalert',
+                'indexes': [
+                    models.Index(fields=['material', 'alert_id'], name='stockalert_material_idx'),
+                    models.Index(condition=models.Q(('acknowledged_at__isnull', True)), fields=['alert_id'], name='stockalert_open_idx'),
+                ],
+            },
+        ),
+        migrations.RunSQL(ALERT_PENDING_SQL, DROP_ALERT_PENDING_SQL),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialForecast',
+            fields=[
+                ('material', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='inventory.dimmaterial')),
+                ('as_of_date', models.DateField()),
+                ('current_stock', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('recent_daily_usage', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('seasonal_factor', models.DecimalField(decimal_places=4, max_digits=8)),
+                ('projected_daily_usage', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('days_until_stockout', models.IntegerField(blank=True, null=True)),
+                ('stockout_date', models.DateField(blank=True, null=True)),
+                ('reorder_by_date', models.DateField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Material Forecasts',
+                'db_table': 'materialforecast',
+                'indexes': [models.Index(fields=['stockout_date', 'material'], name='materialforecast_stockout_idx')],
+            },
+        ),
+    ]
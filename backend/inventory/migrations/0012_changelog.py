@@ -0,0 +1,94 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:00
+
+from django.db import migrations, models
+
+
+# (table, primary key column). materialstock is included so clients receive
+# stock changes without re-reading the materials themselves.
+SYNCED_TABLES = [
+    ('dimdiscipline', 'discipline_id'),
+    ('dimmaterial', 'material_id'),
+    ('dimtool', 'tool_id'),
+    ('factinventorytransactions', 'transaction_id'),
+    ('materialstock', 'material_id'),
+]
+
+# One statement-level function serves every table: the primary key column is
+# the trigger argument, and the transition tables are read with EXECUTE.
+CHANGELOG_FUNCTION_SQL = """
+ALTER TABLE changelog ALTER COLUMN xid SET DEFAULT pg_current_xact_id()::text::bigint;
+ALTER TABLE changelog ALTER COLUMN changed_at SET DEFAULT now();
+
+CREATE OR REPLACE FUNCTION changelog_record() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format('INSERT INTO changelog (table_name, row_id, operation) SELECT %L, %I, ''I'' FROM new_rows',
+                       TG_TABLE_NAME, TG_ARGV[0]);
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- A changed primary key is a delete of the old row and an insert of the new one
+        EXECUTE format('INSERT INTO changelog (table_name, row_id, operation) '
+                       'SELECT %1$L, o.%2$I, ''D'' FROM old_rows AS o '
+                       'WHERE NOT EXISTS (SELECT 1 FROM new_rows AS n WHERE n.%2$I = o.%2$I) '
+                       'UNION ALL SELECT %1$L, %2$I, ''U'' FROM new_rows',
+                       TG_TABLE_NAME, TG_ARGV[0]);
+    ELSE
+        EXECUTE format('INSERT INTO changelog (table_name, row_id, operation) SELECT %L, %I, ''D'' FROM old_rows',
+                       TG_TABLE_NAME, TG_ARGV[0]);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+TRIGGERS_SQL = ''.join(f"""
+CREATE TRIGGER changelog_on_insert
+    AFTER INSERT ON {table}
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION changelog_record('{pk}');
+
+CREATE TRIGGER changelog_on_update
+    AFTER UPDATE ON {table}
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION changelog_record('{pk}');
+
+CREATE TRIGGER changelog_on_delete
+    AFTER DELETE ON {table}
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION changelog_record('{pk}');
+""" for table, pk in SYNCED_TABLES)
+
+DROP_TRIGGERS_SQL = ''.join(f"""
+DROP TRIGGER IF EXISTS changelog_on_insert ON {table};
+DROP TRIGGER IF EXISTS changelog_on_update ON {table};
+DROP TRIGGER IF EXISTS changelog_on_delete ON {table};
+""" for table, _ in SYNCED_TABLES) + """
+DROP FUNCTION IF EXISTS changelog_record();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_materialforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('change_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('xid', models.BigIntegerField()),
+                ('table_name', models.CharField(max_length=50)),
+                ('row_id', models.BigIntegerField()),
+                ('operation', models.CharField(max_length=1)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Change Log',
+                'db_table': 'changelog',
+                'indexes': [models.Index(fields=['xid', 'change_id'], name='changelog_version_idx')],
+            },
+        ),
+        migrations.RunSQL(CHANGELOG_FUNCTION_SQL + TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
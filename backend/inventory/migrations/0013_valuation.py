@@ -0,0 +1,125 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Statement-level triggers flag the materials a fact table statement touched,
+# so the valuation engine only reads those. Inserted rows dated after the last
+# movement a material was valued at are applied on top of its saved state and
+# cost layers; anything else (an update, a delete or a back-dated insert)
+# requires replaying the material's history.
+VALUATION_PENDING_SQL = """
+CREATE OR REPLACE FUNCTION materialvaluation_flag_touched() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    material_ids int[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO materialvaluation AS v (material_id, valuation_pending, updated_at)
+        SELECT material_id, true, now()
+        FROM new_rows
+        WHERE material_id IS NOT NULL
+        GROUP BY material_id
+        ORDER BY material_id
+        ON CONFLICT (material_id) DO UPDATE SET valuation_pending = true;
+
+        UPDATE materialvaluation AS v
+        SET replay_required = true
+        FROM new_rows AS n
+        WHERE n.material_id = v.material_id
+          AND NOT v.replay_required
+          AND (n.date_id, n.transaction_id) <= (v.last_date_id, v.last_transaction_id);
+    ELSE
+        IF TG_OP = 'UPDATE' THEN
+            SELECT array_agg(DISTINCT material_id) INTO material_ids
+            FROM (SELECT material_id FROM new_rows UNION ALL SELECT material_id FROM old_rows) AS touched
+            WHERE material_id IS NOT NULL;
+        ELSE
+            SELECT array_agg(DISTINCT material_id) INTO material_ids FROM old_rows WHERE material_id IS NOT NULL;
+        END IF;
+        INSERT INTO materialvaluation AS v (material_id, valuation_pending, replay_required, updated_at)
+        SELECT id, true, true, now()
+        FROM unnest(material_ids) AS t(id)
+        ORDER BY id
+        ON CONFLICT (material_id) DO UPDATE SET valuation_pending = true, replay_required = true;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER materialvaluation_on_insert
+    AFTER INSERT ON factinventorytransactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION materialvaluation_flag_touched();
+
+CREATE TRIGGER materialvaluation_on_update
+    AFTER UPDATE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION materialvaluation_flag_touched();
+
+CREATE TRIGGER materialvaluation_on_delete
+    AFTER DELETE ON factinventorytransactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION materialvaluation_flag_touched();
+
+-- Existing history is valued by `manage.py rebuild_valuations`
+INSERT INTO materialvaluation (material_id, valuation_pending, replay_required, updated_at)
+SELECT DISTINCT material_id, true, true, now()
+FROM factinventorytransactions
+WHERE material_id IS NOT NULL;
+"""
+
+DROP_VALUATION_PENDING_SQL = """
+DROP TRIGGER IF EXISTS materialvaluation_on_insert ON factinventorytransactions;
+DROP TRIGGER IF EXISTS materialvaluation_on_update ON factinventorytransactions;
+DROP TRIGGER IF EXISTS materialvaluation_on_delete ON factinventorytransactions;
+DROP FUNCTION IF EXISTS materialvaluation_flag_touched();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialValuation',
+            fields=[
+                ('material', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valuation', serialize=False, to='inventory.dimmaterial')),
+                ('quantity_on_hand', models.DecimalField(db_default=0, decimal_places=2, max_digits=14)),
+                ('average_unit_cost', models.DecimalField(db_default=0, decimal_places=4, max_digits=14)),
+                ('average_value', models.DecimalField(db_default=0, decimal_places=2, max_digits=16)),
+                ('fifo_value', models.DecimalField(db_default=0, decimal_places=2, max_digits=16)),
+                ('last_date_id', models.IntegerField(blank=True, null=True)),
+                ('last_transaction_id', models.IntegerField(blank=True, null=True)),
+                ('valuation_pending', models.BooleanField(db_default=False)),
+                ('replay_required', models.BooleanField(db_default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Material Valuations',
+                'db_table': 'materialvaluation',
+                'indexes': [models.Index(condition=models.Q(('valuation_pending', True)), fields=['material'], name='materialvaluation_pending_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MaterialCostLayer',
+            fields=[
+                ('layer_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('date_id', models.IntegerField()),
+                ('transaction_id', models.IntegerField()),
+                ('quantity_remaining', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.dimmaterial')),
+            ],
+            options={
+                'verbose_name_plural': 'Material Cost Layers',
+                'db_table': 'materialcostlayer',
+                'indexes': [models.Index(fields=['material', 'date_id', 'transaction_id'], name='materialcostlayer_fifo_idx')],
+            },
+        ),
+        migrations.RunSQL(VALUATION_PENDING_SQL, DROP_VALUATION_PENDING_SQL),
+    ]
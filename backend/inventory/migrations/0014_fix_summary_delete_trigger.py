@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:00
+
+from django.db import migrations
+
+
+# Migration 0004 selected the negated old_rows columns without aliases, so the
+# DELETE branch failed with "column quantity_change does not exist". Databases
+# that already ran it get the corrected function; the triggers keep calling it.
+SUMMARY_UPSERT_SQL = """
+        INSERT INTO inventorymonthlysummary AS s (
+            year, quarter_number, month_number, material_id, tool_id, transaction_type,
+            quantity_change, total_cost, transaction_count
+        )
+        SELECT date_id / 10000, (date_id / 100 % 100 - 1) / 3 + 1, date_id / 100 % 100,
+               material_id, tool_id, transaction_type,
+               SUM(quantity_change), SUM(COALESCE(total_cost, 0)), SUM(row_count)
+        FROM ({source}) AS delta
+        GROUP BY 1, 2, 3, 4, 5, 6
+        HAVING SUM(quantity_change) <> 0 OR SUM(COALESCE(total_cost, 0)) <> 0 OR SUM(row_count) <> 0
+        ORDER BY 1, 3, 4, 5, 6
+        ON CONFLICT (year, month_number, material_id, tool_id, transaction_type) DO UPDATE
+        SET quantity_change = s.quantity_change + EXCLUDED.quantity_change,
+            total_cost = s.total_cost + EXCLUDED.total_cost,
+            transaction_count = s.transaction_count + EXCLUDED.transaction_count;
+"""
+
+NEW_ROWS = 'SELECT date_id, material_id, tool_id, transaction_type, quantity_change, total_cost, 1 AS row_count FROM new_rows'
+OLD_ROWS = (
+    'SELECT date_id, material_id, tool_id, transaction_type, '
+    '-quantity_change AS quantity_change, -total_cost AS total_cost, -1 AS row_count FROM old_rows'
+)
+
+SUMMARY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION inventorymonthlysummary_apply_delta() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+{SUMMARY_UPSERT_SQL.format(source=NEW_ROWS)}
+    ELSIF TG_OP = 'UPDATE' THEN
+{SUMMARY_UPSERT_SQL.format(source=f'{NEW_ROWS} UNION ALL {OLD_ROWS}')}
+    ELSE
+{SUMMARY_UPSERT_SQL.format(source=OLD_ROWS)}
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_valuation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SUMMARY_FUNCTION_SQL, migrations.RunSQL.noop),
+    ]
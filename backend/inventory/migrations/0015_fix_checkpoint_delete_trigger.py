@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:00
+
+from django.db import migrations
+
+
+# Migration 0005 selected the negated old_rows quantity without an alias, so
+# the DELETE branch failed on SUM(delta.quantity_change). Databases that
+# already ran it get the corrected function; the triggers keep calling it.
+CHECKPOINT_UPSERT_SQL = """
+        INSERT INTO stockcheckpointbalance AS b (checkpoint_id, material_id, tool_id, quantity)
+        SELECT c.date_id, delta.material_id, delta.tool_id, SUM(delta.quantity_change)
+        FROM ({source}) AS delta
+        JOIN stockcheckpoint AS c ON c.date_id >= delta.date_id
+        GROUP BY 1, 2, 3
+        HAVING SUM(delta.quantity_change) <> 0
+        ORDER BY 1, 2, 3
+        ON CONFLICT (checkpoint_id, material_id, tool_id) DO UPDATE
+        SET quantity = b.quantity + EXCLUDED.quantity;
+"""
+
+NEW_ROWS = 'SELECT date_id, material_id, tool_id, quantity_change FROM new_rows'
+OLD_ROWS = 'SELECT date_id, material_id, tool_id, -quantity_change AS quantity_change FROM old_rows'
+
+CHECKPOINT_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION stockcheckpoint_apply_delta() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+{CHECKPOINT_UPSERT_SQL.format(source=NEW_ROWS)}
+    ELSIF TG_OP = 'UPDATE' THEN
+{CHECKPOINT_UPSERT_SQL.format(source=f'{NEW_ROWS} UNION ALL {OLD_ROWS}')}
+    ELSE
+{CHECKPOINT_UPSERT_SQL.format(source=OLD_ROWS)}
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_fix_summary_delete_trigger'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CHECKPOINT_FUNCTION_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+# Arguments after the primary key column name the columns clients are sent; an
+# update that changes none of them writes no 'U' row. materialstock only sends
+# current_stock, so the alert evaluator clearing alert_pending no longer logs
+# a change for every flagged material.
+CHANGELOG_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION changelog_record() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed text := 'true';
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format('INSERT INTO changelog (table_name, row_id, operation) SELECT %L, %I, ''I'' FROM new_rows',
+                       TG_TABLE_NAME, TG_ARGV[0]);
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF TG_NARGS > 1 THEN
+            SELECT string_agg(format('o.%1$I IS DISTINCT FROM n.%1$I', col), ' OR ') INTO changed
+            FROM unnest(TG_ARGV[1:TG_NARGS - 1]) AS col;
+        END IF;
+        -- A changed primary key is a delete of the old row and an insert of the new one
+        EXECUTE format('INSERT INTO changelog (table_name, row_id, operation) '
+                       'SELECT %1$L, o.%2$I, ''D'' FROM old_rows AS o '
+                       'WHERE NOT EXISTS (SELECT 1 FROM new_rows AS n WHERE n.%2$I = o.%2$I) '
+                       'UNION ALL SELECT %1$L, n.%2$I, ''U'' FROM new_rows AS n '
+                       'WHERE NOT EXISTS (SELECT 1 FROM old_rows AS o WHERE o.%2$I = n.%2$I AND NOT (%3$s))',
+                       TG_TABLE_NAME, TG_ARGV[0], changed);
+    ELSE
+        EXECUTE format('INSERT INTO changelog (table_name, row_id, operation) SELECT %L, %I, ''D'' FROM old_rows',
+                       TG_TABLE_NAME, TG_ARGV[0]);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+STOCK_TRIGGER_SQL = """
+DROP TRIGGER changelog_on_update ON materialstock;
+CREATE TRIGGER changelog_on_update
+    AFTER UPDATE ON materialstock
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION changelog_record({args});
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_fix_checkpoint_delete_trigger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogPrune',
+            fields=[
+                ('prune_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('xid', models.BigIntegerField()),
+                ('change_id', models.BigIntegerField()),
+                ('deleted', models.BigIntegerField()),
+                ('pruned_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Change Log Prunes',
+                'db_table': 'changelogprune',
+            },
+        ),
+        migrations.RunSQL(CHANGELOG_FUNCTION_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(
+            STOCK_TRIGGER_SQL.format(args="'material_id', 'current_stock'"),
+            STOCK_TRIGGER_SQL.format(args="'material_id'"),
+        ),
+    ]
@@ -0,0 +1,199 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Archived partitions leave each tool's last archived movement in
+# archivedtoolstate. toolstate_compute() reads it as the first movement of the
+# tool's history, weighted by the archived transaction count and carrying the
+# archived usage days, so a checkout that was open when its partition was
+# archived still counts until the tool's next movement.
+TOOL_STATE_SQL = """
+CREATE OR REPLACE FUNCTION toolstate_compute(tool_ids int[])
+RETURNS TABLE (
+    tool_id int, is_checked_out boolean, holder text, checked_out_since date,
+    last_movement_date date, last_transaction_id int, usage_days int, transaction_count int
+)
+LANGUAGE sql STABLE AS $$
+    WITH history AS (
+        SELECT f.tool_id, f.date_id, f.transaction_id, f.quantity_change, f.notes,
+               0 AS archived_usage_days, 1 AS weight
+        FROM factinventorytransactions AS f
+        WHERE f.tool_id = ANY(tool_ids)
+        UNION ALL
+        SELECT a.tool_id, a.last_date_id, a.last_transaction_id, a.last_quantity_change, a.last_notes,
+               a.usage_days, a.transaction_count
+        FROM archivedtoolstate AS a
+        WHERE a.tool_id = ANY(tool_ids)
+    ),
+    moves AS (
+        SELECT h.tool_id, h.transaction_id, to_date(h.date_id::text, 'YYYYMMDD') AS moved_on,
+               h.quantity_change, h.notes, h.archived_usage_days, h.weight,
+               to_date(LEAD(h.date_id) OVER (PARTITION BY h.tool_id ORDER BY h.date_id, h.transaction_id)::text,
+                       'YYYYMMDD') AS next_moved_on,
+               ROW_NUMBER() OVER (PARTITION BY h.tool_id ORDER BY h.date_id DESC, h.transaction_id DESC) AS recency
+        FROM history AS h
+    )
+    SELECT m.tool_id,
+           bool_or(m.recency = 1 AND m.quantity_change < 0),
+           MAX(LEFT(m.notes, 100)) FILTER (WHERE m.recency = 1 AND m.quantity_change < 0),
+           MAX(m.moved_on) FILTER (WHERE m.recency = 1 AND m.quantity_change < 0),
+           MAX(m.moved_on) FILTER (WHERE m.recency = 1),
+           MAX(m.transaction_id) FILTER (WHERE m.recency = 1),
+           (COALESCE(SUM(m.next_moved_on - m.moved_on) FILTER (WHERE m.quantity_change < 0), 0)
+            + SUM(m.archived_usage_days))::int,
+           SUM(m.weight)::int
+    FROM moves AS m
+    GROUP BY m.tool_id
+$$;
+
+CREATE OR REPLACE FUNCTION toolstate_refresh(tool_ids int[]) RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('toolstate'), id) FROM unnest(tool_ids) AS t(id) ORDER BY id;
+
+    INSERT INTO toolstate AS s (
+        tool_id, is_checked_out, holder, checked_out_since, last_movement_date,
+        last_transaction_id, usage_days, transaction_count, updated_at
+    )
+    SELECT c.tool_id, c.is_checked_out, c.holder, c.checked_out_since, c.last_movement_date,
+           c.last_transaction_id, c.usage_days, c.transaction_count, now()
+    FROM toolstate_compute(tool_ids) AS c
+    ORDER BY c.tool_id
+    ON CONFLICT (tool_id) DO UPDATE
+    SET is_checked_out = EXCLUDED.is_checked_out,
+        holder = EXCLUDED.holder,
+        checked_out_since = EXCLUDED.checked_out_since,
+        last_movement_date = EXCLUDED.last_movement_date,
+        last_transaction_id = EXCLUDED.last_transaction_id,
+        usage_days = EXCLUDED.usage_days,
+        transaction_count = EXCLUDED.transaction_count,
+        updated_at = EXCLUDED.updated_at;
+
+    -- Tools whose last movement was deleted
+    DELETE FROM toolstate AS s
+    WHERE s.tool_id = ANY(tool_ids)
+      AND NOT EXISTS (SELECT 1 FROM factinventorytransactions AS f WHERE f.tool_id = s.tool_id)
+      AND NOT EXISTS (SELECT 1 FROM archivedtoolstate AS a WHERE a.tool_id = s.tool_id);
+END;
+$$;
+"""
+
+# The functions as migration 0008 created them, restored before
+# archivedtoolstate is dropped
+PREVIOUS_TOOL_STATE_SQL = """
+CREATE OR REPLACE FUNCTION toolstate_compute(tool_ids int[])
+RETURNS TABLE (
+    tool_id int, is_checked_out boolean, holder text, checked_out_since date,
+    last_movement_date date, last_transaction_id int, usage_days int, transaction_count int
+)
+LANGUAGE sql STABLE AS $$
+    WITH moves AS (
+        SELECT f.tool_id, f.transaction_id, to_date(f.date_id::text, 'YYYYMMDD') AS moved_on,
+               f.quantity_change, f.notes,
+               to_date(LEAD(f.date_id) OVER (PARTITION BY f.tool_id ORDER BY f.date_id, f.transaction_id)::text,
+                       'YYYYMMDD') AS next_moved_on,
+               ROW_NUMBER() OVER (PARTITION BY f.tool_id ORDER BY f.date_id DESC, f.transaction_id DESC) AS recency
+        FROM factinventorytransactions AS f
+        WHERE f.tool_id = ANY(tool_ids)
+    )
+    SELECT m.tool_id,
+           bool_or(m.recency = 1 AND m.quantity_change < 0),
+           MAX(LEFT(m.notes, 100)) FILTER (WHERE m.recency = 1 AND m.quantity_change < 0),
+           MAX(m.moved_on) FILTER (WHERE m.recency = 1 AND m.quantity_change < 0),
+           MAX(m.moved_on) FILTER (WHERE m.recency = 1),
+           MAX(m.transaction_id) FILTER (WHERE m.recency = 1),
+           COALESCE(SUM(m.next_moved_on - m.moved_on) FILTER (WHERE m.quantity_change < 0), 0)::int,
+           COUNT(*)::int
+    FROM moves AS m
+    GROUP BY m.tool_id
+$$;
+
+CREATE OR REPLACE FUNCTION toolstate_refresh(tool_ids int[]) RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('toolstate'), id) FROM unnest(tool_ids) AS t(id) ORDER BY id;
+
+    INSERT INTO toolstate AS s (
+        tool_id, is_checked_out, holder, checked_out_since, last_movement_date,
+        last_transaction_id, usage_days, transaction_count, updated_at
+    )
+    SELECT c.tool_id, c.is_checked_out, c.holder, c.checked_out_since, c.last_movement_date,
+           c.last_transaction_id, c.usage_days, c.transaction_count, now()
+    FROM toolstate_compute(tool_ids) AS c
+    ORDER BY c.tool_id
+    ON CONFLICT (tool_id) DO UPDATE
+    SET is_checked_out = EXCLUDED.is_checked_out,
+        holder = EXCLUDED.holder,
+        checked_out_since = EXCLUDED.checked_out_since,
+        last_movement_date = EXCLUDED.last_movement_date,
+        last_transaction_id = EXCLUDED.last_transaction_id,
+        usage_days = EXCLUDED.usage_days,
+        transaction_count = EXCLUDED.transaction_count,
+        updated_at = EXCLUDED.updated_at;
+
+    -- Tools whose last movement was deleted
+    DELETE FROM toolstate AS s
+    WHERE s.tool_id = ANY(tool_ids)
+      AND NOT EXISTS (SELECT 1 FROM factinventorytransactions AS f WHERE f.tool_id = s.tool_id);
+END;
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_changelog_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMaterialTotals',
+            fields=[
+                ('material', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='inventory.dimmaterial')),
+                ('quantity', models.DecimalField(db_default=0, decimal_places=2, max_digits=14)),
+                ('transaction_count', models.IntegerField(db_default=0)),
+                ('average_unit_cost', models.DecimalField(db_default=0, decimal_places=4, max_digits=14)),
+                ('last_date_id', models.IntegerField(blank=True, null=True)),
+                ('last_transaction_id', models.IntegerField(blank=True, null=True)),
+                ('cost_layers', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Material Totals',
+                'db_table': 'archivedmaterialtotals',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedToolState',
+            fields=[
+                ('tool', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='inventory.dimtool')),
+                ('last_date_id', models.IntegerField()),
+                ('last_transaction_id', models.IntegerField()),
+                ('last_quantity_change', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('last_notes', models.TextField(blank=True, null=True)),
+                ('usage_days', models.IntegerField(default=0)),
+                ('transaction_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Tool States',
+                'db_table': 'archivedtoolstate',
+            },
+        ),
+        migrations.CreateModel(
+            name='PartitionArchive',
+            fields=[
+                ('archive_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('before_date_id', models.IntegerField()),
+                ('partitions', models.JSONField(default=list)),
+                ('dropped', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Partition Archives',
+                'db_table': 'partitionarchive',
+            },
+        ),
+        migrations.RunSQL(TOOL_STATE_SQL, PREVIOUS_TOOL_STATE_SQL),
+    ]
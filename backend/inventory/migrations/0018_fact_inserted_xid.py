@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:00
+
+from django.db import migrations
+
+
+# The id of the transaction that inserted each fact row, like changelog.xid
+# (see migration 0012). Transaction ids come from a sequence, so a lower one
+# can commit after a higher one has been read; incremental columnar exports
+# select rows by inserting transaction instead, below the snapshot's xmin.
+# Existing rows keep NULL: they were committed before the column existed.
+# The column is not on the (unmanaged) model, so inserts always get the default.
+INSERTED_XID_SQL = """
+ALTER TABLE factinventorytransactions ADD COLUMN inserted_xid bigint;
+ALTER TABLE factinventorytransactions ALTER COLUMN inserted_xid SET DEFAULT pg_current_xact_id()::text::bigint;
+CREATE INDEX fact_inserted_xid_idx ON factinventorytransactions (inserted_xid);
+"""
+
+DROP_INSERTED_XID_SQL = """
+DROP INDEX IF EXISTS fact_inserted_xid_idx;
+ALTER TABLE factinventorytransactions DROP COLUMN IF EXISTS inserted_xid;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_archived_history'),
+    ]
+
+    operations = [
+        migrations.RunSQL(INSERTED_XID_SQL, DROP_INSERTED_XID_SQL),
+    ]
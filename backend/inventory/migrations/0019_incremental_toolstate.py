@@ -0,0 +1,142 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:00
+
+from django.db import migrations
+
+
+# Inserted movements that all follow a tool's saved state (the usual case: a
+# checkout or return dated today) are applied on top of its toolstate row, the
+# way toolstate_compute() continues from archivedtoolstate (see migration
+# 0017): the row stands for the tool's last movement, weighted by its
+# transaction count and carrying its usage days, followed by the new
+# movements. Only new_rows is read. Back-dated inserts, updates and deletes,
+# and tools without a state row, still recompute from the history.
+TOOL_STATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION toolstate_refresh_touched() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    tool_ids int[];
+    appended int[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids FROM new_rows WHERE tool_id IS NOT NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids
+        FROM (SELECT tool_id FROM new_rows UNION ALL SELECT tool_id FROM old_rows) AS touched
+        WHERE tool_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids FROM old_rows WHERE tool_id IS NOT NULL;
+    END IF;
+    IF tool_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        -- The same locks as toolstate_refresh, taken before the state is read
+        PERFORM pg_advisory_xact_lock(hashtext('toolstate'), id) FROM unnest(tool_ids) AS t(id) ORDER BY id;
+
+        WITH saved AS (
+            SELECT s.tool_id, to_char(s.last_movement_date, 'YYYYMMDD')::int AS date_id,
+                   s.last_transaction_id AS transaction_id,
+                   CASE WHEN s.is_checked_out THEN -1 ELSE 1 END AS quantity_change,
+                   s.holder AS notes, s.usage_days, s.transaction_count AS weight
+            FROM toolstate AS s
+            WHERE s.tool_id = ANY(tool_ids)
+              AND NOT EXISTS (
+                  SELECT 1 FROM new_rows AS n
+                  WHERE n.tool_id = s.tool_id
+                    AND (n.date_id, n.transaction_id)
+                        <= (to_char(s.last_movement_date, 'YYYYMMDD')::int, s.last_transaction_id)
+              )
+        ),
+        history AS (
+            SELECT tool_id, date_id, transaction_id, quantity_change, notes, usage_days, weight
+            FROM saved
+            UNION ALL
+            SELECT n.tool_id, n.date_id, n.transaction_id, n.quantity_change, n.notes, 0, 1
+            FROM new_rows AS n
+            JOIN saved USING (tool_id)
+        ),
+        moves AS (
+            SELECT h.tool_id, h.transaction_id, to_date(h.date_id::text, 'YYYYMMDD') AS moved_on,
+                   h.quantity_change, h.notes, h.usage_days, h.weight,
+                   to_date(LEAD(h.date_id) OVER (PARTITION BY h.tool_id ORDER BY h.date_id, h.transaction_id)::text,
+                           'YYYYMMDD') AS next_moved_on,
+                   ROW_NUMBER() OVER (PARTITION BY h.tool_id ORDER BY h.date_id DESC, h.transaction_id DESC) AS recency
+            FROM history AS h
+        ),
+        folded AS (
+            SELECT m.tool_id,
+                   bool_or(m.recency = 1 AND m.quantity_change < 0) AS is_checked_out,
+                   MAX(LEFT(m.notes, 100)) FILTER (WHERE m.recency = 1 AND m.quantity_change < 0) AS holder,
+                   MAX(m.moved_on) FILTER (WHERE m.recency = 1 AND m.quantity_change < 0) AS checked_out_since,
+                   MAX(m.moved_on) FILTER (WHERE m.recency = 1) AS last_movement_date,
+                   MAX(m.transaction_id) FILTER (WHERE m.recency = 1) AS last_transaction_id,
+                   (COALESCE(SUM(m.next_moved_on - m.moved_on) FILTER (WHERE m.quantity_change < 0), 0)
+                    + SUM(m.usage_days))::int AS usage_days,
+                   SUM(m.weight)::int AS transaction_count
+            FROM moves AS m
+            GROUP BY m.tool_id
+        ),
+        updated AS (
+            UPDATE toolstate AS s
+            SET is_checked_out = f.is_checked_out,
+                holder = f.holder,
+                checked_out_since = f.checked_out_since,
+                last_movement_date = f.last_movement_date,
+                last_transaction_id = f.last_transaction_id,
+                usage_days = f.usage_days,
+                transaction_count = f.transaction_count,
+                updated_at = now()
+            FROM folded AS f
+            WHERE s.tool_id = f.tool_id
+            RETURNING s.tool_id
+        )
+        SELECT array_agg(tool_id) INTO appended FROM updated;
+
+        SELECT array_agg(id) INTO tool_ids
+        FROM unnest(tool_ids) AS t(id)
+        WHERE appended IS NULL OR id <> ALL(appended);
+    END IF;
+
+    IF tool_ids IS NOT NULL THEN
+        PERFORM toolstate_refresh(tool_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+# As migration 0008 created it
+PREVIOUS_TOOL_STATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION toolstate_refresh_touched() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    tool_ids int[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids FROM new_rows WHERE tool_id IS NOT NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids
+        FROM (SELECT tool_id FROM new_rows UNION ALL SELECT tool_id FROM old_rows) AS touched
+        WHERE tool_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT tool_id) INTO tool_ids FROM old_rows WHERE tool_id IS NOT NULL;
+    END IF;
+    IF tool_ids IS NOT NULL THEN
+        PERFORM toolstate_refresh(tool_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_fact_inserted_xid'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TOOL_STATE_TRIGGER_SQL, PREVIOUS_TOOL_STATE_TRIGGER_SQL),
+    ]
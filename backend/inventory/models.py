@@ -1,3 +1,5 @@
+import datetime
+
 from django.db import models
 
 # Create your models here.
@@ -101,4 +103,342 @@ class FactInventoryTransactions(models.Model):
 
     def __str__(self):
         return f"Transaction {self.transaction_id} on {self.date.full_date}"
-    
\ No newline at end of file
+    
+# MaterialStock Model
+# Running stock balance per material, maintained by statement-level triggers on
+# factinventorytransactions (see migration 0002) so reads never re-sum the fact table.
+class MaterialStock(models.Model):
+    material = models.OneToOneField(DimMaterial, on_delete=models.CASCADE, primary_key=True, related_name='stock')
+    current_stock = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set by a trigger whenever current_stock changes, cleared by the alert evaluator
+    alert_pending = models.BooleanField(db_default=False)
+
+    class Meta:
+        db_table = 'materialstock'
+        verbose_name_plural = 'Material Stock'
+        indexes = [
+            models.Index(fields=['material'], name='materialstock_alert_pend_idx', condition=models.Q(alert_pending=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.material_id}: {self.current_stock}"
+
+# InventoryMonthlySummary Model
+# Monthly rollup of the fact table per material/tool and transaction type,
+# maintained by triggers (see migration 0004) for the analytics API.
+class InventoryMonthlySummary(models.Model):
+    year = models.IntegerField()
+    quarter_number = models.IntegerField()
+    month_number = models.IntegerField()
+    material = models.ForeignKey(DimMaterial, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    tool = models.ForeignKey(DimTool, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    transaction_type = models.CharField(max_length=50)
+    quantity_change = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_cost = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'inventorymonthlysummary'
+        verbose_name_plural = 'Inventory Monthly Summaries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['year', 'month_number', 'material', 'tool', 'transaction_type'],
+                name='inventorymonthlysummary_key',
+                nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.year}-{self.month_number:02d} {self.transaction_type}"
+
+# StockCheckpoint Model
+# A snapshot of every material and tool balance as of the end of date_id
+# (typically a month end). "Stock as of" queries start from the nearest
+# checkpoint and only sum the transactions after it.
+class StockCheckpoint(models.Model):
+    date_id = models.IntegerField(primary_key=True) # YYYYMMDD, same key as DimDate
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'stockcheckpoint'
+        verbose_name_plural = 'Stock Checkpoints'
+
+    def __str__(self):
+        return str(self.date_id)
+
+# StockCheckpointBalance Model
+class StockCheckpointBalance(models.Model):
+    checkpoint = models.ForeignKey(StockCheckpoint, on_delete=models.CASCADE, related_name='balances')
+    material = models.ForeignKey(DimMaterial, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    tool = models.ForeignKey(DimTool, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'stockcheckpointbalance'
+        verbose_name_plural = 'Stock Checkpoint Balances'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['checkpoint', 'material', 'tool'],
+                name='stockcheckpointbalance_key',
+                nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.checkpoint_id}: {self.quantity}"
+
+# ToolState Model
+# Current checkout state of every tool that has movements, kept up to date
+# for the tools each statement touches by triggers on factinventorytransactions
+# (see migrations 0008 and 0019). A negative quantity_change checks a tool out.
+class ToolState(models.Model):
+    tool = models.OneToOneField(DimTool, on_delete=models.CASCADE, primary_key=True, related_name='state')
+    is_checked_out = models.BooleanField(default=False)
+    holder = models.CharField(max_length=100, null=True, blank=True) # notes of the open checkout
+    checked_out_since = models.DateField(null=True, blank=True)
+    last_movement_date = models.DateField(null=True, blank=True)
+    last_transaction_id = models.IntegerField(null=True, blank=True)
+    usage_days = models.IntegerField(default=0) # days out over completed checkouts
+    transaction_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'toolstate'
+        verbose_name_plural = 'Tool States'
+        indexes = [
+            models.Index(fields=['tool'], name='toolstate_checked_out_idx', condition=models.Q(is_checked_out=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.tool_id}: {'out' if self.is_checked_out else 'in'}"
+
+    def total_usage_days(self, today=None):
+        """Usage days including the open checkout, if any."""
+        if not (self.is_checked_out and self.checked_out_since):
+            return self.usage_days
+        return self.usage_days + ((today or datetime.date.today()) - self.checked_out_since).days
+
+# MaterialReorderPolicy Model
+# Reorder point and lead time of a material. is_below is the state the alert
+# evaluator last saw, so an alert is raised once per crossing.
+class MaterialReorderPolicy(models.Model):
+    material = models.OneToOneField(DimMaterial, on_delete=models.CASCADE, primary_key=True, related_name='reorder_policy')
+    reorder_point = models.DecimalField(max_digits=14, decimal_places=2)
+    reorder_quantity = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    lead_time_days = models.IntegerField(default=0)
+    is_below = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'materialreorderpolicy'
+        verbose_name_plural = 'Material Reorder Policies'
+
+    def __str__(self):
+        return f"{self.material_id}: {self.reorder_point}"
+
+# StockAlert Model
+# Raised by inventory.alerts.evaluate_stock_alerts when a material's stock
+# falls to or below its reorder point, and again when it recovers.
+class StockAlert(models.Model):
+    LOW_STOCK = 'low_stock'
+    RECOVERED = 'recovered'
+    ALERT_TYPES = [(LOW_STOCK, 'Low stock'), (RECOVERED, 'Recovered')]
+
+    alert_id = models.BigAutoField(primary_key=True)
+    material = models.ForeignKey(DimMaterial, on_delete=models.CASCADE, related_name='stock_alerts')
+    alert_type = models.CharField(max_length=20, choices=ALERT_TYPES)
+    current_stock = models.DecimalField(max_digits=14, decimal_places=2)
+    reorder_point = models.DecimalField(max_digits=14, decimal_places=2)
+    reorder_quantity = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    lead_time_days = models.IntegerField(default=0)
+    created_at = models.DateTimeField()
+    acknowledged_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'stockalert'
+        verbose_name_plural = 'Stock Alerts'
+        indexes = [
+            models.Index(fields=['material', 'alert_id'], name='stockalert_material_idx'),
+            models.Index(fields=['alert_id'], name='stockalert_open_idx', condition=models.Q(acknowledged_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.material_id}: {self.alert_type}"
+
+# MaterialForecast Model
+# Projected stock-out date of each material, replaced in full by the
+# forecast_consumption command (see inventory/forecast.py).
+class MaterialForecast(models.Model):
+    material = models.OneToOneField(DimMaterial, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    as_of_date = models.DateField()
+    current_stock = models.DecimalField(max_digits=14, decimal_places=2)
+    recent_daily_usage = models.DecimalField(max_digits=14, decimal_places=4) # mean over the rate window
+    seasonal_factor = models.DecimalField(max_digits=8, decimal_places=4) # of the month after as_of_date
+    projected_daily_usage = models.DecimalField(max_digits=14, decimal_places=4)
+    days_until_stockout = models.IntegerField(null=True, blank=True) # null: not within the horizon
+    stockout_date = models.DateField(null=True, blank=True)
+    reorder_by_date = models.DateField(null=True, blank=True) # stockout_date minus the reorder lead time
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'materialforecast'
+        verbose_name_plural = 'Material Forecasts'
+        indexes = [
+            models.Index(fields=['stockout_date', 'material'], name='materialforecast_stockout_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.material_id}: {self.stockout_date}"
+
+# ChangeLog Model
+# One row per inserted, updated or deleted row of the synced tables, written
+# by triggers (see migration 0012) and read by /api/sync/. xid is the writing
+# transaction's id, which orders changes safely across concurrent commits.
+class ChangeLog(models.Model):
+    INSERT, UPDATE, DELETE = 'I', 'U', 'D'
+
+    change_id = models.BigAutoField(primary_key=True)
+    xid = models.BigIntegerField() # pg_current_xact_id() of the writing transaction
+    table_name = models.CharField(max_length=50)
+    row_id = models.BigIntegerField()
+    operation = models.CharField(max_length=1)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'changelog'
+        verbose_name_plural = 'Change Log'
+        indexes = [
+            models.Index(fields=['xid', 'change_id'], name='changelog_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.table_name} {self.row_id}: {self.operation}"
+
+# ChangeLogPrune Model
+# One row per run of `manage.py prune_changelog`: the changes up to and
+# including version (xid, change_id) were deleted, so /api/sync/ answers
+# 410 Gone for older versions.
+class ChangeLogPrune(models.Model):
+    prune_id = models.BigAutoField(primary_key=True)
+    xid = models.BigIntegerField()
+    change_id = models.BigIntegerField()
+    deleted = models.BigIntegerField()
+    pruned_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'changelogprune'
+        verbose_name_plural = 'Change Log Prunes'
+
+    def __str__(self):
+        return f"{self.xid}.{self.change_id}"
+
+# PartitionArchive Model
+# One row per archive_partitions() run: the partitions for months before
+# before_date_id were detached, their totals having been carried forward into
+# ArchivedMaterialTotals and ArchivedToolState so rebuilds still count them.
+class PartitionArchive(models.Model):
+    archive_id = models.BigAutoField(primary_key=True)
+    before_date_id = models.IntegerField() # YYYYMM01, first day not archived
+    partitions = models.JSONField(default=list)
+    dropped = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'partitionarchive'
+        verbose_name_plural = 'Partition Archives'
+
+    def __str__(self):
+        return f"before {self.before_date_id}"
+
+# ArchivedMaterialTotals Model
+# Each material's stock and valuation state after its archived transactions.
+# The stock rebuild adds the attached transactions to quantity and
+# transaction_count; a valuation replay starts from the rest.
+class ArchivedMaterialTotals(models.Model):
+    material = models.OneToOneField(DimMaterial, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, db_default=0)
+    transaction_count = models.IntegerField(db_default=0)
+    average_unit_cost = models.DecimalField(max_digits=14, decimal_places=4, db_default=0)
+    last_date_id = models.IntegerField(null=True, blank=True)
+    last_transaction_id = models.IntegerField(null=True, blank=True)
+    # Open FIFO layers as [date_id, transaction_id, "quantity_remaining", "unit_cost"]
+    cost_layers = models.JSONField(default=list)
+
+    class Meta:
+        db_table = 'archivedmaterialtotals'
+        verbose_name_plural = 'Archived Material Totals'
+
+    def __str__(self):
+        return f"{self.material_id}: {self.quantity}"
+
+# ArchivedToolState Model
+# Each tool's last archived movement, plus the usage days and transaction
+# count of its archived movements, which toolstate_compute() continues from.
+class ArchivedToolState(models.Model):
+    tool = models.OneToOneField(DimTool, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    last_date_id = models.IntegerField()
+    last_transaction_id = models.IntegerField()
+    last_quantity_change = models.DecimalField(max_digits=10, decimal_places=2)
+    last_notes = models.TextField(null=True, blank=True)
+    usage_days = models.IntegerField(default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'archivedtoolstate'
+        verbose_name_plural = 'Archived Tool States'
+
+    def __str__(self):
+        return f"{self.tool_id}: {self.transaction_count}"
+
+# MaterialValuation Model
+# Value of each material's stock on hand under the weighted-average and FIFO
+# cost methods, maintained by inventory.valuation from the fact table. A
+# trigger (see migration 0013) sets valuation_pending when transactions of the
+# material are inserted, and replay_required as well when they were changed,
+# deleted or dated before last_date_id/last_transaction_id, the last movement
+# valued.
+class MaterialValuation(models.Model):
+    material = models.OneToOneField(DimMaterial, on_delete=models.CASCADE, primary_key=True, related_name='valuation')
+    quantity_on_hand = models.DecimalField(max_digits=14, decimal_places=2, db_default=0)
+    average_unit_cost = models.DecimalField(max_digits=14, decimal_places=4, db_default=0) # moving average
+    average_value = models.DecimalField(max_digits=16, decimal_places=2, db_default=0)
+    fifo_value = models.DecimalField(max_digits=16, decimal_places=2, db_default=0)
+    last_date_id = models.IntegerField(null=True, blank=True)
+    last_transaction_id = models.IntegerField(null=True, blank=True)
+    valuation_pending = models.BooleanField(db_default=False)
+    replay_required = models.BooleanField(db_default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'materialvaluation'
+        verbose_name_plural = 'Material Valuations'
+        indexes = [
+            models.Index(fields=['material'], name='materialvaluation_pending_idx', condition=models.Q(valuation_pending=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.material_id}: {self.average_value} / {self.fifo_value}"
+
+# MaterialCostLayer Model
+# The open FIFO cost layers of a material: what is left of each receipt, in
+# receipt order. A negative layer holds stock issued beyond what was on hand,
+# which the next receipts settle first.
+class MaterialCostLayer(models.Model):
+    layer_id = models.BigAutoField(primary_key=True)
+    material = models.ForeignKey(DimMaterial, on_delete=models.CASCADE, related_name='cost_layers')
+    date_id = models.IntegerField() # of the receipt
+    transaction_id = models.IntegerField()
+    quantity_remaining = models.DecimalField(max_digits=14, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4)
+
+    class Meta:
+        db_table = 'materialcostlayer'
+        verbose_name_plural = 'Material Cost Layers'
+        indexes = [
+            models.Index(fields=['material', 'date_id', 'transaction_id'], name='materialcostlayer_fifo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.material_id}: {self.quantity_remaining} @ {self.unit_cost}"
@@ -0,0 +1,234 @@
+# pagination.py
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite key such as (date_id, transaction_id).
+
+    The cursor holds the key values of the last row served, and the next page
+    is fetched with a "(k1, k2) > (v1, v2)" range condition. Every page is an
+    index range scan of page_size rows, however deep into the result set it is.
+    DRF's CursorPagination only keys on the first ordering field and falls back
+    to an offset among ties, which degrades on a low-cardinality date column.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Maps an `ordering` query parameter field to the unique key it pages on.
+    # The last field of every key must be unique.
+    keysets = {}
+    default_keyset = None
+    # Key names annotated with an expression rather than read from a column.
+    # Nullable fields are paged on a non-null expression, since a row-value
+    # comparison against NULL matches no row.
+    key_expressions = {}
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_keyset(self, request):
+        """
+        Returns (key_fields, descending). Only orderings listed in `keysets`
+        can be paged by key; any other requested ordering is rejected.
+        """
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, '')
+        fields = [field.strip() for field in ordering.split(',') if field.strip()]
+        if not fields:
+            return self.keysets[self.default_keyset], False
+        name = fields[0].lstrip('-')
+        if len(fields) > 1 or name not in self.keysets:
+            raise ValidationError({api_settings.ORDERING_PARAM: (
+                f"Pages can be ordered by one of {', '.join(sorted(self.keysets))}, optionally prefixed with '-'."
+            )})
+        return self.keysets[name], fields[0].startswith('-')
+
+    def decode_cursor(self, request, queryset):
+        """
+        Returns the cursor's (position, reverse), each key value converted to
+        its field's type, or (None, False) without a cursor.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = cursor['p'], bool(cursor['r'])
+        except (binascii.Error, ValueError, KeyError, TypeError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.keys):
+            raise NotFound(self.invalid_cursor_message)
+        # A value the key's column cannot hold would fail in the query instead
+        try:
+            position = [self.key_field(queryset, key).to_python(value) for key, value in zip(self.keys, position)]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def key_field(self, queryset, key):
+        """The model field, or the annotation's output field, a key is read from."""
+        if key in queryset.query.annotations:
+            return queryset.query.annotations[key].output_field
+        return queryset.model._meta.get_field(key)
+
+    def encode_cursor(self, row, reverse):
+        position = [getattr(row, key) for key in self.keys]
+        payload = json.dumps({'p': position, 'r': int(reverse)}, cls=DjangoJSONEncoder)
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def keyset_filter(self, position, descending):
+        """Builds the row-value comparison (k1, ..., kn) > (v1, ..., vn), or < when descending."""
+        op = 'lt' if descending else 'gt'
+        condition = Q()
+        for index, key in enumerate(self.keys):
+            equal = {k: v for k, v in zip(self.keys[:index], position[:index])}
+            condition |= Q(**equal, **{f'{key}__{op}': position[index]})
+        # Redundant bound on the leading key so the planner starts an index range scan there
+        leading = {f"{self.keys[0]}__{op}e": position[0]}
+        return Q(**leading) & condition
+
+    def page_queryset(self, queryset, request):
+        """Returns the queryset slice for the requested page, fetching one extra row to detect more."""
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys, descending = self.get_keyset(request)
+        annotations = {key: self.key_expressions[key] for key in self.keys if key in self.key_expressions}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        self.position, self.reverse = self.decode_cursor(request, queryset)
+
+        # Walking back to a previous page scans the key order in reverse
+        scan_descending = descending != self.reverse
+        queryset = queryset.order_by(*[('-' if scan_descending else '') + key for key in self.keys])
+        if self.position is not None:
+            queryset = queryset.filter(self.keyset_filter(self.position, scan_descending))
+        return queryset[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    def set_page(self, rows):
+        """Trims the fetched rows to the page and works out the previous/next links."""
+        position, reverse = self.position, self.reverse
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+# Pagination for FactInventoryTransactions
+class TransactionKeysetPagination(KeysetPagination):
+    keysets = {
+        'date__full_date': ('date_id', 'transaction_id'),
+        'transaction_id': ('transaction_id',),
+    }
+    default_keyset = 'date__full_date'
+
+
+# Pagination for DimMaterial; materials without a type, brand or discipline
+# sort first under those orderings
+class MaterialKeysetPagination(KeysetPagination):
+    keysets = {
+        'material_name': ('material_name', 'material_id'),
+        'material_type': ('material_type_key', 'material_id'),
+        'brand': ('brand_key', 'material_id'),
+        'discipline__discipline_name': ('discipline_name_key', 'material_id'),
+    }
+    key_expressions = {
+        'material_type_key': Coalesce('material_type', Value('')),
+        'brand_key': Coalesce('brand', Value('')),
+        'discipline_name_key': Coalesce('discipline__discipline_name', Value('')),
+    }
+    default_keyset = 'material_name'
+
+
+# Pagination for DimDate
+class DateKeysetPagination(KeysetPagination):
+    page_size = 366
+    keysets = {
+        'date_id': ('date_id',),
+    }
+    default_keyset = 'date_id'
+
+
+# Pagination for StockAlert, newest first by default
+class AlertKeysetPagination(KeysetPagination):
+    keysets = {
+        'alert_id': ('alert_id',),
+    }
+    default_keyset = 'alert_id'
+
+    def get_keyset(self, request):
+        keys, descending = super().get_keyset(request)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            descending = True
+        return keys, descending
+
+
+# Pagination for MaterialForecast; the stockout_date key only pages over
+# forecasts with a stock-out date (see ForecastViewSet)
+class ForecastKeysetPagination(KeysetPagination):
+    keysets = {
+        'stockout_date': ('stockout_date', 'material_id'),
+        'material_id': ('material_id',),
+    }
+    default_keyset = 'stockout_date'
@@ -0,0 +1,151 @@
+# partitions.py
+#
+# Monthly range partitions of factinventorytransactions on date_id (see
+# migration 0007). Partition names follow factinventorytransactions_yYYYYmMM
+# and each covers [YYYYMM01, first day of the next month).
+
+import datetime
+import re
+
+from django.db import connection, transaction
+
+from .models import PartitionArchive, StockCheckpoint
+from .stock import carry_forward_stock, date_id_for
+from .toolstate import carry_forward_tool_state
+from .valuation import carry_forward
+
+PARENT_TABLE = 'factinventorytransactions'
+DEFAULT_PARTITION = 'factinventorytransactions_default'
+BOUND_PATTERN = re.compile(r"FROM \('?(\d+)'?\) TO \('?(\d+)'?\)")
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_y{month.year}m{month.month:02d}'
+
+
+def partition_bounds(month):
+    """Returns the (inclusive, exclusive) date_id range of month's partition."""
+    return date_id_for(month), date_id_for(add_months(month, 1))
+
+
+def list_partitions():
+    """Returns (name, lower date_id, upper date_id) for every range partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits AS i
+            JOIN pg_class AS c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+        """, [PARENT_TABLE])
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = BOUND_PATTERN.search(bound)
+        if match:
+            partitions.append((name, int(match.group(1)), int(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def default_partition_rows():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {DEFAULT_PARTITION}')
+        return cursor.fetchone()[0]
+
+
+def create_partition(month):
+    """
+    Creates the partition for month, moving any of its rows out of the default
+    partition. The new table is filled and constrained before it is attached,
+    so attaching does not rescan it. Rows moved between partitions are never
+    deleted from or inserted into the parent table, so the ledger triggers do
+    not fire. Returns the number of rows moved, or None if it already exists.
+    """
+    name = partition_name(month)
+    lower, upper = partition_bounds(month)
+    if any(existing == name for existing, _, _ in list_partitions()):
+        return None
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {PARENT_TABLE} IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute(f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE date_id >= %s AND date_id < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """, [lower, upper])
+        moved = cursor.rowcount
+        cursor.execute(
+            f'ALTER TABLE {name} ADD CONSTRAINT {name}_bounds '
+            f'CHECK (date_id >= {lower:d} AND date_id < {upper:d})'
+        )
+        cursor.execute(f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({lower:d}) TO ({upper:d})')
+        cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT {name}_bounds')
+    return moved
+
+
+def ensure_partitions(months_ahead=12, today=None):
+    """Creates any missing partitions from the current month through months_ahead; returns their names."""
+    current = (today or datetime.date.today()).replace(day=1)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if create_partition(month) is not None:
+            created.append(partition_name(month))
+    return created
+
+
+def split_default_partition():
+    """Creates a partition for every month that has rows in the default partition; returns their names."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT DISTINCT date_id / 100 FROM {DEFAULT_PARTITION}')
+        months = sorted(datetime.date(year_month // 100, year_month % 100, 1) for year_month, in cursor.fetchall())
+    for month in months:
+        create_partition(month)
+    return [partition_name(month) for month in months]
+
+
+def archive_partitions(before, schema='archive', drop=False):
+    """
+    Detaches every partition that ends on or before `before` (a month start)
+    and moves it into `schema`, or drops it. Each material's stock totals and
+    valuation state, and each tool's state, after the archived transactions
+    are carried forward first, so the rebuilds and replays continue from them;
+    the analytics rollups keep the archived months' rows. Point-in-time stock
+    reads need a checkpoint after the archived range, so one is required.
+    Returns the partition names.
+    """
+    cutoff = date_id_for(before)
+    candidates = [name for name, _, upper in list_partitions() if upper <= cutoff]
+    if not candidates:
+        return []
+    last_day = date_id_for(before - datetime.timedelta(days=1))
+    if not StockCheckpoint.objects.filter(date_id__gte=last_day).exists():
+        raise ValueError(f'Create a stock checkpoint on or after {last_day} before archiving this range.')
+
+    source = ' UNION ALL '.join(f'SELECT * FROM {name}' for name in candidates)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {PARENT_TABLE} IN SHARE ROW EXCLUSIVE MODE')
+        # Carried-forward state must cover all history before the cutoff
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE date_id < %s)', [cutoff])
+        if cursor.fetchone()[0]:
+            raise ValueError(f'{DEFAULT_PARTITION} has transactions before {cutoff}; run with --split-default first.')
+        # Valuation reads the stock carried forward so far, so it goes first
+        carry_forward(cursor, source)
+        carry_forward_stock(cursor, source)
+        carry_forward_tool_state(cursor, source)
+        PartitionArchive.objects.create(before_date_id=cutoff, partitions=candidates, dropped=drop)
+
+        if not drop:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {connection.ops.quote_name(schema)}')
+        for name in candidates:
+            cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+            if drop:
+                cursor.execute(f'DROP TABLE {name}')
+            else:
+                cursor.execute(f'ALTER TABLE {name} SET SCHEMA {connection.ops.quote_name(schema)}')
+    return candidates
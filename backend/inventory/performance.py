@@ -0,0 +1,179 @@
+# performance.py
+#
+# Per-request performance instrumentation: SQL query count and time,
+# serialization time and render time, reported as a Server-Timing header and
+# as one JSON log line per request on the 'inventory.performance' logger.
+#
+# Queries are timed by an execute wrapper installed once on every database
+# connection as it is opened. It looks up the current request's metrics in a
+# context variable, which also follows the request into sync_to_async worker
+# threads, and returns straight away when instrumentation is off.
+
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger('inventory.performance')
+sql_logger = logging.getLogger('inventory.performance.sql')
+
+_current = ContextVar('inventory_request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self, track_queries):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.timings = Counter()
+        # SQL text -> executions, only kept when the slow-query log is on
+        self.statements = Counter() if track_queries else None
+        self.slow_queries = []
+
+    def server_timing(self, total_seconds):
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.timings.items()]
+        parts.append(f'total;dur={total_seconds * 1000:.1f}')
+        return ', '.join(parts)
+
+    def duplicates(self):
+        if not self.statements:
+            return []
+        return [(sql, count) for sql, count in self.statements.most_common() if count > 1]
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_seconds += elapsed
+        if metrics.statements is not None:
+            metrics.statements[sql] += 1
+            if elapsed * 1000 >= settings.PERFORMANCE_SLOW_QUERY_MS:
+                metrics.slow_queries.append((sql, round(elapsed * 1000, 1)))
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timed(name):
+    """Adds the time spent in the block to the current request's `name` timing."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - started
+
+
+def _start():
+    if not settings.PERFORMANCE_INSTRUMENTATION:
+        return None, None
+    metrics = RequestMetrics(track_queries=settings.PERFORMANCE_SLOW_QUERY_MS is not None)
+    return metrics, _current.set(metrics)
+
+
+def _finish(request, response, metrics):
+    total = time.perf_counter() - metrics.started
+    response['Server-Timing'] = metrics.server_timing(total)
+    logger.info(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'total_ms': round(total * 1000, 1),
+        'db_ms': round(metrics.db_seconds * 1000, 1),
+        'queries': metrics.queries,
+        **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds in metrics.timings.items()},
+    }))
+    if metrics.statements is not None:
+        duplicates = metrics.duplicates()
+        if metrics.slow_queries or duplicates:
+            sql_logger.warning(json.dumps({
+                'path': request.path,
+                'slow': [{'sql': sql, 'ms': ms} for sql, ms in metrics.slow_queries],
+                'duplicates': [{'sql': sql, 'count': count} for sql, count in duplicates],
+            }))
+    return response
+
+
+@sync_and_async_middleware
+def performance_middleware(get_response):
+    """Collects the metrics of each request when settings.PERFORMANCE_INSTRUMENTATION is on."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics, token = _start()
+            if metrics is None:
+                return await get_response(request)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, metrics)
+    else:
+        def middleware(request):
+            metrics, token = _start()
+            if metrics is None:
+                return get_response(request)
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, metrics)
+    return middleware
+
+
+class TimedSerializer:
+    """Forwards to a serializer, timing the .data access that serializes it."""
+
+    def __init__(self, serializer):
+        self.__dict__['_serializer'] = serializer
+
+    def __getattr__(self, name):
+        return getattr(self._serializer, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._serializer, name, value)
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return self._serializer.data
+
+
+class InstrumentedViewMixin:
+    """Records serialization and render time for a DRF view in the request's metrics."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if _current.get() is None:
+            return serializer
+        return TimedSerializer(serializer)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if _current.get() is not None and not response.streaming and not getattr(response, 'is_rendered', True):
+            # Rendered here rather than by the handler so the time can be measured
+            with timed('render'):
+                response.render()
+        return response
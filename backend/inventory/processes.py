@@ -0,0 +1,37 @@
+# processes.py
+#
+# Process pools for the batch jobs (forecasting, valuation rebuilds) that
+# split their work over several CPUs. Each worker process sets Django up and
+# opens its own database connection, closed again after every job.
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.db import connections
+
+
+def _setup_worker():
+    # A no-op in forked workers; spawned ones start without Django loaded
+    import django
+    django.setup()
+
+
+def _run_in_worker(func, args):
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+def map_in_processes(func, jobs, workers=None):
+    """
+    Returns [func(*args) for args in jobs], computed by up to workers processes
+    (default: one per CPU). With workers=0 every job runs in this process and
+    on its connection.
+    """
+    if workers == 0:
+        return [func(*args) for args in jobs]
+    # Forked workers must not inherit this process's open connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+        return list(pool.map(partial(_run_in_worker, func), jobs))
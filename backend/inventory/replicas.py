@@ -0,0 +1,217 @@
+# replicas.py
+#
+# Read-replica routing. replica_middleware picks a replica for each GET/HEAD
+# request under /api/ and ReplicaRouter sends that request's inventory reads
+# to it; writes, every other request and the auth tables stay on the primary.
+# Replicas come from DATABASE_REPLICA_HOSTS (see settings.DATABASE_REPLICAS).
+#
+# Consistency:
+# - A replica whose replay lag is above DATABASE_REPLICA_MAX_LAG_SECONDS is
+#   skipped, and so is one that cannot be reached; with none left, requests
+#   read from the primary. Lag is checked at most every LAG_CHECK_SECONDS per
+#   process.
+# - A client that makes a write request (POST, PUT, PATCH, DELETE) reads from
+#   the primary while it runs and for stale_window() seconds after it returns
+#   (and has committed), long enough for any replica still in use to have
+#   replayed that write, so it sees its own writes however long the write
+#   took. Clients are told apart by their token, session or address.
+# - Alerts and sync read from the primary: the alert stream should not lag the
+#   evaluation that raised an alert, and sync versions depend on the
+#   primary's transaction snapshot.
+
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+
+LAG_CHECK_SECONDS = 1.0
+ROUTED_PREFIX = '/api/'
+PRIMARY_ONLY_PREFIXES = ('/api/alerts/', '/api/sync/', '/api/token/')
+SAFE_METHODS = ('GET', 'HEAD')
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Replay lag in seconds; infinite when the replica has not replayed anything yet
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8, 'Infinity'::float8)
+    END
+"""
+
+_read_alias = ContextVar('inventory_read_alias', default=None)
+# alias -> (checked at, lag in seconds or None when unreachable)
+_lag_checks = {}
+_lock = threading.Lock()
+
+
+def read_alias():
+    """The replica the current request reads from, or None for the primary."""
+    return _read_alias.get()
+
+
+@contextmanager
+def reading_from(alias):
+    """Sends inventory reads in the block to alias (None: the primary)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def stale_window():
+    """Seconds a replica in use may be behind a write to the primary."""
+    return settings.DATABASE_REPLICA_MAX_LAG_SECONDS + LAG_CHECK_SECONDS
+
+
+def replica_lag(alias):
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        connections[alias].close()
+        return None
+
+
+def checked_lag(alias):
+    now = time.monotonic()
+    with _lock:
+        checked = _lag_checks.get(alias)
+    if checked is not None and now - checked[0] < LAG_CHECK_SECONDS:
+        return checked[1]
+    lag = replica_lag(alias)
+    with _lock:
+        _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def reset_lag_checks():
+    with _lock:
+        _lag_checks.clear()
+
+
+def choose_replica():
+    """A random replica within the lag limit, or None when there is none."""
+    healthy = []
+    for alias in settings.DATABASE_REPLICAS:
+        lag = checked_lag(alias)
+        if lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+            healthy.append(alias)
+    return random.choice(healthy) if healthy else None
+
+
+def _client_key(request):
+    client = (request.headers.get('Authorization') or request.GET.get('token')
+              or request.COOKIES.get(settings.SESSION_COOKIE_NAME) or request.META.get('REMOTE_ADDR', ''))
+    return f"replica-pin:{hashlib.sha1(client.encode('utf-8')).hexdigest()}"
+
+
+def _pins():
+    return caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS]
+
+
+def pin_to_primary(request):
+    _pins().set(_client_key(request), True, timeout=stale_window())
+
+
+def route_for(request):
+    """The replica to serve request's reads from, or None for the primary."""
+    if (not settings.DATABASE_REPLICAS or request.method not in SAFE_METHODS
+            or not request.path.startswith(ROUTED_PREFIX) or request.path.startswith(PRIMARY_ONLY_PREFIXES)):
+        return None
+    if _pins().get(_client_key(request)):
+        return None
+    return choose_replica()
+
+
+def _read_streaming_from(alias, response):
+    # Streamed content is read after the middleware returns, so each chunk is
+    # produced under the request's routing again
+    if not response.streaming:
+        return response
+    if response.is_async:
+        content = aiter(response.streaming_content)
+
+        async def routed():
+            while True:
+                with reading_from(alias):
+                    chunk = await anext(content, None)
+                if chunk is None:
+                    return
+                yield chunk
+    else:
+        content = iter(response.streaming_content)
+
+        def routed():
+            while True:
+                with reading_from(alias):
+                    chunk = next(content, None)
+                if chunk is None:
+                    return
+                yield chunk
+
+    response.streaming_content = routed()
+    return response
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    """Routes the reads of safe API requests to a replica and pins writing clients to the primary."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if settings.DATABASE_REPLICAS and request.method in UNSAFE_METHODS:
+                await sync_to_async(pin_to_primary)(request)
+                response = await get_response(request)
+                # Pinned again, so the window starts after the write committed
+                await sync_to_async(pin_to_primary)(request)
+                return response
+            alias = await sync_to_async(route_for)(request)
+            if alias is None:
+                return await get_response(request)
+            with reading_from(alias):
+                response = await get_response(request)
+            return _read_streaming_from(alias, response)
+    else:
+        def middleware(request):
+            if settings.DATABASE_REPLICAS and request.method in UNSAFE_METHODS:
+                pin_to_primary(request)
+                response = get_response(request)
+                # Pinned again, so the window starts after the write committed
+                pin_to_primary(request)
+                return response
+            alias = route_for(request)
+            if alias is None:
+                return get_response(request)
+            with reading_from(alias):
+                response = get_response(request)
+            return _read_streaming_from(alias, response)
+    return middleware
+
+
+class ReplicaRouter:
+    """Reads inventory models from the request's replica; everything else uses the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'inventory':
+            return None
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas receive the schema through replication
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,59 @@
+# search.py
+#
+# Ranked catalog search over the search_vector columns of dimmaterial and
+# dimtool (see migration 0009). Every word of the query is matched as a
+# prefix ('ply 4x' finds 'Plywood 4x8'), which is what type-ahead needs, and
+# a name that is only a close spelling of the query ('plywod') still matches
+# through trigram word similarity. Both conditions are answered by GIN
+# indexes, so the cost depends on the number of matches, not catalog size.
+#
+# Results are ordered by text rank plus name similarity, so exact and prefix
+# name hits come before matches on type or brand and before fuzzy ones.
+
+import re
+
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_WORD = re.compile(r'\w+')
+
+# Table, name column for the trigram match
+TARGETS = {
+    'material': ('dimmaterial', 'material_name'),
+    'tool': ('dimtool', 'tool_name'),
+}
+
+
+def prefix_tsquery(text):
+    """'ply 4x8' -> 'ply:* & 4x8:*', or None if text has no words."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def search(queryset, target, text, limit=DEFAULT_LIMIT):
+    """
+    Filters queryset (of the target's model) to the rows matching text and
+    orders them by relevance, annotating each with search_rank.
+    """
+    tsquery = prefix_tsquery(text)
+    if tsquery is None:
+        return queryset.none()
+    table, name = TARGETS[target]
+    term = ' '.join(_WORD.findall(text))
+    # UPPER(...::text) matches the trigram indexes of migration 0006
+    fuzzy = f'UPPER(%s) <%% UPPER({table}.{name}::text)'
+    matches = RawSQL(
+        f"({table}.search_vector @@ to_tsquery('simple', %s) OR {fuzzy})",
+        (tsquery, term), output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"ts_rank({table}.search_vector, to_tsquery('simple', %s)) "
+        f"+ word_similarity(UPPER(%s), UPPER({table}.{name}::text))",
+        (tsquery, term), output_field=FloatField(),
+    )
+    return queryset.filter(matches).annotate(search_rank=rank).order_by('-search_rank', name)[:limit]
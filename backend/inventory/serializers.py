@@ -1,7 +1,12 @@
 # serializers.py
 
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import DimMaterial, DimDiscipline, DimTool, FactInventoryTransactions, DimDate
+from rest_framework.validators import UniqueValidator
+
+from .dates import lookup_day
+from .models import DimMaterial, DimDiscipline, DimTool, FactInventoryTransactions, DimDate, ToolState, MaterialReorderPolicy, StockAlert, MaterialForecast
 
 # Serializer for DimDiscipline
 class DisciplineSerializer(serializers.ModelSerializer):
@@ -17,12 +22,14 @@ class MaterialSerializer(serializers.ModelSerializer):
     discipline = DisciplineSerializer(read_only=True)
     current_stock = serializers.DecimalField(
         max_digits=10, decimal_places=2, read_only=True) # current_stock field for optimized queryset
+    inventory_value = serializers.DecimalField(
+        max_digits=16, decimal_places=2, read_only=True) # from MaterialValuation, see inventory/valuation.py
 
     class Meta:
         model = DimMaterial
         fields = [
             'material_id', 'material_name', 'material_type', 'unit_of_measure',
-            'brand', 'color', 'size', 'discipline', 'current_stock' # Include nested discipline
+            'brand', 'color', 'size', 'discipline', 'current_stock', 'inventory_value' # Include nested discipline
         ]
         # Since 'managed = False' in models, we explicitly define fields.
 
@@ -35,16 +42,47 @@ class ToolSerializer(serializers.ModelSerializer):
         fields = '__all__' # Use '__all__' for simplicity or list specific fields
         # If using '__all__', ensure all fields are correctly mapped in the model.
 
-# Serializer for DimDate (for FactTransactions)
-class DateSerializer(serializers.ModelSerializer):
+# Serializer for ToolState
+class ToolStateSerializer(serializers.ModelSerializer):
+    usage_days = serializers.SerializerMethodField() # includes the open checkout
+
+    class Meta:
+        model = ToolState
+        fields = ['is_checked_out', 'holder', 'checked_out_since', 'last_movement_date', 'usage_days', 'transaction_count']
+
+    def get_usage_days(self, obj):
+        return obj.total_usage_days()
+
+# Serializer for DimTool with its checkout state (null for tools never moved)
+class ToolWithStateSerializer(ToolSerializer):
+    state = serializers.SerializerMethodField()
+
+    def get_state(self, obj):
+        state = getattr(obj, 'state', None)
+        return ToolStateSerializer(state).data if state is not None else None
+
+# DimDate fields rendered for transactions, from the in-process calendar
+# (see dates.py) rather than a join on DimDate
+class CalendarDateField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'date_id')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, date_id):
+        day = lookup_day(date_id)
+        return {'date_id': day.date_id, 'full_date': day.full_date.isoformat()}
+
+# Serializer for the DimDate lookup endpoint
+class DateDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = DimDate
-        fields = ['date_id', 'full_date'] # Only essential fields for transactions
+        fields = '__all__'
 
 # Serializer for FactInventoryTransactions
 class FactInventoryTransactionsSerializer(serializers.ModelSerializer):
     # Nested serializers for foreign key relationships
-    date = DateSerializer(read_only=True)
+    date = CalendarDateField()
     material = MaterialSerializer(read_only=True) # Read-only for display
     tool = ToolSerializer(read_only=True)       # Read-only for display
 
@@ -59,3 +97,76 @@ class FactInventoryTransactionsSerializer(serializers.ModelSerializer):
             'quantity_change', 'cost_per_unit', 'total_cost',
             'transaction_type', 'notes'
         ]
+
+# Serializer for one row of a bulk transaction upload (see ingest.py)
+class TransactionRowSerializer(serializers.Serializer):
+    # Either date_id (YYYYMMDD) or an ISO date may be supplied
+    date_id = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False)
+    material_id = serializers.IntegerField(required=False, allow_null=True)
+    tool_id = serializers.IntegerField(required=False, allow_null=True)
+    quantity_change = serializers.DecimalField(max_digits=10, decimal_places=2)
+    cost_per_unit = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    total_cost = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    transaction_type = serializers.CharField(max_length=50)
+    notes = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+    def validate(self, attrs):
+        full_date = attrs.pop('date', None)
+        if full_date is not None:
+            date_id = int(full_date.strftime('%Y%m%d'))
+            if attrs.get('date_id', date_id) != date_id:
+                raise serializers.ValidationError('date and date_id refer to different days.')
+            attrs['date_id'] = date_id
+        if attrs.get('date_id') is None:
+            raise serializers.ValidationError('Either date or date_id is required.')
+
+        # Mirrors the chk_material_or_tool constraint on the fact table
+        if (attrs.get('material_id') is None) == (attrs.get('tool_id') is None):
+            raise serializers.ValidationError('Exactly one of material_id or tool_id is required.')
+
+        if attrs.get('total_cost') is None and attrs.get('cost_per_unit') is not None:
+            total_cost = (attrs['quantity_change'] * attrs['cost_per_unit']).quantize(Decimal('0.01'))
+            if abs(total_cost) >= Decimal('1e8'):
+                raise serializers.ValidationError({'total_cost': 'Calculated total cost does not fit in 10 digits.'})
+            attrs['total_cost'] = total_cost
+        attrs['notes'] = attrs.get('notes') or None
+        return attrs
+
+# Serializer for MaterialReorderPolicy
+class MaterialReorderPolicySerializer(serializers.ModelSerializer):
+    # The primary key is the material, so it is declared as a writable field
+    material = serializers.PrimaryKeyRelatedField(
+        queryset=DimMaterial.objects.all(),
+        validators=[UniqueValidator(queryset=MaterialReorderPolicy.objects.all())],
+    )
+    material_name = serializers.CharField(source='material.material_name', read_only=True)
+
+    class Meta:
+        model = MaterialReorderPolicy
+        fields = ['material', 'material_name', 'reorder_point', 'reorder_quantity', 'lead_time_days', 'is_below', 'updated_at']
+        read_only_fields = ['is_below', 'updated_at']
+
+# Serializer for StockAlert
+class StockAlertSerializer(serializers.ModelSerializer):
+    material_name = serializers.CharField(source='material.material_name', read_only=True)
+
+    class Meta:
+        model = StockAlert
+        fields = [
+            'alert_id', 'material', 'material_name', 'alert_type', 'current_stock', 'reorder_point',
+            'reorder_quantity', 'lead_time_days', 'created_at', 'acknowledged_at',
+        ]
+
+# Serializer for MaterialForecast
+class MaterialForecastSerializer(serializers.ModelSerializer):
+    material_name = serializers.CharField(source='material.material_name', read_only=True)
+    discipline_id = serializers.IntegerField(source='material.discipline_id', read_only=True)
+
+    class Meta:
+        model = MaterialForecast
+        fields = [
+            'material', 'material_name', 'discipline_id', 'as_of_date', 'current_stock', 'recent_daily_usage',
+            'seasonal_factor', 'projected_daily_usage', 'days_until_stockout', 'stockout_date',
+            'reorder_by_date', 'computed_at',
+        ]
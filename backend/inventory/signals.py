@@ -0,0 +1,52 @@
+# signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache
+from .alerts import evaluate_on_commit
+from .dates import ensure_dates
+from .models import DimDate, DimDiscipline, DimMaterial, DimTool, FactInventoryTransactions
+from .valuation import update_on_commit
+
+# Response cache scopes touched by writes to each model
+INVALIDATED_SCOPES = {
+    DimDate: (cache.DATES,),
+    DimDiscipline: (cache.DISCIPLINES,),
+    DimMaterial: (cache.MATERIALS,),
+    DimTool: (cache.TOOLS,),
+    FactInventoryTransactions: (cache.STOCK,),
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_responses(sender, **kwargs):
+    scopes = INVALIDATED_SCOPES.get(sender)
+    if scopes:
+        cache.invalidate(*scopes)
+        # Again once the write is visible, in case a concurrent request cached
+        # the old rows under the new version before the commit
+        transaction.on_commit(lambda: cache.invalidate(*scopes), using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=FactInventoryTransactions)
+@receiver(post_delete, sender=FactInventoryTransactions)
+def evaluate_stock_alerts_after_write(sender, **kwargs):
+    evaluate_on_commit(using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=FactInventoryTransactions)
+@receiver(post_delete, sender=FactInventoryTransactions)
+def update_valuations_after_write(sender, instance, **kwargs):
+    # Only the written material: others flagged earlier are not this request's work
+    if instance.material_id is not None:
+        update_on_commit([instance.material_id], using=kwargs.get('using'))
+
+
+@receiver(pre_save, sender=FactInventoryTransactions)
+def create_missing_date(sender, instance, **kwargs):
+    # A transaction may be dated on a day DimDate does not have yet
+    if instance.date_id is not None:
+        ensure_dates([instance.date_id])
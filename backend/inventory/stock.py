@@ -0,0 +1,168 @@
+# stock.py
+
+import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import FactInventoryTransactions, PartitionArchive, StockCheckpoint, StockCheckpointBalance
+
+# Authoritative per-material totals: the fact table plus the totals carried
+# forward from archived partitions (see archive_partitions).
+FACT_STOCK_TOTALS_SQL = """
+    SELECT material_id, SUM(quantity) AS current_stock, SUM(transaction_count)::int AS transaction_count
+    FROM (
+        SELECT material_id, quantity, transaction_count FROM archivedmaterialtotals
+        UNION ALL
+        SELECT material_id, quantity_change, 1 FROM factinventorytransactions WHERE material_id IS NOT NULL
+    ) AS movements
+    GROUP BY material_id
+"""
+
+# Adds the per-material totals of the transactions in {source} (the
+# partitions being archived) to the carried-forward totals
+CARRY_FORWARD_SQL = """
+    INSERT INTO archivedmaterialtotals AS a (material_id, quantity, transaction_count, cost_layers)
+    SELECT material_id, SUM(quantity_change), COUNT(*), '[]'
+    FROM ({source}) AS f
+    WHERE material_id IS NOT NULL
+    GROUP BY material_id
+    ON CONFLICT (material_id) DO UPDATE
+    SET quantity = a.quantity + EXCLUDED.quantity,
+        transaction_count = a.transaction_count + EXCLUDED.transaction_count
+"""
+
+
+def rebuild_material_stock():
+    """
+    Rebuilds the materialstock ledger from factinventorytransactions and the
+    totals of archived partitions.
+
+    The fact table is locked against writes for the duration so the triggers
+    cannot interleave with the rebuild. Returns the number of ledger rows written.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('LOCK TABLE factinventorytransactions IN SHARE MODE')
+        cursor.execute('DELETE FROM materialstock')
+        cursor.execute(f"""
+            INSERT INTO materialstock (material_id, current_stock, transaction_count, updated_at)
+            SELECT material_id, current_stock, transaction_count, now()
+            FROM ({FACT_STOCK_TOTALS_SQL}) AS totals
+        """)
+        return cursor.rowcount
+
+
+def find_material_stock_drift():
+    """
+    Compares the ledger against the fact table and returns a list of
+    (material_id, ledger_stock, fact_stock, ledger_count, fact_count) tuples
+    for every material whose ledger row is missing, stale or orphaned.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT material_id, ledger.current_stock, fact.current_stock,
+                   ledger.transaction_count, fact.transaction_count
+            FROM materialstock AS ledger
+            FULL OUTER JOIN ({FACT_STOCK_TOTALS_SQL}) AS fact USING (material_id)
+            WHERE (ledger.current_stock IS DISTINCT FROM fact.current_stock
+                   OR ledger.transaction_count IS DISTINCT FROM fact.transaction_count)
+              -- A material whose transactions were all deleted keeps an empty ledger row.
+              AND NOT (fact.material_id IS NULL AND ledger.transaction_count = 0
+                       AND ledger.current_stock = 0)
+            ORDER BY material_id
+        """)
+        return cursor.fetchall()
+
+
+def month_ends(start, end):
+    """Yields the last day of every month from start's month through end (inclusive)."""
+    year, month = start.year, start.month
+    while True:
+        next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+        month_end = next_month - datetime.timedelta(days=1)
+        if month_end > end:
+            return
+        yield month_end
+        year, month = next_month.year, next_month.month
+
+
+def date_id_for(value):
+    return int(value.strftime('%Y%m%d'))
+
+
+def archive_cutoff():
+    """The first date_id still in the attached partitions, or None if nothing was archived."""
+    return PartitionArchive.objects.aggregate(cutoff=Max('before_date_id'))['cutoff']
+
+
+def last_archived_day(cutoff):
+    return date_id_for(datetime.datetime.strptime(str(cutoff), '%Y%m%d').date() - datetime.timedelta(days=1))
+
+
+def carry_forward_stock(cursor, source):
+    """Adds the transactions selected by the SQL source to the archived totals."""
+    cursor.execute(CARRY_FORWARD_SQL.format(source=source))
+
+
+def create_checkpoint(date_id):
+    """
+    Snapshots every material and tool balance as of the end of date_id by
+    rolling the previous checkpoint forward with the transactions in between.
+    The fact table is locked against writes so no transaction can slip between
+    the snapshot and the checkpoint triggers. Once partitions are archived,
+    there must be an earlier checkpoint after them to roll forward.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('LOCK TABLE factinventorytransactions IN SHARE MODE')
+        previous = (
+            StockCheckpoint.objects.filter(date_id__lt=date_id).order_by('-date_id')
+            .values_list('date_id', flat=True).first()
+        ) or 0
+        cutoff = archive_cutoff()
+        if cutoff and previous < last_archived_day(cutoff):
+            raise ValueError(
+                f'Transactions before {cutoff} are archived; only checkpoints after an existing one can be created.'
+            )
+        StockCheckpoint.objects.create(date_id=date_id)
+        cursor.execute("""
+            INSERT INTO stockcheckpointbalance (checkpoint_id, material_id, tool_id, quantity)
+            SELECT %s, material_id, tool_id, SUM(quantity)
+            FROM (
+                SELECT material_id, tool_id, quantity
+                FROM stockcheckpointbalance WHERE checkpoint_id = %s
+                UNION ALL
+                SELECT material_id, tool_id, quantity_change
+                FROM factinventorytransactions WHERE date_id > %s AND date_id <= %s
+            ) AS balances
+            GROUP BY material_id, tool_id
+        """, [date_id, previous, previous, date_id])
+        return cursor.rowcount
+
+
+def latest_checkpoint_before(date_id):
+    return (
+        StockCheckpoint.objects.filter(date_id__lte=date_id).order_by('-date_id')
+        .values_list('date_id', flat=True).first()
+    )
+
+
+def material_stock_as_of(date_id):
+    """
+    Returns an expression for a DimMaterial queryset giving each material's
+    stock at the end of date_id: the nearest earlier checkpoint balance plus
+    the transactions dated after it, which is at most about a month of rows.
+    """
+    checkpoint_id = latest_checkpoint_before(date_id) or 0
+    balance = StockCheckpointBalance.objects.filter(
+        checkpoint_id=checkpoint_id, material=OuterRef('pk'),
+    ).values('quantity')
+    delta = FactInventoryTransactions.objects.filter(
+        material=OuterRef('pk'), date_id__gt=checkpoint_id, date_id__lte=date_id,
+    ).values('material').annotate(total=Sum('quantity_change')).values('total')
+    zero = Value(Decimal('0.00'))
+    return ExpressionWrapper(
+        Coalesce(Subquery(balance), zero) + Coalesce(Subquery(delta), zero),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
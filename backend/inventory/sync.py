@@ -0,0 +1,162 @@
+# sync.py
+#
+# Delta sync for offline clients, read from the trigger-written changelog.
+#
+# Change ids come from a sequence, so they are handed out in the order rows
+# are written, not the order transactions commit: a reader can see change 11
+# before change 10 commits. The feed is therefore ordered by the writing
+# transaction's id (xid) and only ever serves changes of transactions below
+# the current snapshot's xmin, all of which have committed or rolled back. A
+# version is the (xid, change_id) of the last change served, so no change is
+# skipped or served twice whatever the commit order.
+#
+# prune_changelog deletes the oldest changes, always a prefix of the feed, and
+# records the last version it deleted; older versions are then expired. It
+# also compacts the rest: a change followed by a later one of the same row
+# tells a client nothing the later one does not, since rows are always sent
+# in their current state.
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import ChangeLog, ChangeLogPrune, DimDiscipline, DimMaterial, DimTool, FactInventoryTransactions, MaterialStock
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+# Response section -> (changelog table_name, queryset, primary key, columns)
+SECTIONS = {
+    'disciplines': ('dimdiscipline', DimDiscipline.objects.all(), 'discipline_id',
+                    ['discipline_id', 'discipline_name', 'discipline_description']),
+    'materials': ('dimmaterial', DimMaterial.objects.all(), 'material_id',
+                  ['material_id', 'material_name', 'material_type', 'unit_of_measure', 'brand', 'color',
+                   'size', 'discipline_id']),
+    'tools': ('dimtool', DimTool.objects.all(), 'tool_id',
+              ['tool_id', 'tool_name', 'tool_type', 'brand', 'model', 'current_location', 'purchase_date',
+               'last_maintenance_date', 'is_calibrated', 'discipline_id']),
+    'transactions': ('factinventorytransactions', FactInventoryTransactions.objects.all(), 'transaction_id',
+                     ['transaction_id', 'date_id', 'material_id', 'tool_id', 'quantity_change', 'cost_per_unit',
+                      'total_cost', 'transaction_type', 'notes']),
+    'stock': ('materialstock', MaterialStock.objects.all(), 'material_id',
+              ['material_id', 'current_stock']),
+}
+
+
+COMPACT_SQL = """
+    DELETE FROM changelog
+    WHERE change_id IN (
+        SELECT change_id
+        FROM (
+            SELECT change_id, row_number() OVER (
+                PARTITION BY table_name, row_id ORDER BY xid DESC, change_id DESC
+            ) AS position
+            FROM changelog
+            WHERE xid < %s
+        ) AS ranked
+        WHERE position > 1
+    )
+"""
+
+
+class InvalidVersion(ValueError):
+    pass
+
+
+class ExpiredVersion(Exception):
+    """The changes after the version were pruned; the client has to download everything again."""
+
+
+def format_version(xid, change_id):
+    return f'{xid}.{change_id}'
+
+
+def parse_version(version):
+    try:
+        xid, change_id = (int(part) for part in version.split('.'))
+    except ValueError:
+        raise InvalidVersion(version)
+    if xid < 0 or change_id < 0:
+        raise InvalidVersion(version)
+    return xid, change_id
+
+
+def snapshot_horizon():
+    """The xmin of the current snapshot: every transaction below it has finished."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def current_version():
+    """Version to start syncing from after a full download."""
+    return format_version(snapshot_horizon(), 0)
+
+
+def oldest_version():
+    """The oldest version changes can still be served after, as (xid, change_id)."""
+    last_prune = ChangeLogPrune.objects.order_by('-prune_id').first()
+    return (last_prune.xid, last_prune.change_id) if last_prune else (0, 0)
+
+
+def prune_changelog(before, compact=True):
+    """
+    Deletes the changes made before the datetime before (and any change ordered
+    ahead of them), then with compact=True the superseded ones. Returns the
+    number of changes pruned and compacted.
+    """
+    horizon = snapshot_horizon()
+    pruned = compacted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        last = (
+            ChangeLog.objects.filter(changed_at__lt=before, xid__lt=horizon)
+            .order_by('-xid', '-change_id').values_list('xid', 'change_id').first()
+        )
+        if last is not None:
+            cursor.execute('DELETE FROM changelog WHERE (xid, change_id) <= (%s, %s)', last)
+            pruned = cursor.rowcount
+            ChangeLogPrune.objects.create(xid=last[0], change_id=last[1], deleted=pruned)
+        if compact:
+            cursor.execute(COMPACT_SQL, [horizon])
+            compacted = cursor.rowcount
+    return pruned, compacted
+
+
+def changes_since(version, limit=DEFAULT_LIMIT):
+    """
+    Returns the next batch of changes after version: the current state of every
+    created or updated row and the ids of deleted ones, per section, plus the
+    version to ask for next and whether more changes are already waiting.
+    Raises ExpiredVersion when changes after version were pruned.
+    """
+    since_xid, since_change = parse_version(version)
+    if (since_xid, since_change) < oldest_version():
+        raise ExpiredVersion(version)
+    horizon = snapshot_horizon()
+    after = Q(xid__gt=since_xid) | Q(xid=since_xid, change_id__gt=since_change)
+    entries = list(
+        ChangeLog.objects.filter(after, xid__gte=since_xid, xid__lt=horizon)
+        .order_by('xid', 'change_id')
+        .values_list('xid', 'change_id', 'table_name', 'row_id', 'operation')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if has_more:
+        next_version = format_version(*entries[-1][:2])
+    else:
+        next_version = format_version(max(horizon, since_xid), 0 if horizon > since_xid else since_change)
+
+    # The last operation on a row within the batch decides how it is sent
+    last_operation = {}
+    for _, _, table_name, row_id, operation in entries:
+        last_operation[table_name, row_id] = operation
+
+    changes = {}
+    for section, (table_name, queryset, pk, columns) in SECTIONS.items():
+        changed = [row_id for (table, row_id), op in last_operation.items() if table == table_name and op != 'D']
+        deleted = {row_id for (table, row_id), op in last_operation.items() if table == table_name and op == 'D'}
+        rows = list(queryset.filter(**{f'{pk}__in': changed}).order_by(pk).values(*columns)) if changed else []
+        # Rows deleted again by a transaction beyond this batch
+        deleted.update(set(changed) - {row[pk] for row in rows})
+        if rows or deleted:
+            changes[section] = {'upserted': rows, 'deleted': sorted(deleted)}
+    return {'version': next_version, 'has_more': has_more, 'changes': changes}
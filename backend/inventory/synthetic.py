@@ -0,0 +1,178 @@
+# synthetic.py
+#
+# Synthetic star-schema data for load testing. Dimension rows are created with
+# bulk_create; fact rows are generated as CSV text and streamed in with COPY,
+# so tens of millions of rows load without holding them in memory.
+
+import csv
+import datetime
+import io
+import math
+
+from django.db import connection
+
+from .dates import date_range, populate_dates
+from .ingest import COPY_FACT_SQL, copy_csv
+from .models import DimDiscipline, DimMaterial, DimTool
+
+# Discipline -> material types used by that trade
+DISCIPLINES = {
+    'Carpentry': ['Lumber', 'Sheet Goods', 'Fastener', 'Adhesive'],
+    'Electrical': ['Wire', 'Conduit', 'Box', 'Device'],
+    'Plumbing': ['Pipe', 'Fitting', 'Valve', 'Fixture'],
+    'HVAC': ['Duct', 'Register', 'Refrigerant', 'Filter'],
+    'Concrete': ['Cement', 'Aggregate', 'Rebar', 'Form'],
+    'Drywall': ['Board', 'Compound', 'Tape', 'Bead'],
+    'Painting': ['Paint', 'Primer', 'Caulk', 'Sundry'],
+    'Roofing': ['Shingle', 'Underlayment', 'Flashing', 'Sealant'],
+}
+TOOL_TYPES = ['Power Tool', 'Hand Tool', 'Measuring Tool', 'Safety Equipment', 'Ladder']
+BRANDS = ['Acme', 'BuildRight', 'Contractor Pro', 'DeWalt', 'Makita', 'Milwaukee', 'Ridgid', 'Stanley', None]
+UNITS = ['each', 'box', 'feet', 'gallon', 'sheet', 'bag', 'roll', 'pound']
+COLORS = ['White', 'Gray', 'Black', 'Beige', None, None, None]
+
+# Material transaction mix: (type, probability, sign, median quantity)
+MATERIAL_MOVEMENTS = [
+    ('Purchase', 0.20, 1, 120),
+    ('Usage', 0.70, -1, 8),
+    ('Return', 0.07, 1, 4),
+    ('Disposal', 0.03, -1, 3),
+]
+# Share of fact rows that are tool checkouts/returns rather than material movements
+TOOL_SHARE = 0.1
+COPY_BATCH_SIZE = 50_000
+
+
+def create_dates(start, end):
+    populate_dates(start, end)
+    return date_range(start, end)
+
+
+def create_disciplines():
+    for name in DISCIPLINES:
+        DimDiscipline.objects.get_or_create(discipline_name=name)
+    return {d.discipline_name: d for d in DimDiscipline.objects.filter(discipline_name__in=DISCIPLINES)}
+
+
+def create_materials(rng, disciplines, count):
+    start = DimMaterial.objects.count()
+    materials = []
+    for index in range(start, start + count):
+        discipline = rng.choice(list(disciplines.values()))
+        material_type = rng.choice(DISCIPLINES[discipline.discipline_name])
+        materials.append(DimMaterial(
+            material_name=f'{material_type} {index:06d}',
+            material_type=material_type,
+            unit_of_measure=rng.choice(UNITS),
+            brand=rng.choice(BRANDS),
+            color=rng.choice(COLORS),
+            size=rng.choice([None, 'Small', 'Medium', 'Large', '8ft', '4x8', '1/2in']),
+            discipline=discipline,
+        ))
+    DimMaterial.objects.bulk_create(materials, batch_size=1000)
+    return list(DimMaterial.objects.values_list('material_id', flat=True).order_by('material_id'))
+
+
+def create_tools(rng, disciplines, count):
+    start = DimTool.objects.count()
+    tools = []
+    for index in range(start, start + count):
+        tool_type = rng.choice(TOOL_TYPES)
+        tools.append(DimTool(
+            tool_name=f'{tool_type} {index:05d}',
+            tool_type=tool_type,
+            brand=rng.choice(BRANDS),
+            model=f'M-{rng.randint(100, 999)}',
+            current_location=rng.choice(['Toolbox A', 'Toolbox B', 'Wall Rack', 'Trailer', 'Site Office']),
+            purchase_date=datetime.date.today() - datetime.timedelta(days=rng.randint(30, 3000)),
+            last_maintenance_date=datetime.date.today() - datetime.timedelta(days=rng.randint(0, 400)),
+            is_calibrated=rng.random() < 0.7,
+            discipline=rng.choice(list(disciplines.values())),
+        ))
+    DimTool.objects.bulk_create(tools, batch_size=1000)
+    return list(DimTool.objects.values_list('tool_id', flat=True).order_by('tool_id'))
+
+
+def _cumulative(weights):
+    total, cumulative = 0.0, []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def date_weights(days):
+    """Weekdays far busier than weekends, with a summer construction peak."""
+    weights = []
+    for day in days:
+        seasonal = 1.0 + 0.4 * math.sin((day.timetuple().tm_yday - 80) / 365 * 2 * math.pi)
+        weights.append(seasonal * (1.0 if day.weekday() < 5 else 0.15))
+    return _cumulative(weights)
+
+
+def generate_tool_movements(rng, date_ids, date_cum, tool_ids, count):
+    """
+    Yields count tool rows spread over the tools, each tool's in date order: a
+    checkout, then its return on the same or a later day, before the tool's
+    next checkout. A tool given an odd number of rows keeps its last checkout
+    open, so some tools are still out at the end of the range.
+    """
+    for position, tool_id in enumerate(tool_ids):
+        moves = count // len(tool_ids) + (position < count % len(tool_ids))
+        checkouts = sorted(rng.choices(range(len(date_ids)), cum_weights=date_cum, k=(moves + 1) // 2))
+        for index, checkout in enumerate(checkouts):
+            yield [date_ids[checkout], None, tool_id, -1, None, None, 'Checkout', f'Crew {rng.randint(1, 40)}']
+            if 2 * index + 1 < moves:
+                latest = checkouts[index + 1] if index + 1 < len(checkouts) else len(date_ids) - 1
+                returned = min(checkout + int(rng.expovariate(1 / 3)), latest)
+                yield [date_ids[returned], None, tool_id, 1, None, None, 'Return', None]
+
+
+def generate_fact_rows(rng, days, material_ids, tool_ids, count):
+    """Yields fact rows as lists in ingest.FACT_COLUMNS order."""
+    date_ids = [int(day.strftime('%Y%m%d')) for day in days]
+    date_cum = date_weights(days)
+    # Zipf-like popularity: a few materials account for most movements
+    material_cum = _cumulative(1 / (rank + 1) ** 1.1 for rank in range(len(material_ids)))
+    shuffled = material_ids[:]
+    rng.shuffle(shuffled)
+    unit_costs = {material_id: round(rng.lognormvariate(2.5, 1.0), 2) + 0.05 for material_id in material_ids}
+    movement_cum = _cumulative(p for _, p, _, _ in MATERIAL_MOVEMENTS)
+    tool_count = round(count * TOOL_SHARE) if tool_ids else 0
+
+    for _ in range(count - tool_count):
+        date_id = rng.choices(date_ids, cum_weights=date_cum)[0]
+        material_id = rng.choices(shuffled, cum_weights=material_cum)[0]
+        transaction_type, _, sign, median = rng.choices(MATERIAL_MOVEMENTS, cum_weights=movement_cum)[0]
+        quantity = min(round(rng.lognormvariate(math.log(median), 0.6), 2), 9999) or 1
+        cost = round(unit_costs[material_id] * rng.uniform(0.9, 1.1), 2)
+        total = round(sign * quantity * cost, 2)
+        if abs(total) >= 1e8:
+            total = None
+        yield [date_id, material_id, None, sign * quantity, cost, total, transaction_type, None]
+
+    yield from generate_tool_movements(rng, date_ids, date_cum, tool_ids, tool_count)
+
+
+def copy_fact_rows(rows, batch_size=COPY_BATCH_SIZE):
+    """COPYs fact rows into factinventorytransactions in batches; returns the row count."""
+    written = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    with connection.cursor() as cursor:
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+            pending += 1
+            if pending >= batch_size:
+                buffer.seek(0)
+                copy_csv(cursor, COPY_FACT_SQL, buffer)
+                written += pending
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if pending:
+            buffer.seek(0)
+            copy_csv(cursor, COPY_FACT_SQL, buffer)
+            written += pending
+    return written
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import pre_migrate
+from django.test.runner import DiscoverRunner
+
+STAR_SCHEMA_SQL = Path(settings.BASE_DIR).parent / 'database' / 'init_star_schema.sql'
+
+
+def create_star_schema(sender, using, **kwargs):
+    """Creates the unmanaged star schema tables in a fresh test database."""
+    connection = connections[using]
+    if 'factinventorytransactions' in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(STAR_SCHEMA_SQL.read_text())
+
+
+class StarSchemaTestRunner(DiscoverRunner):
+    """
+    The inventory models are managed = False, so migrations never create their
+    tables. This runner loads database/init_star_schema.sql into the test
+    database before migrations run, which also lets the trigger migrations
+    attach to the fact table.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # The response cache outlives each test's rolled-back transaction, so it
+        # is off unless a test enables it (and clears it) explicitly
+        settings.API_CACHE_ENABLED = False
+        # Test cases only query the default alias, so replica routing is off
+        # unless a test sets DATABASE_REPLICAS itself
+        settings.DATABASE_REPLICAS = []
+
+    def setup_databases(self, **kwargs):
+        pre_migrate.connect(create_star_schema, dispatch_uid='inventory.create_star_schema')
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid='inventory.create_star_schema')
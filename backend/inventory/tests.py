@@ -1,3 +1,1224 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from decimal import Decimal
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import HttpResponse
+from django.test import override_settings
+from rest_framework import permissions
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from .alerts import evaluate_stock_alerts
+from .authentication import CachedTokenAuthentication, token_cache
+from .benchmarks import SCENARIOS
+from .columnar import pa as pyarrow, pq as parquet
+from .dates import CalendarDay, clear_calendar
+from .export import export_rows, stream_csv
+from .forecast import np as numpy, run_forecast
+from .management.commands import check_query_plans
+from .models import ChangeLog, DimDate, DimDiscipline, DimMaterial, DimTool, FactInventoryTransactions, InventoryMonthlySummary, MaterialReorderPolicy, MaterialStock, MaterialValuation, StockAlert, StockCheckpoint, StockCheckpointBalance, ToolState
+from .analytics import find_monthly_summary_drift, rebuild_monthly_summary
+from .partitions import DEFAULT_PARTITION, archive_partitions, create_partition, default_partition_rows, partition_name
+from .replicas import ReplicaRouter, read_alias, reading_from, replica_lag, replica_middleware, reset_lag_checks
+from .stock import create_checkpoint, find_material_stock_drift, rebuild_material_stock
+from .toolstate import find_tool_state_drift, rebuild_tool_state
+from .valuation import rebuild_valuations, update_valuations
+from .views import FactInventoryTransactionsViewSet, MaterialViewSet
+
+
+def make_date(full_date):
+    return DimDate.objects.create(
+        date_id=int(full_date.strftime('%Y%m%d')),
+        full_date=full_date,
+        year=full_date.year,
+        month_number=full_date.month,
+        month_name=full_date.strftime('%B'),
+        day_of_month=full_date.day,
+        weekday_number=full_date.isoweekday() % 7 + 1,
+        weekday_name=full_date.strftime('%A'),
+        quarter_number=(full_date.month - 1) // 3 + 1,
+        quarter_name=f'Q{(full_date.month - 1) // 3 + 1}',
+    )
+
+
+def read_async_stream(response):
+    """The body of a streaming response served through the async client."""
+    async def read():
+        return b''.join([chunk async for chunk in response.streaming_content])
+    return async_to_sync(read)()
+
+
+class QueryCountRegressionTests(APITestCase):
+    """
+    Guards against N+1 queries: each endpoint must issue the same number of
+    queries whether it returns one row or many.
+    """
+
+    # Queries per request, independent of the number of rows returned
+    EXPECTED_QUERIES = {
+        '/api/disciplines/': 1,
+        '/api/materials/': 1,
+        '/api/tools/': 1,
+        '/api/transactions/': 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.date = make_date(datetime.date(2025, 7, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.rows = 0
+
+    def add_rows(self, count):
+        """Adds count disciplines, materials, tools and transactions."""
+        for index in range(self.rows, self.rows + count):
+            discipline = DimDiscipline.objects.create(discipline_name=f'Discipline {index}')
+            material = DimMaterial.objects.create(
+                material_name=f'Material {index}', unit_of_measure='each', discipline=discipline,
+            )
+            tool = DimTool.objects.create(tool_name=f'Tool {index}', discipline=discipline)
+            FactInventoryTransactions.objects.create(
+                date=self.date, material=material, quantity_change=Decimal('10.00'), transaction_type='Purchase',
+            )
+            FactInventoryTransactions.objects.create(
+                date=self.date, tool=tool, quantity_change=Decimal('1.00'), transaction_type='Purchase',
+            )
+        self.rows += count
+
+    def test_list_query_count_is_independent_of_row_count(self):
+        for total in (1, 5, 25):
+            self.add_rows(total - self.rows)
+            for url, expected in self.EXPECTED_QUERIES.items():
+                with self.subTest(url=url, rows=total), self.assertNumQueries(expected):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_transaction_detail_is_a_single_query(self):
+        self.add_rows(1)
+        transaction = FactInventoryTransactions.objects.filter(material__isnull=False).first()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/transactions/{transaction.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['material']['discipline']['discipline_name'], 'Discipline 0')
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        material = DimMaterial.objects.create(material_name='Plywood', unit_of_measure='sheet')
+        dates = [make_date(datetime.date(2025, 7, day)) for day in (3, 1, 2)]
+        # Interleave dates so transaction_id order differs from date order
+        for index in range(8):
+            FactInventoryTransactions.objects.create(
+                date=dates[index % 3], material=material,
+                quantity_change=Decimal('1.00'), transaction_type='Purchase',
+            )
+        cls.expected = list(
+            FactInventoryTransactions.objects.order_by('date_id', 'transaction_id').values_list('transaction_id', flat=True)
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['transaction_id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_next_links_walk_rows_in_key_order(self):
+        pages = self.walk('/api/transactions/?page_size=3', 'next')
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_previous_links_walk_back_to_the_first_page(self):
+        last_page_url = '/api/transactions/?page_size=3'
+        while True:
+            response = self.client.get(last_page_url)
+            if not response.data['next']:
+                break
+            last_page_url = response.data['next']
+        pages = self.walk(last_page_url, 'previous')
+        self.assertEqual(sum(reversed(pages), []), self.expected)
+
+    def test_descending_ordering_reverses_the_key(self):
+        pages = self.walk('/api/transactions/?page_size=3&ordering=-date__full_date', 'next')
+        self.assertEqual(sum(pages, []), self.expected[::-1])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/transactions/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_values_of_the_wrong_type_is_not_found(self):
+        for position in (['x', 'y'], [{'a': 1}, 2], [20250701, None]):
+            cursor = base64.urlsafe_b64encode(json.dumps({'p': position, 'r': 0}).encode()).decode()
+            response = self.client.get('/api/transactions/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+        cursor = base64.urlsafe_b64encode(json.dumps({'p': [['x']], 'r': 0}).encode()).decode()
+        self.assertEqual(self.client.get('/api/alerts/', {'cursor': cursor}).status_code, 404)
+
+    def test_nullable_material_ordering_pages_on_the_material_id_tiebreaker(self):
+        for name, brand in (('Nails', 'Acme'), ('Screws', None), ('Studs', 'Acme'), ('Tape', None)):
+            DimMaterial.objects.create(material_name=name, unit_of_measure='each', brand=brand)
+        url, names = '/api/materials/?page_size=2&ordering=brand', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            names += [row['material_name'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(names, ['Plywood', 'Screws', 'Tape', 'Nails', 'Studs'])
+
+    def test_ordering_without_a_keyset_is_rejected(self):
+        response = self.client.get('/api/transactions/?ordering=notes')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+
+class TransactionExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        discipline = DimDiscipline.objects.create(discipline_name='Carpentry')
+        material = DimMaterial.objects.create(material_name='Plywood', unit_of_measure='sheet', discipline=discipline)
+        for day in (1, 2, 3):
+            FactInventoryTransactions.objects.create(
+                date=make_date(datetime.date(2025, 7, day)), material=material,
+                quantity_change=Decimal(day), transaction_type='Purchase',
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_csv_export_applies_list_filters(self):
+        response = self.client.get('/api/transactions/export/?date__date_id__gte=20250702')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['transaction_id', 'date_id', 'full_date'])
+        self.assertEqual([line.split(',')[2] for line in lines[1:]], ['2025-07-02', '2025-07-03'])
+        self.assertIn('Carpentry', lines[1])
+
+    def test_ndjson_export_has_one_object_per_line(self):
+        response = self.client.get('/api/transactions/export/?export_format=ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['material_name'], 'Plywood')
+
+    def test_export_is_streamed_asynchronously_under_asgi(self):
+        token = Token.objects.create(user=self.user)
+        response = async_to_sync(self.async_client.get)(
+            '/api/transactions/export/?export_format=ndjson', headers={'authorization': f'Token {token.key}'},
+        )
+        self.assertTrue(response.is_async)
+        expected = b''.join(self.client.get('/api/transactions/export/?export_format=ndjson').streaming_content)
+        self.assertEqual(read_async_stream(response), expected)
+
+    @mock.patch('inventory.export.EXPORT_BUFFER_SIZE', 1)
+    def test_export_holds_a_transaction_open_until_the_stream_is_closed(self):
+        # Outside a transaction the server-side cursor would be WITH HOLD
+        depth = len(connection.savepoint_ids)
+        chunks = stream_csv(export_rows(FactInventoryTransactions.objects.all()))
+        next(chunks)
+        next(chunks)
+        self.assertEqual(len(connection.savepoint_ids), depth + 1)
+        chunks.close()
+        self.assertEqual(len(connection.savepoint_ids), depth)
+
+
+class AnalyticsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        carpentry = DimDiscipline.objects.create(discipline_name='Carpentry')
+        plumbing = DimDiscipline.objects.create(discipline_name='Plumbing')
+        cls.plywood = DimMaterial.objects.create(material_name='Plywood', unit_of_measure='sheet', discipline=carpentry)
+        pipe = DimMaterial.objects.create(material_name='PVC Pipe', unit_of_measure='feet', discipline=plumbing)
+        july, august = make_date(datetime.date(2025, 7, 1)), make_date(datetime.date(2025, 8, 1))
+        for date, material, quantity, cost in (
+            (july, cls.plywood, '10', '200'), (july, cls.plywood, '-4', '-80'),
+            (august, cls.plywood, '5', '100'), (august, pipe, '20', '40'),
+        ):
+            FactInventoryTransactions.objects.create(
+                date=date, material=material, quantity_change=Decimal(quantity), total_cost=Decimal(cost),
+                transaction_type='Purchase' if Decimal(quantity) > 0 else 'Usage',
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_group_by_month_and_discipline(self):
+        response = self.client.get('/api/analytics/?group_by=month,discipline')
+        self.assertEqual(response.status_code, 200)
+        totals = {(row['month'], row['discipline']): row['quantity_change'] for row in response.data}
+        self.assertEqual(totals, {
+            (7, 'Carpentry'): Decimal('6.00'), (8, 'Carpentry'): Decimal('5.00'), (8, 'Plumbing'): Decimal('20.00'),
+        })
+
+    def test_summary_follows_updates_and_deletes(self):
+        FactInventoryTransactions.objects.filter(transaction_type='Usage').update(transaction_type='Return')
+        FactInventoryTransactions.objects.filter(date_id=20250801, material=self.plywood).delete()
+        response = self.client.get('/api/analytics/?group_by=transaction_type&material_id=%d' % self.plywood.pk)
+        self.assertEqual(
+            {row['transaction_type']: row['total_cost'] for row in response.data},
+            {'Purchase': Decimal('200.00'), 'Return': Decimal('-80.00')},
+        )
+
+    def test_unknown_dimension_is_rejected(self):
+        response = self.client.get('/api/analytics/?group_by=color')
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_numeric_filter_is_rejected(self):
+        response = self.client.get('/api/analytics/?group_by=month&material_id=plywood')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('material_id', response.data)
+
+
+class StockAsOfTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.material = DimMaterial.objects.create(material_name='Plywood', unit_of_measure='sheet')
+        cls.dates = {
+            day: make_date(day) for day in (
+                datetime.date(2025, 6, 15), datetime.date(2025, 6, 30),
+                datetime.date(2025, 7, 10), datetime.date(2025, 7, 31), datetime.date(2025, 8, 5),
+            )
+        }
+        for day, quantity in ((datetime.date(2025, 6, 15), '10'), (datetime.date(2025, 7, 10), '-3'),
+                              (datetime.date(2025, 8, 5), '7')):
+            cls.add_transaction(day, quantity)
+        call_command('create_stock_checkpoints', through=datetime.date(2025, 7, 31), stdout=io.StringIO())
+
+    @classmethod
+    def add_transaction(cls, day, quantity):
+        FactInventoryTransactions.objects.create(
+            date=cls.dates[day], material=cls.material,
+            quantity_change=Decimal(quantity), transaction_type='Purchase',
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def stock_as_of(self, as_of):
+        response = self.client.get(f'/api/materials/?as_of={as_of}')
+        self.assertEqual(response.status_code, 200)
+        return Decimal(response.data['results'][0]['current_stock'])
+
+    def test_as_of_combines_checkpoint_and_later_transactions(self):
+        self.assertEqual(StockCheckpoint.objects.count(), 2)
+        self.assertEqual(self.stock_as_of('2025-06-30'), Decimal('10'))
+        self.assertEqual(self.stock_as_of('2025-07-31'), Decimal('7'))
+        self.assertEqual(self.stock_as_of('2025-08-05'), Decimal('14'))
+
+    def test_backdated_transactions_update_later_checkpoints(self):
+        self.add_transaction(datetime.date(2025, 6, 15), '5')
+        self.assertEqual(self.stock_as_of('2025-07-31'), Decimal('12'))
+        self.assertEqual(self.stock_as_of('2025-08-05'), Decimal('19'))
+
+    def test_deleted_transactions_are_taken_out_of_later_checkpoints(self):
+        FactInventoryTransactions.objects.filter(date_id=20250710).delete()
+        balances = dict(StockCheckpointBalance.objects.filter(material=self.material).values_list('checkpoint_id', 'quantity'))
+        self.assertEqual(balances, {20250630: Decimal('10'), 20250731: Decimal('10')})
+        self.assertEqual(self.stock_as_of('2025-08-05'), Decimal('17'))
+
+    def test_invalid_as_of_is_rejected(self):
+        response = self.client.get('/api/materials/?as_of=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(API_CACHE_ENABLED=True)
+class ResponseCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.discipline = DimDiscipline.objects.create(discipline_name='Carpentry')
+
+    def setUp(self):
+        caches['api'].clear()
+        self.client.force_authenticate(self.user)
+
+    def test_repeat_reads_skip_the_database(self):
+        self.client.get('/api/disciplines/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/disciplines/')
+        self.assertEqual(response.data[0]['discipline_name'], 'Carpentry')
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get('/api/disciplines/')['ETag']
+        response = self.client.get('/api/disciplines/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_saving_a_discipline_invalidates_dependent_responses(self):
+        DimMaterial.objects.create(material_name='Stud', unit_of_measure='each', discipline=self.discipline)
+        self.client.get('/api/disciplines/')
+        self.client.get('/api/materials/')
+        self.discipline.discipline_name = 'Framing'
+        self.discipline.save()
+        response = self.client.get('/api/disciplines/')
+        self.assertEqual(response.data[0]['discipline_name'], 'Framing')
+        response = self.client.get('/api/materials/')
+        self.assertEqual(response.data['results'][0]['discipline']['discipline_name'], 'Framing')
+
+    def test_new_transactions_invalidate_material_stock(self):
+        material = DimMaterial.objects.create(material_name='Plywood', unit_of_measure='sheet')
+        self.client.get('/api/materials/')
+        FactInventoryTransactions.objects.create(
+            date=make_date(datetime.date(2025, 7, 1)), material=material,
+            quantity_change=Decimal('4.00'), transaction_type='Purchase',
+        )
+        response = self.client.get('/api/materials/')
+        self.assertEqual(Decimal(response.data['results'][0]['current_stock']), Decimal('4.00'))
+
+
+class QueryPlanCheckTests(APITestCase):
+
+    def check_plans(self, scenarios):
+        output = io.StringIO()
+        with mock.patch.object(check_query_plans, 'SCENARIOS', scenarios):
+            call_command('check_query_plans', stdout=output)
+        return output.getvalue()
+
+    def test_filter_served_by_its_index_passes(self):
+        output = self.check_plans([
+            ('transactions by date range', FactInventoryTransactionsViewSet,
+             {'date__date_id__gte': 20250101, 'date__date_id__lte': 20250131}, ['fact_date_transaction_idx']),
+        ])
+        self.assertIn('ok    transactions by date range: fact_date_transaction_idx', output)
+
+    def test_filter_without_its_index_fails(self):
+        with self.assertRaisesMessage(CommandError, '1 API filter(s) are not served by an index.'):
+            self.check_plans([
+                ('transactions by date range', FactInventoryTransactionsViewSet,
+                 {'date__date_id__gte': 20250101, 'date__date_id__lte': 20250131}, ['fact_missing_idx']),
+            ])
+
+
+class BenchmarkSuiteTests(APITestCase):
+    """Smoke test for the synthetic data generator and the endpoint benchmark."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_synthetic_data', start_date=datetime.date(2025, 6, 1), end_date=datetime.date(2025, 7, 31),
+            materials=20, tools=5, transactions=500, batch_size=200, stdout=io.StringIO(),
+        )
+
+    def test_generator_fills_every_table(self):
+        self.assertEqual(DimDate.objects.filter(date_id__range=(20250601, 20250731)).count(), 61)
+        self.assertEqual(FactInventoryTransactions.objects.count(), 500)
+        self.assertTrue(FactInventoryTransactions.objects.filter(tool__isnull=False).exists())
+        self.assertEqual(find_material_stock_drift(), [])
+
+    def test_generated_tool_movements_pair_each_checkout_with_a_return(self):
+        movements = FactInventoryTransactions.objects.filter(tool__isnull=False).order_by(
+            'tool_id', 'date_id', 'transaction_id').values_list('tool_id', 'transaction_type')
+        self.assertEqual(len(movements), 50)
+        previous_tool = None
+        for tool_id, transaction_type in movements:
+            expected = 'Return' if tool_id == previous_tool and expected == 'Checkout' else 'Checkout'
+            self.assertEqual(transaction_type, expected)
+            previous_tool = tool_id
+
+    def test_every_scenario_runs_without_errors(self):
+        output = io.StringIO()
+        call_command('benchmark_api', iterations=2, warmup=0, stdout=output)
+        for scenario in SCENARIOS:
+            self.assertIn(scenario.name, output.getvalue())
+        # Rolled back writes leave the data as generated
+        self.assertEqual(FactInventoryTransactions.objects.count(), 500)
+
+
+class PartitioningTests(APITestCase):
+    """The transaction table is range-partitioned by month on date_id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.material = DimMaterial.objects.create(material_name='Conduit', unit_of_measure='feet')
+
+    def add_transaction(self, full_date):
+        return FactInventoryTransactions.objects.create(
+            date=make_date(full_date), material=self.material,
+            quantity_change=Decimal('5.00'), transaction_type='Purchase',
+        )
+
+    def test_date_range_filter_prunes_other_partitions(self):
+        # Months well before the migration's partition window, so the test
+        # does not depend on the current date
+        june, july = datetime.date(2010, 6, 1), datetime.date(2010, 7, 1)
+        create_partition(june)
+        create_partition(july)
+        self.add_transaction(datetime.date(2010, 7, 15))
+        plan = FactInventoryTransactions.objects.filter(
+            date__date_id__gte=20100701, date__date_id__lte=20100731,
+        ).explain()
+        self.assertIn(partition_name(july), plan)
+        self.assertNotIn(partition_name(june), plan)
+        self.assertNotIn(DEFAULT_PARTITION, plan)
+
+    def test_creating_a_partition_moves_rows_out_of_the_default_partition(self):
+        far_future = datetime.date(2040, 3, 1)
+        transaction = self.add_transaction(far_future)
+        self.assertEqual(default_partition_rows(), 1)
+
+        self.assertEqual(create_partition(far_future), 1)
+        self.assertEqual(default_partition_rows(), 0)
+        self.assertIsNone(create_partition(far_future))
+        # Moving rows between partitions does not touch the stock ledger
+        self.assertEqual(FactInventoryTransactions.objects.get(pk=transaction.pk).quantity_change, Decimal('5.00'))
+        self.assertEqual(find_material_stock_drift(), [])
+
+    def test_rebuilds_after_archiving_continue_from_the_archived_history(self):
+        june, july = datetime.date(2010, 6, 1), datetime.date(2010, 7, 1)
+        create_partition(june)
+        create_partition(july)
+        tool = DimTool.objects.create(tool_name='Crimper')
+        for full_date, quantity, cost, kwargs in [
+            (datetime.date(2010, 6, 3), '10.00', '2.00', {'material': self.material}),
+            (datetime.date(2010, 6, 10), '-4.00', None, {'material': self.material}),
+            (datetime.date(2010, 6, 20), '-1.00', None, {'tool': tool, 'notes': 'Dana'}),
+            (datetime.date(2010, 7, 5), '1.00', None, {'tool': tool}),
+            (datetime.date(2010, 7, 8), '5.00', '3.00', {'material': self.material}),
+        ]:
+            FactInventoryTransactions.objects.create(
+                date=make_date(full_date), quantity_change=Decimal(quantity),
+                cost_per_unit=cost and Decimal(cost), transaction_type='Movement', **kwargs,
+            )
+        create_checkpoint(20100630)
+        rebuild_valuations(workers=0)
+        valuation_fields = ('quantity_on_hand', 'average_unit_cost', 'average_value', 'fifo_value')
+        valued = MaterialValuation.objects.values(*valuation_fields).get(material=self.material)
+
+        self.assertEqual(archive_partitions(july, drop=True), [partition_name(june)])
+        rebuild_material_stock()
+        self.assertEqual(find_material_stock_drift(), [])
+        stock = MaterialStock.objects.get(material=self.material)
+        self.assertEqual((stock.current_stock, stock.transaction_count), (Decimal('11.00'), 3))
+
+        rebuild_monthly_summary()
+        self.assertEqual(find_monthly_summary_drift(), [])
+        self.assertTrue(InventoryMonthlySummary.objects.filter(year=2010, month_number=6).exists())
+
+        rebuild_tool_state()
+        self.assertEqual(find_tool_state_drift(), [])
+        state = ToolState.objects.get(tool=tool)
+        # The checkout opened in the archived month lasted until July 5
+        self.assertEqual((state.is_checked_out, state.usage_days, state.transaction_count), (False, 15, 2))
+
+        rebuild_valuations(workers=0)
+        self.assertEqual(MaterialValuation.objects.values(*valuation_fields).get(material=self.material), valued)
+        self.assertEqual(valued['fifo_value'], Decimal('27.00'))
+
+    def test_archiving_requires_a_checkpoint(self):
+        june = datetime.date(2010, 6, 1)
+        create_partition(june)
+        self.add_transaction(datetime.date(2010, 6, 3))
+        with self.assertRaises(ValueError):
+            archive_partitions(datetime.date(2010, 7, 1))
+
+
+class AsyncReadPathTests(APITestCase):
+    """The /api/async/ views reuse the sync viewsets' filters, pagination and serializers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        discipline = DimDiscipline.objects.create(discipline_name='Electrical')
+        for name in ('Wire', 'Box', 'Breaker'):
+            DimMaterial.objects.create(material_name=name, unit_of_measure='each', discipline=discipline)
+
+    def test_requires_a_token(self):
+        response = self.client.get('/api/async/materials/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    def test_list_matches_the_sync_endpoint(self):
+        self.client.force_authenticate(self.user)
+        expected = self.client.get('/api/materials/', {'page_size': 2}).data
+        token = Token.objects.create(user=self.user)
+        response = async_to_sync(self.async_client.get)(
+            '/api/async/materials/', {'page_size': 2}, headers={'authorization': f'Token {token.key}'},
+        )
+        data = response.json()
+        self.assertEqual(data['results'], json.loads(json.dumps(expected['results'], cls=DjangoJSONEncoder)))
+        self.assertEqual([row['material_name'] for row in data['results']], ['Box', 'Breaker'])
+        # Links differ in host and path (/api/async/materials/) but carry the same cursor
+        self.assertEqual(urlsplit(data['next']).query, urlsplit(expected['next']).query)
+        self.assertIsNone(data['previous'])
+
+    @override_settings(API_CACHE_ENABLED=True)
+    def test_serves_cached_responses_with_an_etag(self):
+        self.client.force_authenticate(self.user)
+        first = self.client.get('/api/async/disciplines/')
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/async/disciplines/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_uses_the_viewset_permission_classes(self):
+        self.client.force_authenticate(self.user)
+        with mock.patch.object(MaterialViewSet, 'permission_classes', [permissions.IsAdminUser]):
+            response = self.client.get('/api/async/materials/')
+        self.assertEqual(response.status_code, 403)
+
+
+class DatabasePoolMetricsTests(APITestCase):
+
+    def test_metrics_are_admin_only(self):
+        user = get_user_model().objects.create_user('tester', password='unused')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get('/api/metrics/db-pool/').status_code, 403)
+
+    def test_reports_each_database_alias(self):
+        admin = get_user_model().objects.create_superuser('admin', password='unused')
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/metrics/db-pool/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.data['default']['mode'], ('pool', 'persistent', 'per_request'))
+        self.assertIn('created', response.data['default'])
+
+
+class PerformanceInstrumentationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        DimMaterial.objects.create(material_name='Stud', unit_of_measure='each')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/materials/'))
+
+    @override_settings(PERFORMANCE_INSTRUMENTATION=True)
+    def test_server_timing_breaks_down_the_request(self):
+        with self.assertLogs('inventory.performance', level='INFO') as logs:
+            response = self.client.get('/api/materials/')
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        for name in ('serialize', 'render', 'total'):
+            self.assertIn(f'{name};dur=', timing)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['path'], entry['status'], entry['queries']), ('/api/materials/', 200, 1))
+
+    @override_settings(PERFORMANCE_INSTRUMENTATION=True)
+    def test_reorder_policy_and_sync_views_are_instrumented(self):
+        for path in ('/api/reorder-policies/', '/api/sync/'):
+            with self.assertLogs('inventory.performance', level='INFO'):
+                response = self.client.get(path)
+            self.assertIn('render;dur=', response['Server-Timing'], path)
+
+    @override_settings(PERFORMANCE_INSTRUMENTATION=True, PERFORMANCE_SLOW_QUERY_MS=0)
+    def test_slow_query_log(self):
+        with self.assertLogs('inventory.performance.sql', level='WARNING') as logs:
+            self.client.get('/api/materials/')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertIn('dimmaterial', entry['slow'][0]['sql'])
+
+
+class ToolStateTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.electrical = DimDiscipline.objects.create(discipline_name='Electrical')
+        recent = datetime.date.today() - datetime.timedelta(days=10)
+        cls.drill = DimTool.objects.create(
+            tool_name='Drill', discipline=cls.electrical, last_maintenance_date=recent, is_calibrated=True)
+        cls.meter = DimTool.objects.create(
+            tool_name='Meter', discipline=cls.electrical, last_maintenance_date=recent, is_calibrated=False)
+        cls.saw = DimTool.objects.create(tool_name='Saw', is_calibrated=True)
+        cls.dates = {day: make_date(day) for day in (
+            datetime.date(2025, 5, 1), datetime.date(2025, 5, 4), datetime.date(2025, 5, 10))}
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def move(self, tool, day, quantity, notes=None):
+        FactInventoryTransactions.objects.create(
+            date=self.dates[day], tool=tool, quantity_change=Decimal(quantity),
+            transaction_type='Checkout' if quantity < 0 else 'Return', notes=notes,
+        )
+
+    def test_checkout_and_return_update_state(self):
+        self.move(self.drill, datetime.date(2025, 5, 1), -1, 'Crew 7')
+        state = ToolState.objects.get(tool=self.drill)
+        self.assertEqual((state.is_checked_out, state.holder), (True, 'Crew 7'))
+        self.assertEqual(state.checked_out_since, datetime.date(2025, 5, 1))
+        self.assertEqual(state.total_usage_days(today=datetime.date(2025, 5, 3)), 2)
+
+        self.move(self.drill, datetime.date(2025, 5, 4), 1)
+        state.refresh_from_db()
+        self.assertEqual((state.is_checked_out, state.holder, state.usage_days), (False, None, 3))
+        self.assertEqual((state.last_movement_date, state.transaction_count), (datetime.date(2025, 5, 4), 2))
+
+        FactInventoryTransactions.objects.filter(tool=self.drill).delete()
+        self.assertFalse(ToolState.objects.filter(tool=self.drill).exists())
+        self.assertEqual(find_tool_state_drift(), [])
+
+    def test_later_movements_continue_from_the_saved_state(self):
+        self.move(self.drill, datetime.date(2025, 5, 4), -1, 'Crew 7')
+        # Marks the saved state, which a recompute from the history would drop
+        ToolState.objects.filter(tool=self.drill).update(usage_days=100)
+        self.move(self.drill, datetime.date(2025, 5, 10), 1)
+        state = ToolState.objects.get(tool=self.drill)
+        self.assertEqual((state.is_checked_out, state.usage_days, state.transaction_count), (False, 106, 2))
+
+        # A back-dated movement is recomputed from the history
+        self.move(self.drill, datetime.date(2025, 5, 1), -1, 'Crew 2')
+        state.refresh_from_db()
+        self.assertEqual((state.is_checked_out, state.usage_days, state.transaction_count), (False, 9, 3))
+        self.assertEqual(find_tool_state_drift(), [])
+
+    def test_available_excludes_checked_out_tools(self):
+        self.move(self.meter, datetime.date(2025, 5, 10), -1, 'Crew 2')
+        response = self.client.get(f'/api/tools/available/?discipline_id={self.electrical.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['tool_name'] for row in response.data], ['Drill'])
+        self.assertIsNone(response.data[0]['state'])
+
+    def test_overdue_maintenance(self):
+        response = self.client.get('/api/tools/overdue-maintenance/')
+        self.assertEqual(response.status_code, 200)
+        # Never maintained first, then uncalibrated
+        self.assertEqual([row['tool_name'] for row in response.data], ['Saw', 'Meter'])
+        response = self.client.get('/api/tools/overdue-maintenance/?days=5')
+        self.assertEqual({row['tool_name'] for row in response.data}, {'Drill', 'Meter', 'Saw'})
+        self.assertEqual(self.client.get('/api/tools/overdue-maintenance/?days=soon').status_code, 400)
+
+
+class CatalogSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        for name, material_type, brand in (('Plywood Sheet', 'Sheet Goods', 'BuildRight'),
+                                           ('Plywood Underlayment', 'Sheet Goods', None),
+                                           ('Wood Screws', 'Fastener', 'Plyco'),
+                                           ('Drywall Tape', 'Tape', None)):
+            DimMaterial.objects.create(material_name=name, material_type=material_type, brand=brand,
+                                       unit_of_measure='each')
+        DimTool.objects.create(tool_name='Cordless Drill', tool_type='Power Tool', brand='Makita')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def names(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [row['material_name' if 'material_name' in row else 'tool_name'] for row in response.data]
+
+    def test_prefix_matches_rank_name_hits_first(self):
+        self.assertEqual(self.names('/api/materials/search/?q=ply'),
+                         ['Plywood Sheet', 'Plywood Underlayment', 'Wood Screws'])
+        self.assertEqual(self.names('/api/materials/search/?q=plywood she')[0], 'Plywood Sheet')
+
+    def test_typos_still_match(self):
+        self.assertIn('Plywood Sheet', self.names('/api/materials/search/?q=plywod'))
+        self.assertEqual(self.names('/api/tools/search/?q=cordles'), ['Cordless Drill'])
+
+    def test_results_carry_stock_and_rank(self):
+        response = self.client.get('/api/materials/search/?q=tape&limit=1')
+        self.assertEqual(len(response.data), 1)
+        self.assertIn('current_stock', response.data[0])
+        self.assertGreater(response.data[0]['search_rank'], 0)
+        self.assertEqual(self.client.get('/api/materials/search/?q=').data, [])
+
+
+class StockAlertTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.material = DimMaterial.objects.create(material_name='Drywall Screws', unit_of_measure='box')
+        cls.other = DimMaterial.objects.create(material_name='Joint Tape', unit_of_measure='roll')
+        cls.date = make_date(datetime.date(2025, 9, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def move(self, material, quantity):
+        FactInventoryTransactions.objects.create(
+            date=self.date, material=material, quantity_change=Decimal(quantity), transaction_type='Usage')
+
+    def alert_types(self, alert_ids):
+        return list(StockAlert.objects.filter(alert_id__in=alert_ids).order_by('alert_id')
+                    .values_list('alert_type', flat=True))
+
+    def test_alerts_once_per_crossing(self):
+        response = self.client.post('/api/reorder-policies/', {'material': self.material.pk, 'reorder_point': '5'})
+        self.assertEqual(response.status_code, 201)
+        # No stock yet
+        self.assertEqual(self.alert_types(evaluate_stock_alerts()), [StockAlert.LOW_STOCK])
+
+        self.move(self.material, '10')
+        self.move(self.other, '1')
+        self.assertEqual(self.alert_types(evaluate_stock_alerts()), [StockAlert.RECOVERED])
+        self.move(self.material, '-2')
+        self.assertEqual(evaluate_stock_alerts(), [])
+        self.move(self.material, '-3')
+        alert_ids = evaluate_stock_alerts()
+        self.assertEqual(self.alert_types(alert_ids), [StockAlert.LOW_STOCK])
+        self.assertEqual(StockAlert.objects.get(pk=alert_ids[0]).current_stock, Decimal('5'))
+        self.assertTrue(MaterialReorderPolicy.objects.get(pk=self.material.pk).is_below)
+
+    def test_list_and_acknowledge(self):
+        MaterialReorderPolicy.objects.create(material=self.material, reorder_point=Decimal('1'))
+        MaterialReorderPolicy.objects.create(material=self.other, reorder_point=Decimal('1'))
+        first, second = evaluate_stock_alerts()
+        response = self.client.get('/api/alerts/')
+        self.assertEqual([row['alert_id'] for row in response.data['results']], [second, first])
+
+        response = self.client.post(f'/api/alerts/{first}/acknowledge/')
+        self.assertIsNotNone(response.data['acknowledged_at'])
+        response = self.client.get('/api/alerts/?open=true')
+        self.assertEqual([row['material_name'] for row in response.data['results']], ['Joint Tape'])
+
+    @override_settings(ALERT_STREAM_MAX_SECONDS=0)
+    def test_stream_accepts_a_query_token(self):
+        MaterialReorderPolicy.objects.create(material=self.material, reorder_point=Decimal('1'))
+        alert_id, = evaluate_stock_alerts()
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/alerts/stream/', HTTP_ACCEPT='text/event-stream').status_code, 401)
+
+        response = self.client.get(f'/api/alerts/stream/?token={self.token.key}&since=0',
+                                   HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn(f'id: {alert_id}\nevent: low_stock\n', body)
+        self.assertIn('"material_name": "Drywall Screws"', body)
+
+    @override_settings(ALERT_STREAM_MAX_SECONDS=0)
+    def test_stream_polls_asynchronously_under_asgi(self):
+        MaterialReorderPolicy.objects.create(material=self.material, reorder_point=Decimal('1'))
+        alert_id, = evaluate_stock_alerts()
+        response = async_to_sync(self.async_client.get)(
+            f'/api/alerts/stream/?token={self.token.key}&since=0', headers={'accept': 'text/event-stream'},
+        )
+        self.assertTrue(response.is_async)
+        self.assertIn(f'id: {alert_id}\nevent: low_stock\n', read_async_stream(response).decode())
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class ForecastTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.screws = DimMaterial.objects.create(material_name='Deck Screws', unit_of_measure='box')
+        cls.idle = DimMaterial.objects.create(material_name='Sill Gasket', unit_of_measure='roll')
+        MaterialReorderPolicy.objects.create(material=cls.screws, reorder_point=Decimal('5'), lead_time_days=10)
+        for day, material, quantity in ((datetime.date(2025, 9, 1), cls.screws, '100'),
+                                        (datetime.date(2025, 9, 15), cls.screws, '-30'),
+                                        (datetime.date(2025, 9, 1), cls.idle, '4')):
+            date = DimDate.objects.filter(full_date=day).first() or make_date(day)
+            FactInventoryTransactions.objects.create(date=date, material=material, quantity_change=Decimal(quantity),
+                                                     transaction_type='Usage' if quantity.startswith('-') else 'Purchase')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # In-process, since worker processes cannot see the test transaction
+        self.assertEqual(run_forecast(as_of=datetime.date(2025, 9, 30), window_days=30, history_days=30, workers=0), 2)
+
+    def test_projects_stockout_from_recent_usage(self):
+        response = self.client.get('/api/forecasts/')
+        self.assertEqual(response.status_code, 200)
+        row, = response.data['results']
+        self.assertEqual((row['material_name'], row['recent_daily_usage']), ('Deck Screws', '1.0000'))
+        # 70 left at 1 per day, ordered 10 days ahead
+        self.assertEqual((row['days_until_stockout'], row['stockout_date'], row['reorder_by_date']),
+                         (70, '2025-12-09', '2025-11-29'))
+
+    def test_materials_without_usage_have_no_stockout(self):
+        response = self.client.get('/api/forecasts/?ordering=material_id')
+        self.assertEqual([row['stockout_date'] for row in response.data['results']], ['2025-12-09', None])
+
+
+# Changes made inside the test transaction are above the real snapshot xmin
+@mock.patch('inventory.sync.snapshot_horizon', return_value=2 ** 62)
+class DeltaSyncTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.tool = DimTool.objects.create(tool_name='Old Ladder')
+        cls.date = make_date(datetime.date(2025, 10, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since, **params):
+        response = self.client.get('/api/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_returns_only_rows_changed_since_the_version(self, horizon):
+        changes = self.sync('1.0')['changes']
+        self.assertEqual(changes['tools']['upserted'][0]['tool_name'], 'Old Ladder')
+
+        # Everything in a test shares one transaction, so start after its last change
+        last = ChangeLog.objects.order_by('-change_id').first()
+        version = f'{last.xid}.{last.change_id}'
+        material = DimMaterial.objects.create(material_name='Rebar', unit_of_measure='each')
+        DimMaterial.objects.filter(pk=material.pk).update(brand='SteelCo')
+        FactInventoryTransactions.objects.create(date=self.date, material=material, quantity_change=Decimal('12'),
+                                                 transaction_type='Purchase')
+        tool_id = self.tool.pk
+        self.tool.delete()
+
+        changes = self.sync(version)['changes']
+        self.assertEqual(set(changes), {'materials', 'transactions', 'stock', 'tools'})
+        self.assertEqual([(row['material_name'], row['brand']) for row in changes['materials']['upserted']],
+                         [('Rebar', 'SteelCo')])
+        self.assertEqual(changes['stock']['upserted'], [{'material_id': material.pk, 'current_stock': Decimal('12')}])
+        self.assertEqual(changes['tools'], {'upserted': [], 'deleted': [tool_id]})
+        self.assertEqual(self.sync(self.sync(version)['version'])['changes'], {})
+
+    def test_pages_through_large_change_sets(self, horizon):
+        for index in range(3):
+            DimDiscipline.objects.create(discipline_name=f'Trade {index}')
+        version, names = '1.0', []
+        while True:
+            batch = self.sync(version, limit=2)
+            names += [row['discipline_name'] for row in batch['changes'].get('disciplines', {}).get('upserted', [])]
+            version = batch['version']
+            if not batch['has_more']:
+                break
+        self.assertEqual(names, ['Trade 0', 'Trade 1', 'Trade 2'])
+
+    def test_rejects_unknown_versions(self, horizon):
+        self.assertEqual(self.client.get('/api/sync/?since=yesterday').status_code, 400)
+
+    def latest_version(self):
+        last = ChangeLog.objects.order_by('-change_id').first()
+        return f'{last.xid}.{last.change_id}'
+
+    def test_clearing_the_alert_flag_is_not_a_stock_change(self, horizon):
+        material = DimMaterial.objects.create(material_name='Rebar', unit_of_measure='each')
+        FactInventoryTransactions.objects.create(date=self.date, material=material, quantity_change=Decimal('12'),
+                                                 transaction_type='Purchase')
+        version = self.latest_version()
+        evaluate_stock_alerts()
+        self.assertFalse(MaterialStock.objects.get(pk=material.pk).alert_pending)
+        self.assertEqual(self.sync(version)['changes'], {})
+
+    def test_versions_before_the_pruned_changes_are_gone(self, horizon):
+        for name in ('Painted Ladder', 'Short Ladder'):
+            DimTool.objects.filter(pk=self.tool.pk).update(tool_name=name)
+        call_command('prune_changelog', '--days', '1', stdout=io.StringIO())
+        self.assertEqual(ChangeLog.objects.filter(table_name='dimtool', row_id=self.tool.pk).count(), 1)
+
+        version = self.latest_version()
+        call_command('prune_changelog', '--days', '0', stdout=io.StringIO())
+        self.assertFalse(ChangeLog.objects.exists())
+        self.assertEqual(self.client.get('/api/sync/', {'since': '1.0'}).status_code, 410)
+        self.assertEqual(self.sync(version)['changes'], {})
+
+
+class DateDimensionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.material = DimMaterial.objects.create(material_name='Grout', unit_of_measure='bag')
+
+    def setUp(self):
+        # The snapshot may hold days created by earlier, rolled back tests
+        clear_calendar()
+        self.client.force_authenticate(self.user)
+
+    def test_populate_dimdate_is_idempotent(self):
+        out = io.StringIO()
+        call_command('populate_dimdate', start_date=datetime.date(2024, 2, 1), end_date=datetime.date(2024, 3, 31), stdout=out)
+        self.assertIn('Added 60 days', out.getvalue())
+        call_command('populate_dimdate', start_date=datetime.date(2024, 1, 1), end_date=datetime.date(2024, 3, 31), stdout=out)
+        self.assertIn('Added 31 days', out.getvalue())
+        leap_day = DimDate.objects.get(date_id=20240229)
+        self.assertEqual((leap_day.weekday_name, leap_day.weekday_number, leap_day.quarter_name), ('Thursday', 5, 'Q1'))
+        self.assertEqual(CalendarDay.from_id(20240229).as_model().month_name, leap_day.month_name)
+
+    def test_bulk_upload_creates_missing_days(self):
+        rows = [
+            {'date_id': 20251103, 'material_id': self.material.pk, 'quantity_change': '4', 'transaction_type': 'Purchase'},
+            {'date_id': 20251340, 'material_id': self.material.pk, 'quantity_change': '1', 'transaction_type': 'Purchase'},
+        ]
+        response = self.client.post('/api/transactions/bulk/', rows, format='json')
+        self.assertEqual(response.data['created'], 1)
+        self.assertIn('not a valid YYYYMMDD date', str(response.data['errors']))
+        self.assertTrue(DimDate.objects.filter(date_id=20251103, month_name='November').exists())
+
+    def test_transactions_render_dates_without_joining_dimdate(self):
+        FactInventoryTransactions.objects.create(date_id=20251104, material=self.material,
+                                                 quantity_change=Decimal('2'), transaction_type='Purchase')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/transactions/')
+        self.assertEqual(response.data['results'][0]['date'], {'date_id': 20251104, 'full_date': '2025-11-04'})
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        cls.token = Token.objects.create(user=cls.user)
+        DimDiscipline.objects.create(discipline_name='Masonry')
+
+    def setUp(self):
+        token_cache.clear()
+        token_cache.reset_stats()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/api/disciplines/').status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/disciplines/').status_code, 200)
+        stats = token_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+
+    def test_deactivated_users_are_rejected_at_once(self):
+        self.assertEqual(self.client.get('/api/disciplines/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/disciplines/').status_code, 401)
+
+    def test_deleted_tokens_are_rejected_at_once(self):
+        self.assertEqual(self.client.get('/api/disciplines/').status_code, 200)
+        Token.objects.filter(pk=self.token.pk).delete()
+        self.assertEqual(self.client.get('/api/disciplines/').status_code, 401)
+
+    def test_user_cached_before_the_commit_is_dropped_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # A concurrent request still seeing the old row caches it again
+            token_cache.set(self.token.key, get_user_model().objects.get(pk=self.user.pk))
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    def test_permission_caches_are_not_shared_between_requests(self):
+        self.assertEqual(self.client.get('/api/disciplines/').status_code, 200)
+        first = CachedTokenAuthentication().authenticate_credentials(self.token.key)[0]
+        self.assertFalse(first.has_perm('inventory.delete_dimdiscipline'))
+        self.user.user_permissions.add(Permission.objects.get(codename='delete_dimdiscipline'))
+        second = CachedTokenAuthentication().authenticate_credentials(self.token.key)[0]
+        self.assertIsNot(second, first)
+        self.assertTrue(second.has_perm('inventory.delete_dimdiscipline'))
+
+
+@unittest.skipIf(pyarrow is None, 'PyArrow is not installed')
+class ColumnarExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        material = DimMaterial.objects.create(material_name='Joist Hangers', unit_of_measure='each')
+        date = make_date(datetime.date(2025, 8, 1))
+        cls.first, cls.second = [
+            FactInventoryTransactions.objects.create(date=date, material=material, quantity_change=Decimal(quantity),
+                                                     transaction_type=transaction_type)
+            for quantity, transaction_type in (('50', 'Purchase'), ('-5', 'Usage'))
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def set_inserted_xid(self, xid, *transactions):
+        # Everything in a test shares one transaction, so stand in for separate writers
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE factinventorytransactions SET inserted_xid = %s WHERE transaction_id = ANY(%s)',
+                           [xid, [transaction.pk for transaction in transactions]])
+
+    def test_incremental_export_appends_only_new_transactions(self):
+        self.set_inserted_xid(10, self.first, self.second)
+        with tempfile.TemporaryDirectory() as directory:
+            # A lower transaction_id whose transaction is still open during the first run
+            late, added = [
+                FactInventoryTransactions.objects.create(
+                    date_id=20250801, material=self.first.material, quantity_change=Decimal(quantity),
+                    transaction_type='Usage',
+                )
+                for quantity in ('-1', '-2')
+            ]
+            self.set_inserted_xid(15, late)
+            self.set_inserted_xid(12, added)
+            with mock.patch('inventory.sync.snapshot_horizon', return_value=13):
+                call_command('export_columnar', directory, stdout=io.StringIO())
+            dates = parquet.read_table(os.path.join(directory, 'dimdate.parquet'))
+            self.assertEqual(dates.column('date_id').to_pylist(), [20250801])
+            first_part = parquet.read_table(os.path.join(directory, 'factinventorytransactions', 'part-00000.parquet'))
+            self.assertEqual(first_part.column('transaction_id').to_pylist(), [self.first.pk, self.second.pk, added.pk])
+
+            with mock.patch('inventory.sync.snapshot_horizon', return_value=20):
+                call_command('export_columnar', directory, '--incremental', stdout=io.StringIO())
+            with open(os.path.join(directory, 'manifest.json')) as manifest_file:
+                facts = json.load(manifest_file)['tables']['factinventorytransactions']
+            self.assertEqual((facts['rows'], facts['horizon'], len(facts['files'])), (4, 20, 2))
+
+            part = parquet.read_table(os.path.join(directory, facts['files'][1]))
+            self.assertEqual(part.column('transaction_id').to_pylist(), [late.pk])
+            self.assertEqual(part.column('quantity_change').to_pylist(), [Decimal('-1.00')])
+            self.assertTrue(pyarrow.types.is_dictionary(part.schema.field('transaction_type').type))
+
+    @mock.patch('inventory.sync.snapshot_horizon', return_value=30)
+    def test_arrow_stream_endpoint_sends_transactions_since_horizon(self, snapshot_horizon):
+        self.set_inserted_xid(10, self.first)
+        self.set_inserted_xid(20, self.second)
+        response = self.client.get('/api/export/factinventorytransactions/?export_format=arrow&since=15')
+        self.assertEqual(response['X-Export-Horizon'], '30')
+        table = pyarrow.ipc.open_stream(b''.join(response.streaming_content)).read_all()
+        self.assertEqual(table.column('transaction_id').to_pylist(), [self.second.pk])
+        self.assertEqual(table.column('transaction_type').to_pylist(), ['Usage'])
+
+    def test_unknown_table_is_not_found(self):
+        self.assertEqual(self.client.get('/api/export/auth_user/').status_code, 404)
+
+
+# The test database stands in for the replica, so a routed read shows up as 'default'
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaRoutingTests(APITestCase):
+
+    def setUp(self):
+        reset_lag_checks()
+        caches['default'].clear()
+
+    def route(self, method, path, **extra):
+        """Returns the read alias a request to path is served with (None: the primary)."""
+        seen = []
+        middleware = replica_middleware(lambda request: seen.append(read_alias()) or HttpResponse())
+        middleware(getattr(APIRequestFactory(), method)(path, **extra))
+        return seen[0]
+
+    def test_safe_api_reads_use_a_replica(self):
+        self.assertEqual(replica_lag('default'), 0)
+        self.assertEqual(self.route('get', '/api/materials/'), 'default')
+        self.assertEqual(self.route('get', '/api/export/dimdate/'), 'default')
+        self.assertIsNone(self.route('get', '/api/alerts/'))
+        self.assertIsNone(self.route('get', '/admin/'))
+
+    def test_writing_client_reads_its_writes_from_the_primary(self):
+        self.assertIsNone(self.route('post', '/api/transactions/', HTTP_AUTHORIZATION='Token writer'))
+        self.assertIsNone(self.route('get', '/api/materials/', HTTP_AUTHORIZATION='Token writer'))
+        self.assertEqual(self.route('get', '/api/materials/', HTTP_AUTHORIZATION='Token reader'), 'default')
+
+    def test_write_pin_lasts_from_the_end_of_the_write(self):
+        def slow_write(request):
+            # The pin set before the write has expired by the time it commits
+            caches['default'].clear()
+            return HttpResponse()
+
+        def write():
+            return APIRequestFactory().post('/api/transactions/', HTTP_AUTHORIZATION='Token writer')
+
+        replica_middleware(slow_write)(write())
+        self.assertIsNone(self.route('get', '/api/materials/', HTTP_AUTHORIZATION='Token writer'))
+        async_to_sync(replica_middleware(sync_to_async(slow_write)))(write())
+        self.assertIsNone(self.route('get', '/api/materials/', HTTP_AUTHORIZATION='Token writer'))
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        with mock.patch('inventory.replicas.replica_lag', return_value=30.0):
+            self.assertIsNone(self.route('get', '/api/materials/'))
+
+    def test_router_keeps_auth_tables_on_the_primary(self):
+        router = ReplicaRouter()
+        with reading_from('replica_1'):
+            self.assertEqual(router.db_for_read(DimMaterial), 'replica_1')
+            self.assertIsNone(router.db_for_read(Token))
+        self.assertIsNone(router.db_for_read(DimMaterial))
+
+
+class ValuationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tester', password='unused')
+        discipline = DimDiscipline.objects.create(discipline_name='Concrete')
+        cls.rebar = DimMaterial.objects.create(material_name='Rebar #4', unit_of_measure='each', discipline=discipline)
+        for day, quantity, cost in ((2, '10', '2.00'), (3, '10', '4.00'), (4, '-15', None)):
+            cls.add(day, quantity, cost)
+
+    @classmethod
+    def add(cls, day, quantity, cost):
+        date = DimDate.objects.filter(date_id=20250600 + day).first() or make_date(datetime.date(2025, 6, day))
+        FactInventoryTransactions.objects.create(
+            date=date, material=cls.rebar, quantity_change=Decimal(quantity),
+            cost_per_unit=Decimal(cost) if cost else None,
+            transaction_type='Purchase' if cost else 'Usage',
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # Fact writes only flag the material; the API values it after commit
+        self.assertEqual(update_valuations(), 1)
+
+    def values(self):
+        valuation = MaterialValuation.objects.get(material=self.rebar)
+        return valuation.quantity_on_hand, valuation.average_value, valuation.fifo_value
+
+    def test_inventory_value_under_each_method(self):
+        # 5 left: at the 3.00 average, or from the 4.00 receipt under FIFO
+        response = self.client.get('/api/materials/')
+        self.assertEqual(response.data['results'][0]['inventory_value'], '15.00')
+        response = self.client.get('/api/materials/?valuation_method=fifo')
+        self.assertEqual(response.data['results'][0]['inventory_value'], '20.00')
+        self.assertEqual(self.client.get('/api/materials/?valuation_method=lifo').status_code, 400)
+
+    def test_new_transactions_are_applied_to_the_saved_layers(self):
+        self.add(5, '5', '6.00')
+        self.assertFalse(MaterialValuation.objects.get(material=self.rebar).replay_required)
+        update_valuations()
+        self.assertEqual(self.values(), (Decimal('10.00'), Decimal('45.00'), Decimal('50.00')))
+        self.assertEqual(self.rebar.cost_layers.count(), 2)
+
+    def test_load_transactions_command_values_the_loaded_rows(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as upload:
+            upload.write('date_id,material_id,quantity_change,cost_per_unit,transaction_type\n')
+            upload.write(f'20250605,{self.rebar.pk},5,6.00,Purchase\n')
+            upload.flush()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('load_transactions', upload.name, stdout=io.StringIO())
+        self.assertEqual(self.values(), (Decimal('10.00'), Decimal('45.00'), Decimal('50.00')))
+
+    def test_back_dated_transaction_replays_the_history(self):
+        self.add(1, '10', '1.00')
+        self.assertTrue(MaterialValuation.objects.get(material=self.rebar).replay_required)
+        update_valuations()
+        self.assertEqual(self.values(), (Decimal('15.00'), Decimal('35.00'), Decimal('50.00')))
+
+    def test_write_values_only_its_own_material(self):
+        other = DimMaterial.objects.create(material_name='Wire Mesh', unit_of_measure='roll')
+        MaterialValuation.objects.create(material=other, valuation_pending=True, replay_required=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add(5, '5', '6.00')
+        self.assertEqual(self.values(), (Decimal('10.00'), Decimal('45.00'), Decimal('50.00')))
+        self.assertTrue(MaterialValuation.objects.get(material=other).valuation_pending)
+
+    def test_totals_by_discipline(self):
+        row, = self.client.get('/api/valuation/by-discipline/').data
+        self.assertEqual((row['discipline_name'], row['materials'], row['weighted_average'], row['fifo'], row['pending']),
+                         ('Concrete', 1, Decimal('15.00'), Decimal('20.00'), 0))
@@ -0,0 +1,116 @@
+# toolstate.py
+#
+# Rebuild and verification for the trigger-maintained toolstate table (see
+# migration 0008). Both use toolstate_compute(), the same SQL function the
+# triggers refresh touched tools with, unless a statement only appends
+# movements after a tool's saved state, which are applied on top of it (see
+# migration 0019).
+#
+# archive_partitions() carries each tool's archived history forward into
+# archivedtoolstate (see carry_forward_tool_state), which toolstate_compute()
+# continues from (see migration 0017).
+
+import datetime
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .models import DimTool
+
+STATE_COLUMNS = [
+    'is_checked_out', 'holder', 'checked_out_since', 'last_movement_date',
+    'last_transaction_id', 'usage_days', 'transaction_count',
+]
+ALL_TOOL_IDS_SQL = """
+    SELECT array_agg(DISTINCT tool_id) FROM (
+        SELECT tool_id FROM factinventorytransactions WHERE tool_id IS NOT NULL
+        UNION ALL
+        SELECT tool_id FROM archivedtoolstate
+    ) AS tools
+"""
+
+# Folds the movements in {source} (the partitions being archived) into each
+# tool's archived state: its last movement, and the usage days and count of
+# everything before. A checkout left open by the previous archive is closed
+# by the tool's first movement in {source}.
+CARRY_FORWARD_SQL = """
+    WITH moves AS (
+        SELECT tool_id, date_id, transaction_id, quantity_change, notes, usage_days, transaction_count,
+               LEAD(date_id) OVER (PARTITION BY tool_id ORDER BY date_id, transaction_id) AS next_date_id,
+               ROW_NUMBER() OVER (PARTITION BY tool_id ORDER BY date_id DESC, transaction_id DESC) AS recency
+        FROM (
+            SELECT tool_id, last_date_id AS date_id, last_transaction_id AS transaction_id,
+                   last_quantity_change AS quantity_change, last_notes AS notes, usage_days, transaction_count
+            FROM archivedtoolstate
+            UNION ALL
+            SELECT tool_id, date_id, transaction_id, quantity_change, notes, 0, 1
+            FROM ({source}) AS f
+            WHERE tool_id IS NOT NULL
+        ) AS history
+    )
+    INSERT INTO archivedtoolstate (
+        tool_id, last_date_id, last_transaction_id, last_quantity_change, last_notes, usage_days, transaction_count
+    )
+    SELECT tool_id,
+           MAX(date_id) FILTER (WHERE recency = 1),
+           MAX(transaction_id) FILTER (WHERE recency = 1),
+           MAX(quantity_change) FILTER (WHERE recency = 1),
+           MAX(notes) FILTER (WHERE recency = 1),
+           SUM(usage_days) + COALESCE(SUM(to_date(next_date_id::text, 'YYYYMMDD') - to_date(date_id::text, 'YYYYMMDD'))
+                                      FILTER (WHERE quantity_change < 0), 0),
+           SUM(transaction_count)
+    FROM moves
+    GROUP BY tool_id
+    ON CONFLICT (tool_id) DO UPDATE
+    SET last_date_id = EXCLUDED.last_date_id,
+        last_transaction_id = EXCLUDED.last_transaction_id,
+        last_quantity_change = EXCLUDED.last_quantity_change,
+        last_notes = EXCLUDED.last_notes,
+        usage_days = EXCLUDED.usage_days,
+        transaction_count = EXCLUDED.transaction_count
+"""
+
+
+def rebuild_tool_state():
+    """Recomputes toolstate for every tool, archived history included; returns the rows written."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('LOCK TABLE factinventorytransactions IN SHARE MODE')
+        cursor.execute('DELETE FROM toolstate')
+        cursor.execute(f'SELECT toolstate_refresh(({ALL_TOOL_IDS_SQL}))')
+        cursor.execute('SELECT COUNT(*) FROM toolstate')
+        return cursor.fetchone()[0]
+
+
+def find_tool_state_drift():
+    """Returns the tool_ids whose toolstate row is missing, stale or orphaned."""
+    differs = ' OR '.join(f'state.{column} IS DISTINCT FROM fresh.{column}' for column in STATE_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT COALESCE(state.tool_id, fresh.tool_id)
+            FROM toolstate AS state
+            FULL OUTER JOIN toolstate_compute(({ALL_TOOL_IDS_SQL})) AS fresh ON fresh.tool_id = state.tool_id
+            WHERE state.tool_id IS NULL OR fresh.tool_id IS NULL OR {differs}
+            ORDER BY 1
+        """)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def carry_forward_tool_state(cursor, source):
+    """Adds the transactions selected by the SQL source to the archived tool state."""
+    cursor.execute(CARRY_FORWARD_SQL.format(source=source))
+
+
+def available_tools(discipline_id=None):
+    """Tools not currently checked out; the exclusion reads only toolstate_checked_out_idx."""
+    queryset = DimTool.objects.select_related('discipline', 'state').exclude(state__is_checked_out=True)
+    if discipline_id is not None:
+        queryset = queryset.filter(discipline_id=discipline_id)
+    return queryset.order_by('tool_name', 'tool_id')
+
+
+def overdue_maintenance(interval_days, today=None):
+    """Tools never maintained, last maintained more than interval_days ago, or not calibrated."""
+    cutoff = (today or datetime.date.today()) - datetime.timedelta(days=interval_days)
+    return DimTool.objects.select_related('discipline', 'state').filter(
+        Q(last_maintenance_date__lt=cutoff) | Q(last_maintenance_date__isnull=True) | Q(is_calibrated=False)
+    ).order_by(F('last_maintenance_date').asc(nulls_first=True), 'tool_id')
@@ -1,18 +1,46 @@
 from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
-from .views import MaterialViewSet, DisciplineViewSet, ToolViewSet, FactInventoryTransactionsViewSet
+from . import async_views
+from .views import MaterialViewSet, DisciplineViewSet, ToolViewSet, FactInventoryTransactionsViewSet, AnalyticsViewSet, DateViewSet, DatabasePoolMetricsView, AuthCacheMetricsView
+from .views import MaterialReorderPolicyViewSet, StockAlertViewSet, ForecastViewSet, SyncView, ColumnarExportView, ValuationViewSet
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
 # Explicitly provide basename for MaterialViewSet because it uses get_queryset()
 router.register(r'materials', MaterialViewSet, basename='materials')
 router.register(r'disciplines', DisciplineViewSet)
+router.register(r'dates', DateViewSet)
 router.register(r'tools', ToolViewSet)
 router.register(r'transactions', FactInventoryTransactionsViewSet)
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+router.register(r'reorder-policies', MaterialReorderPolicyViewSet)
+router.register(r'alerts', StockAlertViewSet)
+router.register(r'forecasts', ForecastViewSet)
+router.register(r'valuation', ValuationViewSet, basename='valuation')
+
+# Async (ASGI) read path for the hot endpoints: list and detail only
+async_routes = [
+    ('materials', async_views.AsyncMaterialView),
+    ('transactions', async_views.AsyncTransactionView),
+    ('disciplines', async_views.AsyncDisciplineView),
+    ('dates', async_views.AsyncDateView),
+    ('tools', async_views.AsyncToolView),
+]
+async_urlpatterns = []
+for prefix, view in async_routes:
+    async_urlpatterns += [
+        path(f'{prefix}/', view.as_view(), name=f'async-{prefix}-list'),
+        path(f'{prefix}/<int:pk>/', view.as_view(), name=f'async-{prefix}-detail'),
+    ]
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/', include(async_urlpatterns)),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('export/<str:table>/', ColumnarExportView.as_view(), name='columnar-export'),
+    path('metrics/db-pool/', DatabasePoolMetricsView.as_view(), name='db-pool-metrics'),
+    path('metrics/auth-cache/', AuthCacheMetricsView.as_view(), name='auth-cache-metrics'),
     path('token/', obtain_auth_token, name='api_token_auth'),
 ]
@@ -0,0 +1,370 @@
+# valuation.py
+#
+# Inventory valuation under the weighted-average (perpetual moving average)
+# and FIFO cost methods. Each material's valuation state (quantity, average
+# unit cost, last movement valued) is kept in MaterialValuation and its open
+# FIFO receipts in MaterialCostLayer, so new transactions are applied on top
+# of the saved state instead of replaying the whole history.
+#
+# The fact table triggers (see migration 0013) flag the materials to value.
+# update_valuations claims flagged materials in batches (FOR UPDATE SKIP
+# LOCKED, so concurrent runs split the work), reads only the transactions
+# after each one's last valued movement, or its whole history when a replay is
+# required, and writes back the state and layers. rebuild_valuations flags
+# every material for a replay and drains the flags from several processes.
+# archive_partitions carries each material's state after its archived
+# movements forward (see carry_forward), and replays start from there.
+#
+# Movements are applied in (date_id, transaction_id) order. A receipt is
+# costed at its cost_per_unit, else total_cost / quantity, else (e.g. a return
+# without a cost) at the current average cost. An issue leaves the average
+# cost unchanged and consumes FIFO layers oldest first; an issue beyond the
+# stock on hand leaves a negative layer at the average cost, settled by the
+# next receipts. The average cost is rounded to 4 places at every receipt, so
+# incremental updates and replays give identical results.
+
+import json
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import cache
+from .models import MaterialValuation
+from .processes import map_in_processes
+
+WEIGHTED_AVERAGE = 'weighted_average'
+FIFO = 'fifo'
+METHODS = {WEIGHTED_AVERAGE: 'average_value', FIFO: 'fifo_value'}
+
+VALUATION_BATCH_SIZE = 500
+COST_PLACES = Decimal('0.0001')
+CENTS = Decimal('0.01')
+ZERO = Decimal('0')
+
+CLAIM_SQL = """
+    SELECT material_id, replay_required, quantity_on_hand, average_unit_cost, last_date_id, last_transaction_id
+    FROM materialvaluation
+    WHERE valuation_pending AND (%(material_ids)s::int[] IS NULL OR material_id = ANY(%(material_ids)s))
+    ORDER BY material_id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+"""
+
+LAYERS_SQL = """
+    SELECT material_id, date_id, transaction_id, quantity_remaining, unit_cost
+    FROM materialcostlayer
+    WHERE material_id = ANY(%s)
+    ORDER BY material_id, date_id, transaction_id
+"""
+
+# Each material's transactions after its watermark, an index range scan on
+# fact_material_date_idx per material
+MOVEMENTS_SQL = """
+    SELECT f.material_id, f.date_id, f.transaction_id, f.quantity_change, f.cost_per_unit, f.total_cost
+    FROM unnest(%s::int[], %s::int[], %s::int[]) AS w(material_id, date_id, transaction_id)
+    JOIN factinventorytransactions AS f
+      ON f.material_id = w.material_id
+     AND (f.date_id, f.transaction_id) > (w.date_id, w.transaction_id)
+    ORDER BY f.material_id, f.date_id, f.transaction_id
+"""
+
+ARCHIVED_STATE_SQL = """
+    SELECT material_id, quantity, average_unit_cost, last_date_id, last_transaction_id, cost_layers
+    FROM archivedmaterialtotals
+    WHERE material_id = ANY(%s) AND last_date_id IS NOT NULL
+"""
+
+SAVE_ARCHIVED_STATE_SQL = """
+    INSERT INTO archivedmaterialtotals AS a
+        (material_id, average_unit_cost, last_date_id, last_transaction_id, cost_layers)
+    SELECT material_id, average_unit_cost, last_date_id, last_transaction_id, cost_layers::jsonb
+    FROM unnest(%s::int[], %s::numeric[], %s::int[], %s::int[], %s::text[])
+        AS r(material_id, average_unit_cost, last_date_id, last_transaction_id, cost_layers)
+    ON CONFLICT (material_id) DO UPDATE
+    SET average_unit_cost = EXCLUDED.average_unit_cost,
+        last_date_id = EXCLUDED.last_date_id,
+        last_transaction_id = EXCLUDED.last_transaction_id,
+        cost_layers = EXCLUDED.cost_layers
+"""
+
+SAVE_STATE_SQL = """
+    UPDATE materialvaluation AS v
+    SET quantity_on_hand = r.quantity_on_hand,
+        average_unit_cost = r.average_unit_cost,
+        average_value = r.average_value,
+        fifo_value = r.fifo_value,
+        last_date_id = r.last_date_id,
+        last_transaction_id = r.last_transaction_id,
+        valuation_pending = false,
+        replay_required = false,
+        updated_at = now()
+    FROM unnest(%s::int[], %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[], %s::int[], %s::int[])
+        AS r(material_id, quantity_on_hand, average_unit_cost, average_value, fifo_value,
+             last_date_id, last_transaction_id)
+    WHERE v.material_id = r.material_id
+"""
+
+SAVE_LAYERS_SQL = """
+    INSERT INTO materialcostlayer (material_id, date_id, transaction_id, quantity_remaining, unit_cost)
+    SELECT * FROM unnest(%s::int[], %s::int[], %s::int[], %s::numeric[], %s::numeric[])
+"""
+
+
+@dataclass
+class CostState:
+    quantity: Decimal = ZERO
+    average_cost: Decimal = ZERO
+    last_date_id: int = None
+    last_transaction_id: int = None
+    # [date_id, transaction_id, quantity_remaining, unit_cost], oldest first
+    layers: deque = field(default_factory=deque)
+
+    def apply(self, date_id, transaction_id, quantity_change, cost_per_unit, total_cost):
+        if quantity_change > 0:
+            if cost_per_unit is not None:
+                unit_cost = cost_per_unit
+            elif total_cost is not None:
+                unit_cost = (abs(total_cost) / quantity_change).quantize(COST_PLACES, ROUND_HALF_UP)
+            else:
+                unit_cost = self.average_cost
+            self.receive(date_id, transaction_id, quantity_change, unit_cost)
+        elif quantity_change < 0:
+            self.issue(date_id, transaction_id, -quantity_change)
+        self.last_date_id, self.last_transaction_id = date_id, transaction_id
+
+    def receive(self, date_id, transaction_id, quantity, unit_cost):
+        if self.quantity > 0:
+            total = self.quantity * self.average_cost + quantity * unit_cost
+            self.average_cost = (total / (self.quantity + quantity)).quantize(COST_PLACES, ROUND_HALF_UP)
+        else:
+            self.average_cost = Decimal(unit_cost).quantize(COST_PLACES, ROUND_HALF_UP)
+        self.quantity += quantity
+
+        # Stock issued while there was none is settled first
+        while quantity and self.layers and self.layers[0][2] < 0:
+            settled = min(quantity, -self.layers[0][2])
+            self.layers[0][2] += settled
+            quantity -= settled
+            if not self.layers[0][2]:
+                self.layers.popleft()
+        if quantity:
+            self.layers.append([date_id, transaction_id, quantity, unit_cost])
+
+    def issue(self, date_id, transaction_id, quantity):
+        self.quantity -= quantity
+        while quantity and self.layers and self.layers[0][2] > 0:
+            consumed = min(quantity, self.layers[0][2])
+            self.layers[0][2] -= consumed
+            quantity -= consumed
+            if not self.layers[0][2]:
+                self.layers.popleft()
+        if quantity:
+            if self.layers:
+                self.layers[-1][2] -= quantity
+            else:
+                self.layers.append([date_id, transaction_id, -quantity, self.average_cost])
+
+    @property
+    def average_value(self):
+        return (self.quantity * self.average_cost).quantize(CENTS, ROUND_HALF_UP)
+
+    @property
+    def fifo_value(self):
+        return sum((layer[2] * layer[3] for layer in self.layers), ZERO).quantize(CENTS, ROUND_HALF_UP)
+
+
+def _claim(cursor, batch_size, material_ids=None):
+    """Locks up to batch_size flagged materials; returns {material_id: CostState} to continue from."""
+    cursor.execute(CLAIM_SQL, {'material_ids': material_ids, 'limit': batch_size})
+    states, replays = {}, []
+    for material_id, replay, quantity, average_cost, last_date_id, last_transaction_id in cursor.fetchall():
+        if replay:
+            replays.append(material_id)
+        else:
+            states[material_id] = CostState(quantity, average_cost, last_date_id, last_transaction_id)
+    continued = [material_id for material_id, state in states.items() if state.last_date_id is not None]
+    if continued:
+        cursor.execute(LAYERS_SQL, [continued])
+        for material_id, date_id, transaction_id, quantity, unit_cost in cursor.fetchall():
+            states[material_id].layers.append([date_id, transaction_id, quantity, unit_cost])
+    states.update(_archived_states(cursor, replays))
+    return states
+
+
+def _archived_states(cursor, material_ids):
+    """Returns {material_id: CostState} after each material's archived movements, if any."""
+    states = {material_id: CostState() for material_id in material_ids}
+    if material_ids:
+        cursor.execute(ARCHIVED_STATE_SQL, [material_ids])
+        for material_id, quantity, average_cost, last_date_id, last_transaction_id, layers in cursor.fetchall():
+            states[material_id] = CostState(quantity, average_cost, last_date_id, last_transaction_id, deque(
+                [date_id, transaction_id, Decimal(remaining), Decimal(unit_cost)]
+                for date_id, transaction_id, remaining, unit_cost in json.loads(layers)
+            ))
+    return states
+
+
+def _replay(states, sql, params):
+    """Applies the movements sql selects, ordered by material, date and transaction, to states."""
+    # A server-side cursor, since a replay may read a long history
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = iter(lambda: cursor.fetchmany(VALUATION_BATCH_SIZE * 10), [])
+        movements = (row for chunk in rows for row in chunk)
+        for material_id, material_rows in groupby(movements, key=lambda row: row[0]):
+            state = states[material_id]
+            for _, date_id, transaction_id, quantity_change, cost_per_unit, total_cost in material_rows:
+                state.apply(date_id, transaction_id, quantity_change, cost_per_unit, total_cost)
+
+
+def _apply_movements(states):
+    material_ids = list(states)
+    watermarks = [states[material_id] for material_id in material_ids]
+    _replay(states, MOVEMENTS_SQL, [
+        material_ids,
+        [state.last_date_id or 0 for state in watermarks],
+        [state.last_transaction_id or 0 for state in watermarks],
+    ])
+
+
+def carry_forward(cursor, source):
+    """
+    Applies the transactions selected by the SQL source (the partitions being
+    archived, all older than the attached ones) on top of each material's
+    archived state, which replays then start from.
+    """
+    cursor.execute(f'SELECT DISTINCT material_id FROM ({source}) AS f WHERE material_id IS NOT NULL')
+    states = _archived_states(cursor, [row[0] for row in cursor.fetchall()])
+    if not states:
+        return
+    _replay(states, f"""
+        SELECT material_id, date_id, transaction_id, quantity_change, cost_per_unit, total_cost
+        FROM ({source}) AS f
+        WHERE material_id IS NOT NULL
+        ORDER BY material_id, date_id, transaction_id
+    """, [])
+    material_ids = list(states)
+    values = [states[material_id] for material_id in material_ids]
+    cursor.execute(SAVE_ARCHIVED_STATE_SQL, [
+        material_ids,
+        [state.average_cost for state in values],
+        [state.last_date_id for state in values],
+        [state.last_transaction_id for state in values],
+        [json.dumps([[date_id, transaction_id, str(remaining), str(unit_cost)]
+                     for date_id, transaction_id, remaining, unit_cost in state.layers]) for state in values],
+    ])
+
+
+def _save(cursor, states):
+    material_ids = list(states)
+    values = [states[material_id] for material_id in material_ids]
+    cursor.execute(SAVE_STATE_SQL, [
+        material_ids,
+        [state.quantity for state in values],
+        [state.average_cost for state in values],
+        [state.average_value for state in values],
+        [state.fifo_value for state in values],
+        [state.last_date_id for state in values],
+        [state.last_transaction_id for state in values],
+    ])
+    cursor.execute('DELETE FROM materialcostlayer WHERE material_id = ANY(%s)', [material_ids])
+    layers = [(material_id, *layer) for material_id in material_ids for layer in states[material_id].layers]
+    if layers:
+        cursor.execute(SAVE_LAYERS_SQL, [list(column) for column in zip(*layers)])
+
+
+def update_valuations(batch_size=VALUATION_BATCH_SIZE, material_ids=None, max_batches=None):
+    """
+    Values the flagged materials (only those in material_ids, if given), batch
+    by batch, stopping after max_batches; returns the number of materials valued.
+    """
+    valued = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic(), connection.cursor() as cursor:
+            states = _claim(cursor, batch_size, material_ids)
+            if not states:
+                break
+            _apply_movements(states)
+            _save(cursor, states)
+        valued += len(states)
+        batches += 1
+    if valued:
+        # Materials list responses carry inventory_value
+        cache.invalidate(cache.STOCK)
+    return valued
+
+
+def update_on_commit(material_ids=None, using=None):
+    """
+    Values material_ids, or else one batch of flagged materials, once the
+    current transaction commits (straight away in autocommit mode). This runs
+    in a request's response path, so a backlog (after the migration or a load
+    that bypassed the API) is left to `manage.py rebuild_valuations --pending-only`.
+    """
+    material_ids = list(material_ids) if material_ids is not None else None
+    max_batches = None if material_ids is not None else 1
+    transaction.on_commit(
+        lambda: update_valuations(material_ids=material_ids, max_batches=max_batches), using=using, robust=True,
+    )
+
+
+def rebuild_valuations(workers=None, batch_size=VALUATION_BATCH_SIZE):
+    """
+    Revalues every material from its full history. Worker processes claim
+    batches of materials until none are left; workers=0 does all of it in
+    this process. Returns the number of materials valued.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO materialvaluation (material_id, valuation_pending, replay_required, updated_at)
+            SELECT material_id, true, true, now() FROM dimmaterial
+            ON CONFLICT (material_id) DO UPDATE SET valuation_pending = true, replay_required = true
+        """)
+    if workers == 0:
+        return update_valuations(batch_size)
+
+    workers = workers or os.cpu_count()
+    valued = sum(map_in_processes(update_valuations, [(batch_size,)] * workers, workers))
+    cache.invalidate(cache.STOCK)
+    return valued
+
+
+def valuation_field(method=None):
+    """The MaterialValuation field holding the value under method (default settings.INVENTORY_VALUATION_METHOD)."""
+    return METHODS[method or settings.INVENTORY_VALUATION_METHOD]
+
+
+def _total(name):
+    return Coalesce(Sum(name), Value(ZERO), output_field=DecimalField())
+
+
+# Aggregates over MaterialValuation rows: quantity and value under each method
+# (named differently from the model fields, which annotate() requires);
+# pending counts materials with transactions not valued yet
+TOTALS = {
+    'materials': Count('material'),
+    'quantity': _total('quantity_on_hand'),
+    **{method: _total(value_field) for method, value_field in METHODS.items()},
+    'pending': Count('material', filter=Q(valuation_pending=True)),
+}
+
+
+def valuation_totals():
+    return MaterialValuation.objects.aggregate(**TOTALS)
+
+
+def valuation_by_discipline():
+    """Totals per discipline, materials without one last (discipline_id None)."""
+    return list(
+        MaterialValuation.objects
+        .values(discipline_id=F('material__discipline_id'), discipline_name=F('material__discipline__discipline_name'))
+        .annotate(**TOTALS)
+        .order_by(F('discipline_name').asc(nulls_last=True))
+    )
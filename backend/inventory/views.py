@@ -1,22 +1,100 @@
-from rest_framework import viewsets, permissions
+import datetime
+
+from rest_framework import viewsets, permissions, status
 from rest_framework import filters
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, OuterRef, Subquery # NEW IMPORTS
-from django.db import models
+from django.db.models import DecimalField, F, Value
+from django.conf import settings
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
-from .models import DimMaterial, DimDiscipline, DimTool, FactInventoryTransactions, DimDate
-from .serializers import MaterialSerializer, DisciplineSerializer, ToolSerializer, FactInventoryTransactionsSerializer, DateSerializer
+from .models import DimMaterial, DimDiscipline, DimTool, FactInventoryTransactions, DimDate, MaterialReorderPolicy, StockAlert, MaterialForecast
+from .serializers import MaterialSerializer, DisciplineSerializer, ToolSerializer, FactInventoryTransactionsSerializer, DateDetailSerializer, ToolWithStateSerializer
+from .serializers import MaterialReorderPolicySerializer, StockAlertSerializer, MaterialForecastSerializer
+from . import cache, columnar
+from .alerts import astream_alerts, evaluate_on_commit, stream_alerts
+from .analytics import summarize
+from .authentication import CachedTokenAuthentication, QueryParamTokenAuthentication, token_cache
+from .cache import CachedResponseMixin
+from .dbpool import pool_stats
+from .export import export_rows, serving_asgi, stream_csv, stream_ndjson, streaming_content
+from .ingest import ingest_transactions, iter_records
+from .pagination import AlertKeysetPagination, DateKeysetPagination, ForecastKeysetPagination, MaterialKeysetPagination, TransactionKeysetPagination
+from .performance import InstrumentedViewMixin
+from . import search, sync, valuation
+from .stock import date_id_for, material_stock_as_of
+from .toolstate import available_tools, overdue_maintenance
 
-# ViewSet for DimDiscipline (remains unchanged)
-class DisciplineViewSet(viewsets.ReadOnlyModelViewSet):
+# ViewSet for DimDiscipline
+class DisciplineViewSet(InstrumentedViewMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = DimDiscipline.objects.all()
     serializer_class = DisciplineSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_scopes = (cache.DISCIPLINES,)
+
+# ViewSet for DimDate (calendar lookups)
+class DateViewSet(InstrumentedViewMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = DimDate.objects.all()
+    serializer_class = DateDetailSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DateKeysetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        'date_id': ['exact', 'gte', 'lte'],
+        'full_date': ['exact', 'gte', 'lte'],
+        'year': ['exact'],
+        'quarter_number': ['exact'],
+        'month_number': ['exact'],
+    }
+    cache_scopes = (cache.DATES,)
+
+def material_queryset(as_of=None, valuation_method=None):
+    """
+    DimMaterial rows annotated with current_stock, or the stock at the end of
+    the as_of date, and the current inventory_value under valuation_method
+    (None with as_of, since only current values are kept).
+    """
+    if valuation_method and valuation_method not in valuation.METHODS:
+        raise ValidationError({'valuation_method': f"Must be one of: {', '.join(valuation.METHODS)}."})
+    if as_of:
+        try:
+            stock = material_stock_as_of(date_id_for(datetime.date.fromisoformat(as_of)))
+        except ValueError:
+            raise ValidationError({'as_of': 'Expected a date as YYYY-MM-DD.'})
+        inventory_value = Value(None, output_field=DecimalField())
+    else:
+        stock = F('stock__current_stock')
+        inventory_value = F(f'valuation__{valuation.valuation_field(valuation_method)}')
+
+    return DimMaterial.objects.select_related('discipline').annotate(
+        current_stock=stock,
+        inventory_value=inventory_value,
+    ).order_by('material_name')
+
+def search_response(view, target, queryset):
+    """Serializes the catalog search results for ?q= with their search_rank."""
+    try:
+        limit = max(1, min(int(view.request.query_params.get('limit', search.DEFAULT_LIMIT)), search.MAX_LIMIT))
+    except ValueError:
+        raise ValidationError({'limit': 'Must be an integer.'})
+    rows = list(search.search(queryset, target, view.request.query_params.get('q', ''), limit))
+    data = view.get_serializer(rows, many=True).data
+    for item, row in zip(data, rows):
+        item['search_rank'] = round(row.search_rank, 4)
+    return Response(data)
 
 # ViewSet for DimMaterial (OPTIMIZED FOR CURRENT_STOCK)
-class MaterialViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(InstrumentedViewMixin, CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = MaterialSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MaterialKeysetPagination
+    cache_scopes = (cache.MATERIALS, cache.DISCIPLINES, cache.STOCK)
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = {
         'discipline__discipline_id': ['exact'],
@@ -28,28 +106,32 @@ class MaterialViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """
-        Optimizes the queryset to include the current_stock for each material
-        by using a Subquery and Sum annotation.
-        """
-        stock_subquery = FactInventoryTransactions.objects.filter(
-            material=OuterRef('pk')
-        ).values('material').annotate(
-            total_stock=Sum('quantity_change')
-        ).values('total_stock')
+        Reads current_stock for each material from the trigger-maintained
+        MaterialStock ledger (a single primary-key join per row) instead of
+        summing FactInventoryTransactions on every request.
 
-        queryset = DimMaterial.objects.annotate(
-            current_stock=Subquery(stock_subquery, output_field=models.DecimalField()),
-        ).order_by('material_name')
+        With ?as_of=YYYY-MM-DD, current_stock is the stock at the end of that
+        day, computed from the nearest month-end checkpoint plus the
+        transactions dated after it.
+        """
+        queryset = material_queryset(self.request.query_params.get('as_of'),
+                                      self.request.query_params.get('valuation_method'))
 
         filtered_queryset = self.filter_queryset(queryset)
 
         return filtered_queryset
 
-# ViewSet for DimTool (remains unchanged)
-class ToolViewSet(viewsets.ModelViewSet):
-    queryset = DimTool.objects.all()
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """Ranked, prefix and typo-tolerant search: ?q=plywod&limit=20"""
+        return search_response(self, 'material', material_queryset())
+
+# ViewSet for DimTool
+class ToolViewSet(InstrumentedViewMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = DimTool.objects.select_related('discipline')
     serializer_class = ToolSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_scopes = (cache.TOOLS, cache.DISCIPLINES)
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = {
         'discipline__discipline_id': ['exact'],
@@ -59,11 +141,54 @@ class ToolViewSet(viewsets.ModelViewSet):
     search_fields = ['tool_name', 'tool_type', 'brand']
     ordering_fields = ['tool_name', 'tool_type', 'brand', 'discipline__discipline_name']
 
-# ViewSet for FactInventoryTransactions (remains unchanged)
-class FactInventoryTransactionsViewSet(viewsets.ModelViewSet):
-    queryset = FactInventoryTransactions.objects.all()
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """Ranked, prefix and typo-tolerant search: ?q=drill&limit=20"""
+        return search_response(self, 'tool', DimTool.objects.select_related('discipline'))
+
+    def _int_param(self, name, default=None):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: 'Must be an integer.'})
+
+    def _state_list(self, queryset):
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(ToolWithStateSerializer(page, many=True).data)
+        return Response(ToolWithStateSerializer(queryset, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='available')
+    def available(self, request):
+        """Tools not currently checked out, from the trigger-maintained ToolState: ?discipline_id="""
+        return self._state_list(available_tools(self._int_param('discipline_id')))
+
+    @action(detail=False, methods=['get'], url_path='overdue-maintenance')
+    def overdue_maintenance(self, request):
+        """
+        Tools due for maintenance: never maintained, last maintained more than
+        ?days= ago (default settings.TOOL_MAINTENANCE_INTERVAL_DAYS), or not calibrated.
+        """
+        days = self._int_param('days', settings.TOOL_MAINTENANCE_INTERVAL_DAYS)
+        return self._state_list(overdue_maintenance(days))
+
+# Streaming export formats: (generator, content type, file extension)
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson', 'ndjson'),
+}
+
+# ViewSet for FactInventoryTransactions
+class FactInventoryTransactionsViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
+    # Joins every dimension the nested serializers render, so a list page is one
+    # query; dates come from the in-process calendar
+    queryset = FactInventoryTransactions.objects.select_related('material__discipline', 'tool__discipline')
     serializer_class = FactInventoryTransactionsSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionKeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = {
         'date__date_id': ['exact', 'gte', 'lte'],
@@ -72,3 +197,262 @@ class FactInventoryTransactionsViewSet(viewsets.ModelViewSet):
         'transaction_type': ['exact'],
     }
     ordering_fields = ['date__full_date', 'transaction_id']
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Loads many transactions from a JSON array, NDJSON or CSV request body.
+
+        The body is read as a stream and written in batches (COPY on PostgreSQL),
+        and the response lists per-row validation errors by row index.
+        """
+        stream = request.stream
+        if stream is None:
+            raise ParseError('Request body is empty.')
+        result = ingest_transactions(iter_records(stream, request.content_type))
+
+        if result.failed == 0 and result.parse_error is None:
+            response_status = status.HTTP_201_CREATED
+        elif result.created == 0:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response(result.as_dict(), status=response_status)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Streams every transaction matching the list filters as flat CSV
+        (default) or NDJSON rows: ?export_format=csv|ndjson.
+        """
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ParseError(f"export_format must be one of: {', '.join(EXPORT_FORMATS)}.")
+        stream, content_type, extension = EXPORT_FORMATS[export_format]
+
+        rows = export_rows(self.filter_queryset(self.get_queryset()))
+        response = StreamingHttpResponse(streaming_content(request, stream(rows)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="transactions.{extension}"'
+        return response
+
+# ViewSet for the analytics rollups over the star schema
+class AnalyticsViewSet(InstrumentedViewMixin, viewsets.ViewSet):
+    """
+    Grouped sums of quantity_change and total_cost, read from the
+    trigger-maintained monthly summary table rather than the fact table.
+
+    ?group_by=year,quarter,month,discipline,material_type,material,tool,transaction_type
+    Filters: year, quarter, month, from_month/to_month (YYYYMM), discipline_id,
+    material_id, tool_id, material_type, transaction_type.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        group_by = [name.strip() for name in request.query_params.get('group_by', 'year').split(',') if name.strip()]
+        return Response(summarize(group_by, request.query_params))
+
+# Inventory valuation totals
+class ValuationViewSet(InstrumentedViewMixin, viewsets.ViewSet):
+    """
+    Quantity and value of the stock on hand under both cost methods
+    (weighted_average, fifo), from the MaterialValuation table: GET
+    /api/valuation/ for the totals and /api/valuation/by-discipline/ per
+    discipline. pending counts materials whose latest transactions are not
+    valued yet.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        return Response(valuation.valuation_totals())
+
+    @action(detail=False, methods=['get'], url_path='by-discipline')
+    def by_discipline(self, request):
+        return Response(valuation.valuation_by_discipline())
+
+# Database connection pool metrics (admin only)
+class DatabasePoolMetricsView(APIView):
+    """Checked out, waiting and created connections for each database alias in this worker process."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({alias: pool_stats(alias) for alias in connections})
+
+# Token authentication cache metrics (admin only)
+class AuthCacheMetricsView(APIView):
+    """Hit rate, size and invalidations of the token cache in this worker process."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(token_cache.stats())
+
+# ViewSet for MaterialReorderPolicy
+class MaterialReorderPolicyViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
+    queryset = MaterialReorderPolicy.objects.select_related('material').order_by('material_id')
+    serializer_class = MaterialReorderPolicySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        'material__discipline__discipline_id': ['exact'],
+        'is_below': ['exact'],
+    }
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        evaluate_on_commit()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        evaluate_on_commit()
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets `Accept: text/event-stream` requests through content negotiation."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only error responses are rendered; the stream itself is a StreamingHttpResponse
+        return JSONRenderer().render(data)
+
+# ViewSet for StockAlert
+class StockAlertViewSet(InstrumentedViewMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Low-stock and recovery alerts, newest first. ?open=true lists the
+    unacknowledged ones; /stream/ pushes new alerts as server-sent events.
+    """
+    queryset = StockAlert.objects.select_related('material')
+    serializer_class = StockAlertSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AlertKeysetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        'material__material_id': ['exact'],
+        'alert_type': ['exact'],
+        'alert_id': ['gt'],
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.query_params.get('open', '').lower() == 'true':
+            queryset = queryset.filter(acknowledged_at__isnull=True)
+        return queryset
+
+    @action(detail=True, methods=['post'], url_path='acknowledge')
+    def acknowledge(self, request, pk=None):
+        alert = self.get_object()
+        if alert.acknowledged_at is None:
+            alert.acknowledged_at = timezone.now()
+            alert.save(update_fields=['acknowledged_at'])
+        return Response(self.get_serializer(alert).data)
+
+    @action(
+        detail=False, methods=['get'], url_path='stream',
+        renderer_classes=[EventStreamRenderer, JSONRenderer],
+        authentication_classes=[CachedTokenAuthentication, QueryParamTokenAuthentication],
+    )
+    def stream(self, request):
+        """
+        Server-sent events for alerts raised after Last-Event-ID (or ?since=),
+        or from now on. EventSource cannot send headers, so ?token= is accepted.
+        """
+        last_id = request.headers.get('Last-Event-ID') or request.query_params.get('since')
+        if last_id is None:
+            last_id = StockAlert.objects.order_by('-alert_id').values_list('alert_id', flat=True).first() or 0
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            raise ValidationError({'since': 'Must be an alert id.'})
+        events = astream_alerts(last_id) if serving_asgi(request) else stream_alerts(last_id)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+# ViewSet for MaterialForecast
+class ForecastViewSet(InstrumentedViewMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Projected stock-outs from the last forecast_consumption run, soonest
+    first. Materials without a stock-out inside the forecast horizon are
+    only listed with ?ordering=material_id.
+    """
+    queryset = MaterialForecast.objects.select_related('material')
+    serializer_class = MaterialForecastSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ForecastKeysetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        'material__discipline__discipline_id': ['exact'],
+        'stockout_date': ['lte', 'gte'],
+        'reorder_by_date': ['lte'],
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list' and self.request.query_params.get('ordering', 'stockout_date').lstrip('-') != 'material_id':
+            queryset = queryset.filter(stockout_date__isnull=False)
+        return queryset
+
+# Delta sync for offline clients
+class SyncView(InstrumentedViewMixin, APIView):
+    """
+    Changes to disciplines, materials, tools, transactions and stock since a
+    version: GET /api/sync/?since=<version>&limit=1000. Without ?since= only
+    the current version is returned, to store before a full download. Keep
+    requesting the returned version while has_more is true. A version older
+    than the changelog retention gets 410 Gone: download everything again.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if not since:
+            return Response({'version': sync.current_version(), 'has_more': False, 'changes': {}})
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', sync.DEFAULT_LIMIT)), sync.MAX_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        try:
+            return Response(sync.changes_since(since, limit))
+        except sync.InvalidVersion:
+            raise ValidationError({'since': 'Expected a version returned by this endpoint.'})
+        except sync.ExpiredVersion:
+            return Response({'detail': 'Changes since this version are no longer kept; download everything again.'},
+                            status=status.HTTP_410_GONE)
+
+# Columnar (Parquet / Arrow IPC) exports of the star schema for BI tools
+class ColumnarExportView(APIView):
+    """
+    Streams one table of the star schema as a file: GET /api/export/<table>/
+    with ?export_format=parquet|arrow (default parquet). For the fact table,
+    ?since=<horizon> only sends the transactions inserted since that horizon;
+    the X-Export-Horizon header is the value to pass next time (see columnar.py).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, table):
+        if table not in columnar.TABLES:
+            raise NotFound(f"Unknown table; expected one of: {', '.join(columnar.TABLES)}.")
+        if columnar.pa is None:
+            return Response({'detail': 'Columnar export needs PyArrow on the server.'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+        export_format = request.query_params.get('export_format', 'parquet')
+        if export_format not in columnar.FORMATS:
+            raise ParseError(f"export_format must be one of: {', '.join(columnar.FORMATS)}.")
+        extension, content_type = columnar.FORMATS[export_format]
+
+        since = horizon = None
+        if table == columnar.FACT_TABLE:
+            if request.query_params.get('since'):
+                try:
+                    since = int(request.query_params['since'])
+                except ValueError:
+                    raise ValidationError({'since': 'Must be an integer.'})
+            # Fixed before streaming, so the header matches the rows sent
+            horizon = sync.snapshot_horizon()
+
+        chunks = columnar.stream_table(table, export_format, since, horizon)
+        response = StreamingHttpResponse(streaming_content(request, chunks), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{table}.{extension}"'
+        if horizon is not None:
+            response['X-Export-Horizon'] = str(horizon)
+        return response
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv  
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables from .env file
 load_dotenv()
@@ -53,7 +54,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'inventory.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -61,6 +62,8 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'inventory.performance.performance_middleware', # First, so its total covers the whole stack
+    'inventory.replicas.replica_middleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -100,22 +103,175 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'inventory_backend.wsgi.application'
 
+# Loads the unmanaged star schema into the test database (see inventory/test_runner.py)
+TEST_RUNNER = 'inventory.test_runner.StarSchemaTestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Connection settings come from the environment. With DATABASE_POOL=true each
+# worker process keeps a psycopg 3 connection pool (Django 5.1+), which suits
+# both the WSGI and the ASGI entry points. psycopg 3 and psycopg_pool come
+# with the `pool` extra (`uv sync --extra pool`); Django uses psycopg 3 in
+# place of psycopg2 whenever it is installed. Otherwise connections persist for
+# DATABASE_CONN_MAX_AGE seconds; under ASGI, prefer the pool, since
+# persistent connections are per thread there. Either way connections are
+# health-checked before they are reused.
+
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'false').lower() == 'true'
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'construction_inventory_db', # Your database name
-        'USER': 'danny', # Your PostgreSQL user
+        'NAME': os.environ.get('DATABASE_NAME', 'construction_inventory_db'), # Your database name
+        'USER': os.environ.get('DATABASE_USER', 'danny'), # Your PostgreSQL user
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'), # <-- IMPORTANT: Replace with your actual POSTGRES_PASSWORD from .env
-        'HOST': 'localhost', # Since Django is running on your host machine
-        'PORT': '5432', # Your mapped host port for PostgreSQL
+        'HOST': os.environ.get('DATABASE_HOST', 'localhost'), # Since Django is running on your host machine
+        'PORT': os.environ.get('DATABASE_PORT', '5432'), # Your mapped host port for PostgreSQL
+        # The pool manages connection lifetime itself, so Django requires 0 with it
+        'CONN_MAX_AGE': 0 if DATABASE_POOL else int(os.environ.get('DATABASE_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+}
+
+if DATABASE_POOL:
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:
+        raise ImproperlyConfigured('DATABASE_POOL=true needs psycopg 3 and psycopg_pool: uv sync --extra pool')
+
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', '10')),
+        # Seconds a request waits for a free connection before failing
+        'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', '10')),
+        'max_lifetime': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', '1800')),
+        'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', '300')),
+        'check': ConnectionPool.check_connection,
+    }
+
+
+# Read replicas
+# DATABASE_REPLICA_HOSTS is a comma-separated list of host[:port] streaming
+# replicas of the default database, added as replica_1, replica_2, ... with the
+# same name, credentials and pooling. Safe API reads are routed to them (see
+# inventory/replicas.py) unless the replica lags the primary by more than
+# DATABASE_REPLICA_MAX_LAG_SECONDS. Clients that just wrote are pinned to the
+# primary through the DATABASE_REPLICA_PIN_CACHE_ALIAS cache, which should be
+# shared between workers (like AUTH_TOKEN_CACHE_ALIAS) when there are several.
+# In tests each replica mirrors the test database.
+
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), 1):
+    replica_host, _, replica_port = replica_host.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['inventory.replicas.ReplicaRouter']
+DATABASE_REPLICA_MAX_LAG_SECONDS = float(os.environ.get('DATABASE_REPLICA_MAX_LAG_SECONDS', '5'))
+DATABASE_REPLICA_PIN_CACHE_ALIAS = os.environ.get('DATABASE_REPLICA_PIN_CACHE_ALIAS', 'default')
+
+
+# Caches
+# The 'api' cache holds serialized responses for the read endpoints (see
+# inventory/cache.py). It is process-local by default; point API_CACHE_BACKEND
+# and API_CACHE_LOCATION at a shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache) to share it across workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': os.environ.get('API_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('API_CACHE_LOCATION', 'inventory-api'),
+        'TIMEOUT': int(os.environ.get('API_CACHE_TIMEOUT', '300')),
+    },
+}
+
+API_CACHE_ALIAS = 'api'
+API_CACHE_ENABLED = os.environ.get('API_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+# Token authentication cache
+# Resolved API tokens are cached for AUTH_TOKEN_CACHE_TTL seconds (see
+# inventory/authentication.py), in a per-process LRU of AUTH_TOKEN_CACHE_SIZE
+# entries, or in the Django cache named by AUTH_TOKEN_CACHE_ALIAS so that
+# revoking a token takes effect in every worker at once.
+
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', '60'))
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', '10000'))
+AUTH_TOKEN_CACHE_ALIAS = os.environ.get('AUTH_TOKEN_CACHE_ALIAS') or None
+
+
+# Performance instrumentation
+# When on, every response carries a Server-Timing header (db, serialize,
+# render, total) and one JSON line per request is logged to
+# 'inventory.performance'. Setting PERFORMANCE_SLOW_QUERY_MS also logs queries
+# slower than that, and SQL repeated within a request (N+1), to
+# 'inventory.performance.sql'.
+
+PERFORMANCE_INSTRUMENTATION = os.environ.get('PERFORMANCE_INSTRUMENTATION', 'false').lower() == 'true'
+PERFORMANCE_SLOW_QUERY_MS = (
+    float(os.environ['PERFORMANCE_SLOW_QUERY_MS']) if os.environ.get('PERFORMANCE_SLOW_QUERY_MS') else None
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'inventory.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
 }
 
 
+# Tool maintenance
+# Tools last maintained longer ago than this are listed by
+# /api/tools/overdue-maintenance/ (overridable per request with ?days=).
+
+TOOL_MAINTENANCE_INTERVAL_DAYS = int(os.environ.get('TOOL_MAINTENANCE_INTERVAL_DAYS', '180'))
+
+
+# Stock alerts
+# /api/alerts/stream/ checks for new alerts every ALERT_STREAM_POLL_SECONDS
+# and ends each stream after ALERT_STREAM_MAX_SECONDS (EventSource then
+# reconnects and resumes from the last event id), which bounds how long a
+# worker is held by one client.
+
+ALERT_STREAM_POLL_SECONDS = float(os.environ.get('ALERT_STREAM_POLL_SECONDS', '2'))
+ALERT_STREAM_MAX_SECONDS = float(os.environ.get('ALERT_STREAM_MAX_SECONDS', '300'))
+
+
+# Delta sync
+# `manage.py prune_changelog` deletes the changes older than
+# CHANGELOG_RETENTION_DAYS; clients that last synced before that get
+# 410 Gone from /api/sync/ and download everything again.
+
+CHANGELOG_RETENTION_DAYS = int(os.environ.get('CHANGELOG_RETENTION_DAYS', '30'))
+
+
+# Inventory valuation
+# Cost method behind inventory_value on the materials API, unless a request
+# asks for the other one with ?valuation_method=: weighted_average or fifo.
+
+INVENTORY_VALUATION_METHOD = os.environ.get('INVENTORY_VALUATION_METHOD', 'weighted_average')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -85,9 +85,16 @@ const App = () => {
     const materialsUrl = `${API_BASE_URL}materials/?${queryParams.toString()}`;
 
     try {
-      const response = await fetch(materialsUrl);
-      if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-      const data = await response.json();
+      // The materials endpoint is cursor-paginated; follow `next` links to load every page
+      const data = [];
+      let nextUrl = materialsUrl;
+      while (nextUrl) {
+        const response = await fetch(nextUrl);
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        const page = await response.json();
+        data.push(...page.results);
+        nextUrl = page.next;
+      }
 
       // Map Django data structure to the frontend's desired 'item' structure
       const mappedItems = data.map(m => ({
@@ -18,6 +18,8 @@ function MaterialForm({ API_BASE_URL, onMaterialAdded }) {
   // State for form submission feedback
   const [submitMessage, setSubmitMessage] = useState(null); // e.g., 'Material added successfully!' or 'Error...'
   const [isSubmitting, setIsSubmitting] = useState(false); // To disable button during submission
+  // Existing materials matching the name being typed (type-ahead)
+  const [nameMatches, setNameMatches] = useState([]);
 
   // Fetch disciplines when the component mounts
   useEffect(() => {
@@ -35,6 +37,31 @@ function MaterialForm({ API_BASE_URL, onMaterialAdded }) {
       });
   }, [API_BASE_URL]); // Dependency on API_BASE_URL
 
+  // Look up existing materials as the name is typed, so near-duplicates are visible
+  useEffect(() => {
+    const query = formData.material_name.trim();
+    if (query.length < 2) {
+      setNameMatches([]);
+      return undefined;
+    }
+    const controller = new AbortController();
+    // Debounced so only the last keystroke in a burst sends a request
+    const timer = setTimeout(() => {
+      fetch(`${API_BASE_URL}materials/search/?q=${encodeURIComponent(query)}&limit=5`, { signal: controller.signal })
+        .then(response => (response.ok ? response.json() : []))
+        .then(data => setNameMatches(data))
+        .catch(error => {
+          if (error.name !== 'AbortError') {
+            console.error("Error searching materials:", error);
+          }
+        });
+    }, 200);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [API_BASE_URL, formData.material_name]);
+
   // Handle input changes (for all text/number fields)
   const handleChange = (e) => {
     const { name, value } = e.target;
@@ -141,8 +168,20 @@ function MaterialForm({ API_BASE_URL, onMaterialAdded }) {
             name="material_name"
             value={formData.material_name}
             onChange={handleChange}
+            autoComplete="off"
             required
           />
+          {nameMatches.length > 0 && (
+            <ul className="name-matches">
+              <li className="name-matches-title">Existing materials:</li>
+              {nameMatches.map(material => (
+                <li key={material.material_id}>
+                  {material.material_name}
+                  {material.brand ? ` (${material.brand})` : ''}
+                </li>
+              ))}
+            </ul>
+          )}
         </div>
 
         <div className="form-group">